@@ -0,0 +1,110 @@
+"""
+Адрес клиента за обратным прокси (services/rate_limit.py: client_ip).
+
+Приложение оборачивается так же, как его запускает воркер gunicorn
+(gunicorn_conf.py: proxy_headers и forwarded_allow_ips), и через
+httpx.ASGITransport с заданным адресом соединения проверяется:
+
+  direct   — без прокси адрес клиента — адрес соединения, а подделанный
+             X-Forwarded-For от недоверенного адреса игнорируется;
+  proxy    — от доверенного прокси берётся X-Forwarded-For, причём последний
+             недоверенный адрес цепочки, а не то, что прислал клиент;
+  limit    — лимит auth.guest (3 в минуту) считается по клиентам за прокси,
+             а не по адресу прокси.
+
+БД не нужна:
+
+    python -m benchmarks.client_ip
+    python -m benchmarks.client_ip --proxy 172.18.0.1 --forwarded-allow-ips 172.16.0.0/12
+
+Код возврата 1, если проверка не прошла.
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import sys
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+
+from config import get_settings
+from services.rate_limit import client_ip
+
+CLIENT = "203.0.113.5"
+FORWARDED = ("198.51.100.7", "198.51.100.8")
+
+
+def wrap(app, worker_kwargs: dict, forwarded_allow_ips: str):
+    # Та же обёртка, что собирает uvicorn в воркере; логирование не трогаем
+    config = uvicorn.Config(app, proxy_headers=worker_kwargs.get("proxy_headers", True),
+                            forwarded_allow_ips=forwarded_allow_ips, http="h11", log_config=None)
+    config.load()
+    return config.loaded_app
+
+
+def client(app, peer: str) -> httpx.AsyncClient:
+    transport = httpx.ASGITransport(app=app, client=(peer, 40000), raise_app_exceptions=False)
+    return httpx.AsyncClient(transport=transport, base_url="http://bench")
+
+
+async def run(proxy: str, forwarded_allow_ips: str) -> int:
+    os.environ.update(WEB_FORWARDED_ALLOW_IPS=forwarded_allow_ips, RATE_LIMIT_ENABLED="1", RATE_LIMIT_REDIS_URL="")
+    get_settings.cache_clear()
+    gunicorn_conf = importlib.import_module("gunicorn_conf")
+    from main import create_app
+
+    failures = []
+
+    def check(scenario: str, what: str, passed: bool):
+        print(f"{scenario:<7} {what:<58} {'ok' if passed else 'FAIL'}")
+        if not passed:
+            failures.append(f"{scenario}: {what}")
+
+    probe = FastAPI()
+
+    @probe.get("/ip")
+    async def ip(request: Request):
+        return {"ip": client_ip(request)}
+
+    probe_app = wrap(probe, gunicorn_conf.UvicornWorker.CONFIG_KWARGS, gunicorn_conf.forwarded_allow_ips)
+
+    async with client(probe_app, CLIENT) as direct:
+        seen = (await direct.get("/ip")).json()["ip"]
+        check("direct", f"no header -> {seen}", seen == CLIENT)
+        seen = (await direct.get("/ip", headers={"X-Forwarded-For": FORWARDED[0]})).json()["ip"]
+        check("direct", f"spoofed X-Forwarded-For ignored -> {seen}", seen == CLIENT)
+
+    async with client(probe_app, proxy) as via_proxy:
+        seen = (await via_proxy.get("/ip", headers={"X-Forwarded-For": FORWARDED[0]})).json()["ip"]
+        check("proxy", f"X-Forwarded-For {FORWARDED[0]} -> {seen}", seen == FORWARDED[0])
+        chain = f"1.2.3.4, {FORWARDED[0]}"
+        seen = (await via_proxy.get("/ip", headers={"X-Forwarded-For": chain})).json()["ip"]
+        check("proxy", f"X-Forwarded-For {chain} -> {seen}", seen == FORWARDED[0])
+
+    app = wrap(create_app(), gunicorn_conf.UvicornWorker.CONFIG_KWARGS, gunicorn_conf.forwarded_allow_ips)
+    async with client(app, proxy) as via_proxy:
+        codes = [
+            (await via_proxy.post("/api/auth/guest-register", headers={"X-Forwarded-For": FORWARDED[0]})).status_code
+            for _ in range(4)
+        ]
+        check("limit", f"one client, 4 requests -> {codes}", codes == [201, 201, 201, 429])
+        code = (await via_proxy.post("/api/auth/guest-register", headers={"X-Forwarded-For": FORWARDED[1]})).status_code
+        check("limit", f"another client behind the same proxy -> {code}", code == 201)
+
+    print("ok" if not failures else "FAIL")
+    return 0 if not failures else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--proxy", default="172.18.0.1", help="адрес соединения от прокси")
+    parser.add_argument("--forwarded-allow-ips", default="172.16.0.0/12",
+                        help="значение WEB_FORWARDED_ALLOW_IPS на время проверки")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.proxy, args.forwarded_allow_ips)))
+
+
+if __name__ == "__main__":
+    main()
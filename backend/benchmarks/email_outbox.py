@@ -0,0 +1,159 @@
+"""
+Очередь писем против локального SMTP-сервера (aiosmtpd).
+
+Ставит N писем в email_outbox и отправляет их через EmailOutboxWorker и
+SmtpPool на встроенный aiosmtpd с искусственной задержкой ответа:
+
+  single   — один воркер; во время отправки соединений с БД, взятых из пула,
+             быть не должно (письма в аренде, транзакция уже закоммичена);
+  parallel — несколько воркеров одновременно; каждое письмо доставлено
+             ровно один раз.
+
+В конце сверяет, что все письма в статусе sent. Нужна отдельная
+PostgreSQL-база и зависимости из requirements-dev.txt:
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.email_outbox --emails 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+
+from aiosmtpd.controller import Controller
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import EmailOutbox, EmailStatus
+import services.crud.email_crud as email_crud
+from services.email_outbox import EmailOutboxWorker, SmtpPool
+
+
+class RecordingHandler:
+    """Принимает письма и запоминает получателей; отвечает с задержкой delay."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.recipients = Counter()
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.delay)
+        self.recipients.update(envelope.rcpt_tos)
+        return "250 Message accepted for delivery"
+
+
+class WatchedPool(SmtpPool):
+    # Во время каждой отправки смотрим, сколько соединений с БД взято из пула
+    def __init__(self, engine, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.engine = engine
+        self.max_checked_out = 0
+
+    async def send(self, message):
+        self.max_checked_out = max(self.max_checked_out, self.engine.sync_engine.pool.checkedout())
+        await super().send(message)
+
+
+async def enqueue(session_factory, prefix: str, count: int) -> list[str]:
+    recipients = [f"{prefix}-{i}@bench.local" for i in range(count)]
+    async with session_factory() as db:
+        for to_email in recipients:
+            email_crud.enqueue_email(db, to_email, "Outbox benchmark", "Проверка очереди писем")
+        await db.commit()
+    return recipients
+
+
+async def drain(worker: EmailOutboxWorker) -> int:
+    sent = 0
+    while count := await worker.process_batch():
+        sent += count
+    return sent
+
+
+async def scenario(name: str, engine, session_factory, handler: RecordingHandler, smtp_port: int,
+                   emails: int, workers: int, batch_size: int, smtp_pool_size: int) -> tuple[bool, list[str]]:
+    recipients = await enqueue(session_factory, f"{name}-{uuid.uuid4().hex[:8]}", emails)
+    pools = [WatchedPool(engine, "127.0.0.1", smtp_port, start_tls=False, size=smtp_pool_size)
+             for _ in range(workers)]
+    outbox_workers = [EmailOutboxWorker(session_factory, pool, sender="bench@bench.local", batch_size=batch_size)
+                      for pool in pools]
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(drain(worker) for worker in outbox_workers), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    for pool in pools:
+        await pool.close()
+
+    errors = [r for r in results if isinstance(r, BaseException)]
+    delivered = sum(handler.recipients[to_email] for to_email in recipients)
+    duplicates = sum(1 for to_email in recipients if handler.recipients[to_email] > 1)
+    held = max(pool.max_checked_out for pool in pools)
+    print(f"{name:<8} {emails:>6} emails in {elapsed:6.2f}s ({emails / elapsed:8.1f}/s), workers {workers}, "
+          f"delivered {delivered}, duplicates {duplicates}, db connections during send {held}, "
+          f"errors {len(errors)}")
+    if errors:
+        print(f"         first error: {errors[0]!r}")
+    ok = not errors and delivered == emails and not duplicates
+    # С одним воркером пока идёт отправка, никто другой соединения не берёт
+    if workers == 1:
+        ok = ok and held == 0
+    return ok, recipients
+
+
+async def run(database_url: str, emails: int, workers: int, batch_size: int, smtp_pool_size: int,
+              smtp_port: int, smtp_delay: float) -> int:
+    engine = create_async_engine(database_url, pool_size=workers + 2, max_overflow=0)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+    handler = RecordingHandler(smtp_delay)
+    controller = Controller(handler, hostname="127.0.0.1", port=smtp_port)
+    controller.start()
+    try:
+        single_ok, single = await scenario("single", engine, session_factory, handler, smtp_port,
+                                           emails, 1, batch_size, smtp_pool_size)
+        parallel_ok, parallel = await scenario("parallel", engine, session_factory, handler, smtp_port,
+                                               emails, workers, batch_size, smtp_pool_size)
+    finally:
+        controller.stop()
+
+    async with session_factory() as db:
+        statuses = dict((await db.execute(
+            select(EmailOutbox.status, func.count())
+            .where(EmailOutbox.to_email.in_(single + parallel))
+            .group_by(EmailOutbox.status)
+        )).all())
+    await engine.dispose()
+
+    sent = statuses.get(EmailStatus.sent, 0)
+    print(f"sent {sent} (expected {len(single) + len(parallel)}), "
+          f"other statuses {({s.value: c for s, c in statuses.items() if s != EmailStatus.sent})}")
+    ok = single_ok and parallel_ok and sent == len(single) + len(parallel)
+    print("ok" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="отдельная БД (или BENCH_DATABASE_URL)")
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4, help="воркеров в сценарии parallel")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--smtp-pool-size", type=int, default=2)
+    parser.add_argument("--smtp-port", type=int, default=8025)
+    parser.add_argument("--smtp-delay", type=float, default=0.02, help="задержка ответа SMTP-сервера, секунд")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("укажите --database-url или BENCH_DATABASE_URL")
+    sys.exit(asyncio.run(run(args.database_url, args.emails, args.workers, args.batch_size,
+                             args.smtp_pool_size, args.smtp_port, args.smtp_delay)))
+
+
+if __name__ == "__main__":
+    main()
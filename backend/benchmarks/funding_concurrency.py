@@ -0,0 +1,152 @@
+"""
+Проверка взносов в желание под конкурентной нагрузкой.
+
+Отправляет N параллельных взносов в одно желание тремя способами и сверяет
+Wish.raised с ожидаемой суммой и с журналом wish_supporters:
+
+  naive   — чтение raised и запись нового значения (как делать не надо, для сравнения);
+  direct  — funding_crud.apply_contributions, отдельная транзакция на каждый взнос;
+  batched — ContributionBatcher, как в API.
+
+Затем повторяет часть взносов с теми же ключами идемпотентности и проверяет,
+что итог не изменился. Нужна отдельная PostgreSQL-база:
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.funding_concurrency --contributions 1000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from decimal import Decimal
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import User, Wish, UserStats
+import services.crud.funding_crud as funding_crud
+from services.crud.funding_crud import Contribution
+from services.funding import ContributionBatcher
+
+
+async def create_wish(session_factory) -> tuple[int, int]:
+    async with session_factory() as db:
+        suffix = uuid.uuid4().hex[:8]
+        owner = User(email=f"funding-{suffix}@bench.local", hashed_password="x", name="Owner", is_verified=True)
+        donor = User(email=f"donor-{suffix}@bench.local", hashed_password="x", name="Donor", is_verified=True)
+        db.add_all([owner, donor])
+        await db.flush()
+        wish = Wish(title="Concurrency check", goal=10 ** 9, raised=0, owner_id=owner.id, is_public=True)
+        db.add(wish)
+        await db.commit()
+        return wish.id, donor.id
+
+
+async def naive_contribute(session_factory, wish_id: int, amount: Decimal):
+    async with session_factory() as db:
+        raised = (await db.execute(select(Wish.raised).where(Wish.id == wish_id))).scalar_one()
+        await asyncio.sleep(0)
+        await db.execute(update(Wish).where(Wish.id == wish_id).values(raised=raised + amount))
+        await db.commit()
+
+
+async def direct_contribute(session_factory, wish_id: int, contribution: Contribution):
+    async with session_factory() as db:
+        result, = await funding_crud.apply_contributions(db, wish_id, [contribution])
+        await db.commit()
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+
+async def get_totals(session_factory, wish_id: int) -> tuple[Decimal, Decimal, Decimal]:
+    async with session_factory() as db:
+        wish = (await db.execute(select(Wish.raised, Wish.owner_id).where(Wish.id == wish_id))).one()
+        ledger = await funding_crud.get_ledger_total(db, wish_id)
+        owner_total = (await db.execute(
+            select(UserStats.total_raised).where(UserStats.user_id == wish.owner_id)
+        )).scalar() or Decimal(0)
+    return wish.raised, ledger, owner_total
+
+
+async def run_mode(mode: str, session_factory, batcher: ContributionBatcher, n: int, rng: random.Random) -> bool:
+    wish_id, donor_id = await create_wish(session_factory)
+    contributions = [
+        Contribution(user_id=donor_id, amount=Decimal(rng.randint(1, 100000)) / 100,
+                     idempotency_key=f"{mode}-{i}")
+        for i in range(n)
+    ]
+    expected = sum((c.amount for c in contributions), Decimal(0))
+
+    start = time.perf_counter()
+    if mode == "naive":
+        coros = [naive_contribute(session_factory, wish_id, c.amount) for c in contributions]
+    elif mode == "direct":
+        coros = [direct_contribute(session_factory, wish_id, c) for c in contributions]
+    else:
+        coros = [batcher.submit(wish_id, c) for c in contributions]
+    results = await asyncio.gather(*coros, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    errors = [r for r in results if isinstance(r, BaseException)]
+
+    raised, ledger, owner_total = await get_totals(session_factory, wish_id)
+    print(f"{mode:<8} {n} contributions in {elapsed:6.2f}s ({n / elapsed:7.1f}/s), errors: {len(errors)}")
+    print(f"         expected {expected}, raised {raised}, ledger {ledger}, owner total {owner_total}")
+    if errors:
+        print(f"         first error: {errors[0]!r}")
+    if mode == "naive":
+        print(f"         lost: {expected - raised}")
+        return True
+
+    ok = not errors and raised == expected == ledger == owner_total
+
+    # Повторы с теми же ключами (клиент не дождался ответа и отправил запрос снова)
+    retries = rng.sample(contributions, min(n, 200))
+    if mode == "direct":
+        replays = await asyncio.gather(*(direct_contribute(session_factory, wish_id, c) for c in retries))
+    else:
+        replays = await asyncio.gather(*(batcher.submit(wish_id, c) for c in retries))
+    raised_after, ledger_after, _ = await get_totals(session_factory, wish_id)
+    replayed = sum(1 for r in replays if r.replayed)
+    print(f"         retries: {len(retries)}, replayed: {replayed}, raised after retries {raised_after}")
+    ok = ok and replayed == len(retries) and raised_after == raised and ledger_after == ledger
+    print(f"         {'ok' if ok else 'FAIL'}")
+    return ok
+
+
+async def run(database_url: str, n: int, modes: list[str], pool_size: int) -> int:
+    engine = create_async_engine(database_url, pool_size=pool_size, max_overflow=0)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    batcher = ContributionBatcher(session_factory)
+
+    rng = random.Random(7)
+    ok = True
+    for mode in modes:
+        ok = await run_mode(mode, session_factory, batcher, n, rng) and ok
+
+    await batcher.stop()
+    await engine.dispose()
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="отдельная БД (или BENCH_DATABASE_URL)")
+    parser.add_argument("--contributions", type=int, default=1000)
+    parser.add_argument("--modes", default="naive,direct,batched")
+    parser.add_argument("--pool-size", type=int, default=20)
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("укажите --database-url или BENCH_DATABASE_URL")
+    sys.exit(asyncio.run(run(args.database_url, args.contributions, args.modes.split(","), args.pool_size)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Проверка гостевого доступа (services/auth.py: гость — только подписанный токен).
+
+Собирает приложение на отдельной БД и через httpx.ASGITransport проверяет,
+что гостю доступно то же, что и до гостевых токенов:
+
+  read     — чтение (/users/me, свои желания, друзья, уведомления, список
+             пользователей) не создаёт строку в users;
+  write    — комментарий, лайк, лайк активности и сообщение в чате создаются,
+             гость сохраняется в users одной строкой;
+  denied   — действия только для зарегистрированных (создать желание,
+             добавить в друзья) — 403;
+  convert  — регистрация с гостевым токеном превращает сохранённого гостя в
+             аккаунт с тем же id, созданное гостем остаётся за ним;
+  register — гость, который ничего не создал, регистрируется как обычно.
+
+Нужна отдельная PostgreSQL-база:
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.guest_access
+"""
+import argparse
+import asyncio
+import os
+import sys
+import uuid
+
+import httpx
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from config import get_settings
+from database import Base, get_db
+from models import User, Wish, Comment, Community, Activity, ActivityType
+from services.activity_archive import ensure_partitions
+from services.email_outbox import EmailOutboxWorker, SmtpPool
+from services.trending import TrendingIndex
+
+
+async def create_fixture(session_factory) -> dict:
+    async with session_factory() as db:
+        suffix = uuid.uuid4().hex[:8]
+        owner = User(email=f"guest-owner-{suffix}@bench.local", hashed_password="x", name="owner",
+                     is_verified=True)
+        db.add(owner)
+        await db.flush()
+        wish = Wish(title=f"Желание {suffix}", goal=1000, owner_id=owner.id, is_public=True)
+        community = Community(name=f"Guests {suffix}", description="Гостевой доступ", category="bench")
+        db.add_all([wish, community])
+        await db.flush()
+        activity = Activity(user_id=owner.id, type=ActivityType.create_wish, target_type="wish", target_id=wish.id)
+        db.add(activity)
+        await db.commit()
+        return {"wish_id": wish.id, "community_id": community.id, "activity_id": activity.id}
+
+
+async def guest_token(client: httpx.AsyncClient) -> tuple[str, dict]:
+    response = await client.post("/api/auth/guest-register")
+    response.raise_for_status()
+    token = response.json()["access_token"]
+    return token, {"Authorization": f"Bearer {token}"}
+
+
+async def count_users(session_factory, email: str) -> int:
+    async with session_factory() as db:
+        return await db.scalar(select(func.count()).select_from(User).where(User.email == email))
+
+
+async def guest_email(client: httpx.AsyncClient, headers: dict) -> str:
+    return (await client.get("/api/users/me", headers=headers)).json()["email"]
+
+
+async def run(database_url: str) -> int:
+    engine = create_async_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await ensure_partitions(conn)
+    session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    fixture = await create_fixture(session_factory)
+
+    # Настройки читаются при сборке приложения
+    os.environ.update(RATE_LIMIT_ENABLED="0")
+    get_settings.cache_clear()
+    from main import create_app
+
+    async def bench_db():
+        async with session_factory() as session:
+            yield session
+
+    app = create_app()
+    app.dependency_overrides[get_db] = bench_db
+    app.state.trending = TrendingIndex()
+    # Воркер не запускается: письма регистрации только ставятся в очередь
+    app.state.email_outbox = EmailOutboxWorker(session_factory, SmtpPool("127.0.0.1", 25), sender="bench@bench.local")
+
+    failures = []
+
+    def check(scenario: str, what: str, passed: bool):
+        print(f"{scenario:<9} {what:<52} {'ok' if passed else 'FAIL'}")
+        if not passed:
+            failures.append(f"{scenario}: {what}")
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        _, headers = await guest_token(client)
+        email = await guest_email(client, headers)
+        for path in ("/api/users/me", "/api/wishes/", "/api/friends/", "/api/notifications/", "/api/users/"):
+            response = await client.get(path, headers=headers)
+            check("read", f"GET {path} -> {response.status_code}", response.status_code == 200)
+        check("read", "no users row for the guest", await count_users(session_factory, email) == 0)
+
+        writes = [
+            ("POST", "/api/comments", {"wish_id": fixture["wish_id"], "content": "Гостевой комментарий"}),
+            ("POST", "/api/likes", {"wish_id": fixture["wish_id"]}),
+            ("POST", f"/api/activities/{fixture['activity_id']}/like", None),
+            ("POST", "/api/community-chat/", {"community_id": fixture["community_id"], "message": "Привет"}),
+        ]
+        for method, path, body in writes:
+            response = await client.request(method, path, json=body, headers=headers)
+            check("write", f"{method} {path} -> {response.status_code}", response.status_code in (200, 201))
+        check("write", "guest saved as one users row", await count_users(session_factory, email) == 1)
+        me = (await client.get("/api/users/me", headers=headers)).json()
+        check("write", "/users/me returns the saved guest", me["id"] != 0 and me["is_guest"])
+
+        response = await client.post("/api/wishes/", headers=headers,
+                                     data={"title": "Гостевое желание", "goal": "100", "is_public": "true"})
+        check("denied", f"POST /api/wishes/ -> {response.status_code}", response.status_code == 403)
+        response = await client.post(f"/api/friends/{me['id']}", headers=headers)
+        check("denied", f"POST /api/friends/{{id}} -> {response.status_code}", response.status_code == 403)
+
+        new_email = f"converted-{uuid.uuid4().hex[:8]}@bench.example.com"
+        response = await client.post("/api/auth/register", headers=headers,
+                                     json={"email": new_email, "password": "secret", "name": "Бывший гость"})
+        check("convert", f"POST /api/auth/register -> {response.status_code}", response.status_code == 200)
+        converted = response.json() if response.status_code == 200 else {}
+        check("convert", "account keeps the guest id", converted.get("id") == me["id"])
+        async with session_factory() as db:
+            user = await db.scalar(select(User).where(User.id == me["id"]))
+            comments = await db.scalar(select(func.count()).select_from(Comment).where(Comment.user_id == me["id"]))
+        check("convert", "row is a regular unverified user",
+              user is not None and user.email == new_email and not user.is_guest and not user.is_verified)
+        check("convert", "guest comment belongs to the account", comments == 1)
+
+        _, headers = await guest_token(client)
+        email = await guest_email(client, headers)
+        new_email = f"registered-{uuid.uuid4().hex[:8]}@bench.example.com"
+        response = await client.post("/api/auth/register", headers=headers,
+                                     json={"email": new_email, "password": "secret", "name": "Новый"})
+        check("register", f"POST /api/auth/register -> {response.status_code}", response.status_code == 200)
+        check("register", "no users row left for the guest", await count_users(session_factory, email) == 0)
+    await engine.dispose()
+
+    print("ok" if not failures else "FAIL")
+    return 0 if not failures else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="отдельная БД (или BENCH_DATABASE_URL)")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("укажите --database-url или BENCH_DATABASE_URL")
+    sys.exit(asyncio.run(run(args.database_url)))
+
+
+if __name__ == "__main__":
+    main()
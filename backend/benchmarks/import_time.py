@@ -0,0 +1,95 @@
+"""
+Время импорта приложения: то, что платит каждый воркер gunicorn и каждый
+запуск тестов, до того как принят первый запрос.
+
+Импорт main в отдельном процессе под python -X importtime, несколько раз;
+берётся минимум (меньше всего шума). Кроме бюджета проверяется, что импорт
+не имеет побочных эффектов: не создаёт движок БД и каталоги загрузок и не
+тянет тяжёлые модули, которые нужны только командам manage.py:
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget-ms 1200 --runs 10 --top 30
+
+Код возврата 1, если бюджет превышен или проверка не прошла.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Не должны попадать в граф импорта приложения
+FORBIDDEN_MODULES = ("alembic", "mako", "requests")
+
+# Печатает результат проверок побочных эффектов последней строкой stdout
+PROBE = """
+import json, os, sys
+import main
+import database
+print(json.dumps({
+    "engine_created": database.get_engine.cache_info().currsize > 0,
+    "upload_dir_created": os.path.exists(os.environ["UPLOAD_DIR"]),
+    "forbidden": sorted(name for name in sys.modules if name.split(".")[0] in %r),
+}))
+""" % (FORBIDDEN_MODULES,)
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int]]:
+    # Строки вида "import time:   self [us] | cumulative | name"
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def measure(upload_dir: str) -> tuple[dict[str, tuple[int, int]], dict]:
+    env = {**os.environ, "UPLOAD_DIR": upload_dir}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"import main failed with code {result.returncode}")
+    checks = json.loads(result.stdout.strip().splitlines()[-1])
+    return parse_importtime(result.stderr), checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500, help="предел для import main (минимум по запускам)")
+    parser.add_argument("--top", type=int, default=20, help="сколько самых тяжёлых модулей показать")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Каталог не существует: импорт не должен его создавать (это делает lifespan)
+        upload_dir = os.path.join(tmp, "uploads")
+        runs = [measure(upload_dir) for _ in range(args.runs)]
+
+    modules, checks = min(runs, key=lambda run: run[0]["main"][1])
+    total_ms = modules["main"][1] / 1000
+
+    print(f"{'self ms':>9}{'cum ms':>9}  module")
+    heaviest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    for name, (self_us, cumulative_us) in heaviest:
+        print(f"{self_us / 1000:>9.1f}{cumulative_us / 1000:>9.1f}  {name}")
+
+    timings = ", ".join(f"{run[0]['main'][1] / 1000:.0f}" for run in runs)
+    print(f"\nimport main: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms; runs: {timings})")
+    print(f"engine created at import: {checks['engine_created']}")
+    print(f"upload dir created at import: {checks['upload_dir_created']}")
+    print(f"forbidden modules: {', '.join(checks['forbidden']) or 'none'}")
+
+    ok = (total_ms <= args.budget_ms and not checks["engine_created"]
+          and not checks["upload_dir_created"] and not checks["forbidden"])
+    print("ok" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
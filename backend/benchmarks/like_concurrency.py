@@ -0,0 +1,130 @@
+"""
+Лайки под конкурентной нагрузкой.
+
+Каждый из N пользователей ставит лайк одному желанию «двойным тапом» —
+два параллельных запроса, — затем часть пользователей снимает лайк.
+Скрипт считает SQL-запросы на одну операцию (like_crud.create_like должен
+укладываться в один запрос) и проверяет, что не было ошибок, а число лайков,
+записей в ленте активностей и счётчик likes_received владельца сходятся.
+Нужна отдельная PostgreSQL-база:
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.like_concurrency --users 500
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import User, Wish, Like, Activity, ActivityType, UserStats
+from services.activity_archive import ensure_partitions
+from services import query_stats
+import services.crud.like_crud as like_crud
+
+
+async def create_fixture(session_factory, users: int) -> tuple[int, int, list[int]]:
+    async with session_factory() as db:
+        suffix = uuid.uuid4().hex[:8]
+        owner = User(email=f"likes-owner-{suffix}@bench.local", hashed_password="x", is_verified=True)
+        likers = [User(email=f"liker-{suffix}-{i}@bench.local", hashed_password="x", is_verified=True)
+                  for i in range(users)]
+        db.add_all([owner, *likers])
+        await db.flush()
+        wish = Wish(title="Like concurrency", goal=100, raised=0, owner_id=owner.id, is_public=True)
+        db.add(wish)
+        await db.commit()
+        return wish.id, owner.id, [user.id for user in likers]
+
+
+async def timed(session_factory, operation, user_id: int, wish_id: int) -> tuple[float, int]:
+    # Отдельный capture_queries на операцию: статистика не смешивается между задачами
+    with query_stats.capture_queries() as stats:
+        start = time.perf_counter()
+        async with session_factory() as db:
+            await operation(db, user_id, wish_id)
+            await db.commit()
+        elapsed = time.perf_counter() - start
+    return elapsed, stats.count
+
+
+def report(name: str, results: list, elapsed: float):
+    errors = [r for r in results if isinstance(r, BaseException)]
+    ok = [r for r in results if not isinstance(r, BaseException)]
+    latencies = sorted(latency for latency, _ in ok)
+    queries = max((count for _, count in ok), default=0)
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+    print(f"{name:<8} {len(results):>6} ops in {elapsed:6.2f}s ({len(results) / elapsed:8.1f}/s), "
+          f"p50 {p50:6.2f} ms, queries/op {queries}, errors {len(errors)}")
+    if errors:
+        print(f"         first error: {errors[0]!r}")
+    return not errors, queries
+
+
+async def run(database_url: str, users: int, unlike_share: float, pool_size: int) -> int:
+    engine = create_async_engine(database_url, pool_size=pool_size, max_overflow=0)
+    query_stats.install(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        # Секции activities: запись активностей идёт в текущий месяц
+        await ensure_partitions(conn)
+    session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    wish_id, owner_id, user_ids = await create_fixture(session_factory, users)
+
+    # Двойной тап: два параллельных лайка от каждого пользователя
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(timed(session_factory, like_crud.create_like, user_id, wish_id)
+          for user_id in user_ids for _ in range(2)),
+        return_exceptions=True,
+    )
+    like_ok, like_queries = report("like", results, time.perf_counter() - start)
+
+    unliked = user_ids[:int(users * unlike_share)]
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(timed(session_factory, like_crud.delete_like, user_id, wish_id)
+          for user_id in unliked for _ in range(2)),
+        return_exceptions=True,
+    )
+    unlike_ok, unlike_queries = report("unlike", results, time.perf_counter() - start)
+
+    async with session_factory() as db:
+        likes = (await db.execute(select(func.count()).where(Like.wish_id == wish_id))).scalar_one()
+        activities = (await db.execute(select(func.count()).where(
+            Activity.type == ActivityType.like, Activity.target_type == "wish", Activity.target_id == wish_id,
+        ))).scalar_one()
+        received = (await db.execute(
+            select(UserStats.likes_received).where(UserStats.user_id == owner_id)
+        )).scalar() or 0
+    await engine.dispose()
+
+    expected = users - len(unliked)
+    consistent = likes == expected == received and activities == users
+    print(f"likes {likes} (expected {expected}), likes_received {received}, "
+          f"like activities {activities} (expected {users})")
+    ok = like_ok and unlike_ok and consistent and like_queries == 1 and unlike_queries == 1
+    print("ok" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="отдельная БД (или BENCH_DATABASE_URL)")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--unlike-share", type=float, default=0.2, help="доля пользователей, снимающих лайк")
+    parser.add_argument("--pool-size", type=int, default=20)
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("укажите --database-url или BENCH_DATABASE_URL")
+    sys.exit(asyncio.run(run(args.database_url, args.users, args.unlike_share, args.pool_size)))
+
+
+if __name__ == "__main__":
+    main()
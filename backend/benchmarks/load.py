@@ -0,0 +1,226 @@
+"""
+Нагрузочный прогон по сценариям поведения пользователей.
+
+Виртуальные пользователи в цикле выбирают сценарий (лента, просмотр желания,
+лайк, комментарий, чат сообщества, опрос уведомлений, профиль) и выполняют
+его шаги. В конце печатается пропускная способность и p50/p95/p99 по маршрутам.
+
+По умолчанию приложение запускается в этом же процессе (httpx.ASGITransport),
+БД берётся из переменных DB_* — они должны указывать на базу, заполненную
+benchmarks.dataset. С --base-url нагрузка идёт на запущенный сервер.
+
+    python -m benchmarks.load --users 50 --duration 60 --json baseline.json
+    python -m benchmarks.load --users 50 --duration 60 --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import timedelta
+
+import httpx
+
+from benchmarks.dataset import DEFAULT_MANIFEST
+from services.auth import create_access_token
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def record(self, route: str, elapsed: float, status_code: int):
+        self.latencies[route].append(elapsed)
+        self.statuses[route][status_code] += 1
+        if status_code >= 500:
+            self.errors[route] += 1
+
+    def record_exception(self, route: str):
+        self.errors[route] += 1
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Метод ближайшего ранга
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(stats: Stats, elapsed: float) -> dict:
+    routes = {}
+    for route in sorted(set(stats.latencies) | set(stats.errors)):
+        values = sorted(stats.latencies[route])
+        routes[route] = {
+            "count": len(values),
+            "rps": len(values) / elapsed,
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+            "errors": stats.errors[route],
+            "statuses": dict(stats.statuses[route]),
+        }
+    total = sum(route["count"] for route in routes.values())
+    return {"duration_s": elapsed, "requests": total, "rps": total / elapsed, "routes": routes}
+
+
+def print_report(summary: dict, baseline: dict | None = None):
+    header = f"{'route':<44}{'count':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'err':>6}"
+    print(header)
+    print("-" * len(header))
+    for route, row in summary["routes"].items():
+        line = (f"{route:<44}{row['count']:>8}{row['rps']:>9.1f}{row['p50_ms']:>9.1f}"
+                f"{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['errors']:>6}")
+        base = (baseline or {}).get("routes", {}).get(route)
+        if base and base["p95_ms"]:
+            line += f"   p95 {(row['p95_ms'] / base['p95_ms'] - 1) * 100:+.0f}%"
+        print(line)
+    print("-" * len(header))
+    print(f"total: {summary['requests']} requests in {summary['duration_s']:.1f}s, "
+          f"{summary['rps']:.1f} req/s")
+    if baseline:
+        print(f"baseline: {baseline['rps']:.1f} req/s ({(summary['rps'] / baseline['rps'] - 1) * 100:+.0f}%)")
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, stats: Stats, manifest: dict, rng: random.Random):
+        self.client = client
+        self.stats = stats
+        self.manifest = manifest
+        self.rng = rng
+        self.user_id = rng.randint(1, manifest["users"])
+        token = create_access_token({"sub": f"user{self.user_id}@bench.local"}, timedelta(hours=12))
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    def wish_id(self) -> int:
+        # Треть запросов — в небольшой набор «горячих» желаний, остальные вразброс
+        return min(int(self.rng.paretovariate(1.2)), self.manifest["wishes"]) \
+            if self.rng.random() < 0.3 else self.rng.randint(1, self.manifest["wishes"])
+
+    async def request(self, method: str, route: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except Exception:
+            self.stats.record_exception(f"{method} {route}")
+            return None
+        self.stats.record(f"{method} {route}", time.perf_counter() - start, response.status_code)
+        return response
+
+    async def browse_feed(self):
+        await self.request("GET", "/api/activities", "/api/activities")
+        await self.request("GET", "/api/community/wishes", "/api/community/wishes")
+
+    async def open_wish(self):
+        wish_id = self.wish_id()
+        await self.request("GET", "/api/wishes/{wish_id}", f"/api/wishes/{wish_id}")
+        await self.request("GET", "/api/wishes/{wish_id}/comments", f"/api/wishes/{wish_id}/comments")
+        await self.request("GET", "/api/wishes/{wish_id}/likes/count", f"/api/wishes/{wish_id}/likes/count")
+
+    async def like(self):
+        await self.request("POST", "/api/likes/", "/api/likes/", json={"wish_id": self.wish_id()})
+
+    async def comment(self):
+        await self.request("POST", "/api/comments", "/api/comments",
+                           json={"wish_id": self.wish_id(), "content": "Отличная идея!"})
+
+    async def chat(self):
+        community_id = self.rng.randint(1, self.manifest["communities"])
+        await self.request("GET", "/api/community-chat/{community_id}", f"/api/community-chat/{community_id}")
+        if self.rng.random() < 0.3:
+            await self.request("POST", "/api/community-chat/", "/api/community-chat/",
+                               json={"community_id": community_id, "message": "Привет!"})
+
+    async def poll_notifications(self):
+        await self.request("GET", "/api/notifications/", "/api/notifications/")
+
+    async def view_profile(self):
+        user_id = self.rng.randint(1, self.manifest["users"])
+        await self.request("GET", "/api/users/{user_id}", f"/api/users/{user_id}")
+        await self.request("GET", "/api/users/{user_id}/friends", f"/api/users/{user_id}/friends")
+
+
+# Сценарий и его относительная частота
+SCENARIOS = [
+    (VirtualUser.browse_feed, 2),
+    (VirtualUser.open_wish, 30),
+    (VirtualUser.like, 10),
+    (VirtualUser.comment, 4),
+    (VirtualUser.chat, 10),
+    (VirtualUser.poll_notifications, 30),
+    (VirtualUser.view_profile, 14),
+]
+
+
+async def run_user(user: VirtualUser, deadline: float, think_time: float):
+    scenarios, weights = zip(*SCENARIOS)
+    while time.perf_counter() < deadline:
+        scenario = user.rng.choices(scenarios, weights=weights)[0]
+        await scenario(user)
+        if think_time:
+            await asyncio.sleep(user.rng.expovariate(1 / think_time))
+
+
+@asynccontextmanager
+async def make_client(base_url: str | None, concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    if base_url:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            yield client
+        return
+    from main import app
+    # Выполняем startup/shutdown приложения, как это делает сервер
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=30) as client:
+            yield client
+
+
+async def run(args) -> dict:
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    stats = Stats()
+    async with make_client(args.base_url, args.users) as client:
+        rng = random.Random(args.seed)
+        users = [VirtualUser(client, stats, manifest, random.Random(rng.random())) for _ in range(args.users)]
+        if args.warmup:
+            warmup_deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*(run_user(user, warmup_deadline, args.think_time) for user in users))
+            stats.__init__()
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(run_user(user, deadline, args.think_time) for user in users))
+        return summarize(stats, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="адрес запущенного сервера; без него — приложение в процессе")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--users", type=int, default=20, help="число виртуальных пользователей")
+    parser.add_argument("--duration", type=float, default=30, help="длительность замера, секунд")
+    parser.add_argument("--warmup", type=float, default=5, help="прогрев перед замером, секунд")
+    parser.add_argument("--think-time", type=float, default=0, help="средняя пауза между сценариями, секунд")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="сохранить результат (базовая линия для --compare)")
+    parser.add_argument("--compare", help="сравнить с ранее сохранённым результатом")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(summary, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
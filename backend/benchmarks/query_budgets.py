@@ -0,0 +1,201 @@
+"""
+Проверка бюджетов SQL-запросов на маршрут (services/query_stats.QUERY_BUDGETS).
+
+Заполняет отдельную БД связными наборами данных двух размеров (пользователь с
+друзьями, у друзей — свои друзья и желания, уведомления, сообщество, лайки,
+активности), собирает приложение с QUERY_BUDGET_STRICT=1 и DEBUG=1 и вызывает
+каждый маршрут из QUERY_BUDGETS через httpx.ASGITransport. Печатает число
+запросов (X-DB-Query-Count) на каждом наборе и бюджет. Код выхода 1, если
+число запросов зависит от размера набора (N+1), не совпадает с бюджетом
+(превышение в строгом режиме — ответ 500; бюджет с запасом тоже ошибка) или
+маршрут ответил не 200. Нужна отдельная PostgreSQL-база:
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.query_budgets
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.query_budgets --sizes 5 50 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import uuid
+
+import httpx
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from config import get_settings
+from database import Base, get_db
+from models import (User, Wish, Like, Activity, ActivityType, Notification, NotificationType,
+                    Community, CommunityMember, friend_association)
+from services import query_stats
+from services.activity_archive import ensure_partitions
+from services.auth import create_access_token
+from services.crud.user_stats_crud import RECONCILE_SQL
+from services.trending import TrendingIndex
+
+SEARCH_WORD = "велосипед"
+
+
+async def create_fixture(session_factory, friends: int) -> dict:
+    async with session_factory() as db:
+        suffix = uuid.uuid4().hex[:8]
+
+        def user(name, **kwargs):
+            return User(email=f"budget-{name}-{suffix}@bench.local", hashed_password="x", name=name,
+                        is_verified=True, **kwargs)
+
+        viewer = user("viewer")
+        friend_users = [user(f"friend{i}") for i in range(friends)]
+        others = [user(f"other{i}") for i in range(friends)]
+        influencer = user("influencer", is_influencer=True)
+        db.add_all([viewer, *friend_users, *others, influencer])
+        await db.flush()
+
+        # Друзья пользователя дружат между собой по цепочке и каждый — со своим «чужим» пользователем
+        pairs = [(viewer.id, friend.id) for friend in friend_users]
+        pairs += [(a.id, b.id) for a, b in zip(friend_users, friend_users[1:])]
+        pairs += [(friend.id, other.id) for friend, other in zip(friend_users, others)]
+        await db.execute(insert(friend_association), [
+            {"user_id": a, "friend_id": b} for pair in pairs for a, b in (pair, pair[::-1])
+        ])
+
+        community = Community(name=f"Budget {suffix}", description="Проверка бюджетов", category="bench")
+        db.add(community)
+        await db.flush()
+        db.add_all([CommunityMember(community_id=community.id, user_id=u.id) for u in (viewer, *friend_users)])
+
+        wishes = []
+        for owner in (viewer, *friend_users, *others):
+            wishes += [
+                Wish(title=f"Новый {SEARCH_WORD} {owner.name}", goal=1000, owner_id=owner.id, is_public=True,
+                     category="sport"),
+                Wish(title=f"Поездка {owner.name}", goal=500, owner_id=owner.id, is_public=True,
+                     community_id=community.id),
+            ]
+        wishes.append(Wish(title="Influencer wish", goal=5000, owner_id=influencer.id, is_public=True,
+                           is_influencer_public=True))
+        db.add_all(wishes)
+        await db.flush()
+
+        db.add_all([Like(user_id=viewer.id, wish_id=wish.id) for wish in wishes[2:2 + friends]])
+        db.add_all([Activity(user_id=friend.id, type=ActivityType.like, target_type="wish",
+                             target_id=wishes[0].id) for friend in friend_users])
+        db.add_all([Notification(recipient_id=viewer.id, sender_id=friend.id, type=NotificationType.message,
+                                 message="Привет") for friend in friend_users])
+        db.add(Notification(recipient_id=viewer.id, sender_id=others[0].id, type=NotificationType.friend_request,
+                            message="Запрос в друзья"))
+        ids = [u.id for u in (viewer, *friend_users, *others, influencer)]
+        await db.execute(RECONCILE_SQL, {"first_id": min(ids), "last_id": max(ids)})
+        await db.commit()
+        return {
+            "viewer_email": viewer.email,
+            "friend_id": friend_users[0].id,
+            "wish_ids": [wish.id for wish in wishes],
+        }
+
+
+def route_urls(fixture: dict) -> dict[tuple[str, str], str]:
+    wish_ids = "&".join(f"wish_ids={wish_id}" for wish_id in fixture["wish_ids"][:20])
+    return {
+        ("GET", "/api/friends/"): "/api/friends/",
+        ("GET", "/api/users/{user_id}"): f"/api/users/{fixture['friend_id']}",
+        ("GET", "/api/users/{user_id}/friends"): f"/api/users/{fixture['friend_id']}/friends",
+        ("GET", "/api/notifications/"): "/api/notifications/",
+        ("GET", "/api/community/wishes"): "/api/community/wishes",
+        ("GET", "/api/activities"): "/api/activities",
+        ("GET", "/api/search"): f"/api/search?q={SEARCH_WORD}",
+        ("GET", "/api/wishes/trending"): "/api/wishes/trending",
+        ("GET", "/api/wishes/influencer"): "/api/wishes/influencer",
+        ("GET", "/api/likes/state"): f"/api/likes/state?{wish_ids}",
+    }
+
+
+async def measure(app, fixture: dict) -> dict[tuple[str, str], tuple[int, object]]:
+    # Маршрут -> (HTTP-статус, число запросов из X-DB-Query-Count)
+    urls = route_urls(fixture)
+    token = create_access_token(data={"sub": fixture["viewer_email"]})
+    app.state.trending.replace([(wish_id, 1.0) for wish_id in fixture["wish_ids"]])
+    counts = {}
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        for method, path in query_stats.QUERY_BUDGETS:
+            if (method, path) not in urls:
+                continue
+            response = await client.request(method, urls[(method, path)])
+            queries = response.headers.get("x-db-query-count")
+            counts[(method, path)] = (response.status_code, int(queries) if queries else None)
+    return counts
+
+
+async def run(database_url: str, sizes: list[int]) -> int:
+    engine = create_async_engine(database_url)
+    query_stats.install(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await ensure_partitions(conn)
+    session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+    # Настройки читаются при сборке приложения
+    os.environ.update(QUERY_BUDGET_STRICT="1", DEBUG="1")
+    get_settings.cache_clear()
+    from main import create_app
+
+    async def bench_db():
+        async with session_factory() as session:
+            yield session
+
+    app = create_app()
+    app.dependency_overrides[get_db] = bench_db
+    app.state.trending = TrendingIndex()
+
+    # Один и тот же маршрут на наборах разного размера: число запросов не должно
+    # зависеть от числа друзей, уведомлений и т.п. (иначе это N+1)
+    measured = {}
+    for size in sizes:
+        fixture = await create_fixture(session_factory, size)
+        measured[size] = await measure(app, fixture)
+    await engine.dispose()
+
+    missing = set(query_stats.QUERY_BUDGETS) - set(route_urls(fixture))
+    ok = not missing
+    print(f"{'route':<36} " + " ".join(f"{f'n={size}':>6}" for size in sizes) + "  budget")
+    for (method, path), budget in query_stats.QUERY_BUDGETS.items():
+        if (method, path) in missing:
+            continue
+        results = [measured[size][(method, path)] for size in sizes]
+        counts = {queries for _, queries in results}
+        if any(code != 200 for code, _ in results):
+            note = "FAIL: HTTP " + "/".join(str(code) for code, _ in results)
+        elif len(counts) > 1:
+            note = "FAIL: depends on fixture size"
+        elif counts != {budget}:
+            # Бюджет — измеренное значение: запас прячет появившиеся запросы
+            note = f"FAIL: measured {counts.pop()}, set the budget to it"
+        else:
+            note = ""
+        ok = ok and not note
+        columns = " ".join(f"{str(queries):>6}" for _, queries in results)
+        print(f"{method} {path:<32} {columns}  {budget:>6}  {note}")
+
+    for method, path in sorted(missing):
+        print(f"{method} {path:<32} no request defined in route_urls")
+    print("ok" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="отдельная БД (или BENCH_DATABASE_URL)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 50],
+                        help="размеры набора данных (друзей у проверяющего пользователя)")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("укажите --database-url или BENCH_DATABASE_URL")
+    sys.exit(asyncio.run(run(args.database_url, args.sizes)))
+
+
+if __name__ == "__main__":
+    main()
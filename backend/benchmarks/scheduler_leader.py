@@ -0,0 +1,88 @@
+"""
+Задачи обслуживания планировщика выполняются один раз за период на все процессы.
+
+Запускает несколько экземпляров Scheduler (каждый со своим движком — как
+отдельные воркеры) с одной короткой задачей leader=True на интервальном
+триггере с джиттером и стартом вразнобой. Задача короче джиттера: лидер
+успевает закончить и снять блокировку раньше, чем проснутся остальные.
+Печатает число запусков по плановым периодам; в каждом периоде должен быть
+ровно один запуск. Нужна отдельная PostgreSQL-база:
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.scheduler_leader --periods 5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database import Base
+from models import SchedulerRun
+from services.scheduler import IntervalTrigger, Scheduler
+
+
+async def run(database_url: str, schedulers: int, period: float, jitter: float, periods: int) -> int:
+    engines = [create_async_engine(database_url) for _ in range(schedulers)]
+    async with engines[0].begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    job_name = f"bench-leader-{uuid.uuid4().hex[:8]}"
+    runs = []
+
+    async def job():
+        runs.append(time.time())
+        await asyncio.sleep(0.05)
+
+    instances = []
+    for engine in engines:
+        scheduler = Scheduler(engine)
+        scheduler.add_job(job_name, job, IntervalTrigger(period), jitter=jitter)
+        instances.append(scheduler)
+
+    # Старт вразнобой, как у воркеров, поднятых в разное время
+    started = time.time()
+    for scheduler in instances:
+        scheduler.start()
+        await asyncio.sleep(period / (schedulers + 1))
+    await asyncio.sleep(max(periods * period - (time.time() - started), 0) + jitter + 0.5)
+    for scheduler in instances:
+        await scheduler.stop()
+
+    async with engines[0].begin() as conn:
+        await conn.execute(delete(SchedulerRun).where(SchedulerRun.job_name == job_name))
+    for engine in engines:
+        await engine.dispose()
+
+    # Плановый период запуска: джиттер сдвигает запуск не дальше jitter после начала периода
+    per_period = Counter(int((moment - jitter) // period) for moment in runs)
+    first, last = min(per_period), max(per_period)
+    missing = [slot for slot in range(first, last + 1) if slot not in per_period]
+    repeated = {slot: count for slot, count in per_period.items() if count > 1}
+    print(f"{schedulers} schedulers, period {period}s, jitter {jitter}s: {len(runs)} runs "
+          f"in {last - first + 1} periods, repeated {len(repeated)}, missing {len(missing)}")
+    ok = not repeated and not missing and last - first + 1 >= periods - 1
+    print("ok" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="отдельная БД (или BENCH_DATABASE_URL)")
+    parser.add_argument("--schedulers", type=int, default=2, help="экземпляров Scheduler (процессов)")
+    parser.add_argument("--period", type=float, default=2.0, help="интервал задачи, секунд")
+    parser.add_argument("--jitter", type=float, default=0.5, help="джиттер, секунд (меньше периода)")
+    parser.add_argument("--periods", type=int, default=5, help="сколько периодов наблюдать")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("укажите --database-url или BENCH_DATABASE_URL")
+    sys.exit(asyncio.run(run(args.database_url, args.schedulers, args.period, args.jitter, args.periods)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Пропускная способность: прежний запуск (один процесс uvicorn --reload) против
+продакшен-режима (gunicorn -c gunicorn_conf.py, воркеры uvloop + httptools).
+
+Каждый режим запускается отдельным процессом на свободном порту, на него
+подаётся нагрузка benchmarks.load (те же сценарии и сид), затем сервер
+останавливается SIGTERM и замеряется время корректного завершения. БД — из
+переменных DB_*, заполненная benchmarks.dataset:
+
+    python -m benchmarks.server_modes --users 100 --duration 30
+    python -m benchmarks.server_modes --modes production --workers 4
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks import load
+from benchmarks.dataset import DEFAULT_MANIFEST
+
+MODES = {
+    "current": lambda port: [
+        sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--reload",
+    ],
+    # Порт передаётся через WEB_BIND
+    "production": lambda port: [sys.executable, "-m", "gunicorn", "-c", "gunicorn_conf.py", "main:app"],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(base_url: str, timeout: float = 60):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.perf_counter() < deadline:
+            try:
+                if (await client.get("/api/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"server at {base_url} did not start in {timeout}s")
+
+
+def stop(process: subprocess.Popen, timeout: float) -> float:
+    start = time.perf_counter()
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    return time.perf_counter() - start
+
+
+async def run_mode(mode: str, args) -> dict:
+    port = free_port()
+    env = {**os.environ, "WEB_BIND": f"127.0.0.1:{port}"}
+    if args.workers:
+        env["WEB_CONCURRENCY"] = str(args.workers)
+    process = subprocess.Popen(MODES[mode](port), env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        await wait_ready(base_url)
+        summary = await load.run(argparse.Namespace(
+            base_url=base_url, manifest=args.manifest, users=args.users, duration=args.duration,
+            warmup=args.warmup, think_time=0, seed=args.seed,
+        ))
+    except BaseException:
+        stop(process, args.stop_timeout)
+        raise
+    summary["stop_s"] = stop(process, args.stop_timeout)
+    return summary
+
+
+async def run(args) -> dict:
+    results = {}
+    for mode in args.modes.split(","):
+        print(f"== {mode}")
+        results[mode] = await run_mode(mode, args)
+        load.print_report(results[mode])
+        print(f"stopped in {results[mode]['stop_s']:.1f}s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="current,production")
+    parser.add_argument("--workers", type=int, default=0, help="WEB_CONCURRENCY для production (0 — по ядрам)")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--users", type=int, default=100, help="число виртуальных пользователей")
+    parser.add_argument("--duration", type=float, default=30, help="длительность замера, секунд")
+    parser.add_argument("--warmup", type=float, default=5, help="прогрев перед замером, секунд")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--stop-timeout", type=float, default=60, help="сколько ждать остановки по SIGTERM")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if len(results) > 1:
+        print(f"{'mode':<12}{'req/s':>10}{'stop s':>9}")
+        for mode, summary in results.items():
+            print(f"{mode:<12}{summary['rps']:>10.1f}{summary['stop_s']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
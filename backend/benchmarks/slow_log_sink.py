@@ -0,0 +1,131 @@
+"""
+Латентность запросов при медленном выводе логов.
+
+Приложение (create_app) получает служебный маршрут, который пишет --records
+записей уровня INFO, как горячий путь. Вывод логов — поток, каждая запись
+в который занимает --sink-delay-ms (stdout, упёршийся в pipe контейнера).
+Сравниваются режимы:
+
+    sync-fast    прежний StreamHandler, быстрый вывод (база)
+    sync-slow    прежний StreamHandler, медленный вывод
+    queued-slow  очередь services/log_queue.py, медленный вывод
+
+Запросы идут через ASGITransport в одном event loop, БД не нужна:
+
+    python -m benchmarks.slow_log_sink --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import io
+import logging
+import logging.config
+import time
+
+import httpx
+
+from config import get_settings
+from main import create_app
+from services import log_queue
+from services.metrics import LOG_RECORDS_DROPPED
+
+ROUTE = "/api/bench/log"
+MODES = ("sync-fast", "sync-slow", "queued-slow")
+
+
+class SinkStream(io.TextIOBase):
+    """Поток вывода с задержкой на каждую запись."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.lines = 0
+
+    def write(self, text: str) -> int:
+        if self.delay:
+            time.sleep(self.delay)
+        self.lines += 1
+        return len(text)
+
+
+def configure_sync(stream):
+    # Прежняя схема: StreamHandler пишет прямо в вызывающем потоке
+    log_queue.stop()
+    logging.config.dictConfig({
+        "version": 1,
+        "disable_existing_loggers": False,
+        "formatters": {"default": {"format": log_queue.TEXT_FORMAT}},
+        "handlers": {"console": {"class": "logging.StreamHandler", "formatter": "default", "stream": stream}},
+        "root": {"handlers": ["console"], "level": "INFO"},
+    })
+
+
+def dropped() -> float:
+    return sum(LOG_RECORDS_DROPPED.labels(reason).value for reason in ("sampled", "queue_full"))
+
+
+async def run_mode(app, mode: str, args) -> dict:
+    stream = SinkStream(0 if mode == "sync-fast" else args.sink_delay_ms / 1000)
+    if mode == "queued-slow":
+        log_queue.configure(get_settings(), stream=stream)
+    else:
+        configure_sync(stream)
+    dropped_before = dropped()
+
+    latencies = []
+    pending = iter(range(args.requests))
+
+    async def client_loop(client):
+        for _ in pending:
+            start = time.perf_counter()
+            response = await client.get(ROUTE)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    # Время записи хвоста очереди в замер не входит: запросы его не ждут
+    log_queue.stop()
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "written": stream.lines,
+        "dropped": int(dropped() - dropped_before),
+    }
+
+
+async def run(args) -> dict:
+    app = create_app()
+    hot_logger = logging.getLogger("benchmarks.hot_path")
+
+    async def log_records():
+        for i in range(args.records):
+            hot_logger.info("hot path record %s", i)
+        return {"ok": True}
+
+    app.add_api_route(ROUTE, log_records, methods=["GET"])
+    return {mode: await run_mode(app, mode, args) for mode in args.modes.split(",")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--records", type=int, default=3, help="записей лога на запрос")
+    parser.add_argument("--sink-delay-ms", type=float, default=2, help="задержка вывода одной записи")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"{'mode':<13}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'written':>10}{'dropped':>10}")
+    for mode, result in results.items():
+        print(f"{mode:<13}{result['rps']:>10.1f}{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+              f"{result['written']:>10}{result['dropped']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Микробенчмарк рейтинга популярных желаний (без БД).
+
+Показывает, что чтение страницы из TrendingIndex не зависит от размера
+рейтинга, и проверяет, что инкрементальное обновление в лог-пространстве
+(как в upsert trending_crud.record_event) совпадает с прямым пересчётом.
+
+    python -m benchmarks.trending_bench
+"""
+import math
+import random
+import time
+import timeit
+
+from services.trending import TrendingIndex
+from services.crud.trending_crud import log_time, decayed_weight, LIKE, COMMENT, SUPPORT
+
+
+def logaddexp(a: float, b: float) -> float:
+    return max(a, b) + math.log1p(math.exp(-abs(a - b)))
+
+
+def check_incremental(events: int = 10000):
+    rng = random.Random(1)
+    start = time.time() - 7 * 86400
+    score = None
+    expected = 0.0
+    now = time.time()
+    for _ in range(events):
+        at = start + rng.random() * 7 * 86400
+        weight = rng.choice([LIKE, COMMENT, SUPPORT])
+        increment = math.log(weight) + log_time(at)
+        score = increment if score is None else logaddexp(score, increment)
+        expected += weight * math.exp(log_time(at) - log_time(now))
+    actual = decayed_weight(score, now)
+    print(f"incremental score: {actual:.6f}, recomputed: {expected:.6f}, "
+          f"rel. error {abs(actual - expected) / expected:.2e}")
+
+
+def bench_reads():
+    print(f"{'ranked wishes':>14}{'page(0, 20) µs':>17}{'page(500, 20) µs':>19}")
+    for size in (100, 1_000, 10_000, 100_000, 1_000_000):
+        index = TrendingIndex()
+        now = log_time()
+        index.replace([(wish_id, now - wish_id * 1e-6) for wish_id in range(size)])
+        runs = 20000
+        first = timeit.timeit(lambda: index.page(0, 20), number=runs) / runs * 1e6
+        deep = timeit.timeit(lambda: index.page(min(500, size - 20), 20), number=runs) / runs * 1e6
+        print(f"{size:>14}{first:>17.2f}{deep:>19.2f}")
+
+
+if __name__ == "__main__":
+    check_incremental()
+    bench_reads()
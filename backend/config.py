@@ -1,66 +1,211 @@
 import os
-from dotenv import load_dotenv
-import logging
-
-# Папка загрузки картинок для сервера
-UPLOAD_DIR = "/var/www/wishflick/uploads" # Для сервера
-
-# Папка загрузки картинок для локальной разработки
-# BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-# UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
-
-load_dotenv()
-EMAIL_BEGET_PASSWORD = os.getenv('EMAIL_BEGET_PASSWORD', '')
-VK_CLIENT_ID = os.getenv('VK_CLIENT_ID', '')
-VK_CLIENT_SECRET = os.getenv('VK_CLIENT_SECRET', '')
-VK_REDIRECT_URI = os.getenv('VK_REDIRECT_URI', '')
-DB_USER=os.getenv('DB_USER', '')
-DB_PASSWORD=os.getenv('DB_PASSWORD', '')
-DB_HOST=os.getenv('DB_HOST', '')
-DB_NAME=os.getenv('DB_NAME', '')
+from functools import lru_cache
 
+from pydantic import field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """
+    Настройки приложения из переменных окружения и .env.
+    Читаются при первом вызове get_settings(), а не при импорте модулей.
+    """
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore", env_ignore_empty=True)
+
+    # Папка загрузки картинок. Для локальной разработки, например, UPLOAD_DIR=./uploads
+    UPLOAD_DIR: str = "/var/www/wishflick/uploads"
+
+    EMAIL_BEGET_PASSWORD: str = ""
+
+    # Отправка писем (для локального SMTP-стенда, например
+    # `python -m aiosmtpd -n -l localhost:8025` из requirements-dev.txt:
+    # SMTP_HOST=localhost SMTP_PORT=8025 SMTP_START_TLS=0 SMTP_USERNAME=)
+    SMTP_HOST: str = "smtp.beget.com"
+    SMTP_PORT: int = 2525
+    SMTP_USERNAME: str = "info@wishflick.ru"
+    SMTP_START_TLS: bool = True
+    SMTP_POOL_SIZE: int = 2
+    EMAIL_FROM: str = "WishFlick <info@wishflick.ru>"
+    EMAIL_OUTBOX_BATCH_SIZE: int = 20
+    EMAIL_OUTBOX_POLL_SECONDS: float = 5
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 6
+    # Аренда взятой пачки, секунд: дольше, чем отправка пачки через пул
+    # (batch_size / SMTP_POOL_SIZE писем подряд с таймаутом 30 с каждое)
+    EMAIL_OUTBOX_LEASE_SECONDS: float = 600
+    VK_CLIENT_ID: str = ""
+    VK_CLIENT_SECRET: str = ""
+    VK_REDIRECT_URI: str = ""
+    DB_USER: str = ""
+    DB_PASSWORD: str = ""
+    DB_HOST: str = ""
+    DB_NAME: str = ""
+    # Пул соединений на процесс. Всего соединений: WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW),
+    # это должно укладываться в max_connections PostgreSQL (DB_MAX_CONNECTIONS)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_MAX_CONNECTIONS: int = 100
+
+    # Продакшен-сервер (gunicorn_conf.py): число воркеров (0 — по числу ядер), адрес,
+    # время на завершение текущих запросов при остановке и keep-alive, секунд
+    WEB_CONCURRENCY: int = 0
+    WEB_BIND: str = "0.0.0.0:8000"
+    WEB_GRACEFUL_TIMEOUT: int = 30
+    WEB_KEEPALIVE: int = 5
+    # Адреса прокси (через запятую, можно подсети или "*"), которым верим
+    # X-Forwarded-For/-Proto: по ним uvicorn подставляет адрес клиента, а на нём
+    # держатся лимиты по IP (services/rate_limit.py). Без прокси — 127.0.0.1
+    WEB_FORWARDED_ALLOW_IPS: str = "127.0.0.1"
+
+    # Общий HTTP-клиент для OAuth-провайдеров
+    OAUTH_HTTP_TIMEOUT: float = 10
+    OAUTH_HTTP_MAX_CONNECTIONS: int = 100
+    OAUTH_PROVIDER_CONCURRENCY: int = 20
+
+    # Рейтинг популярных желаний: период полураспада веса события, частота
+    # обновления списка в памяти и его длина
+    TRENDING_HALF_LIFE_HOURS: float = 24
+    TRENDING_REFRESH_SECONDS: float = 30
+    TRENDING_SIZE: int = 1000
+
+    # Максимум взносов в одно желание, записываемых одной транзакцией
+    FUNDING_MAX_BATCH: int = 200
+
+    # Периодическая сверка счётчиков user_stats с исходными таблицами, секунд
+    USER_STATS_RECONCILE_SECONDS: float = 3600
+    # Очистка затухших рейтингов wish_trending, секунд
+    TRENDING_PRUNE_SECONDS: float = 3600
+    # Удаление гостей прежней схемы (manage.py purge-guests) по расписанию cron, UTC
+    GUEST_PURGE_CRON: str = "30 3 * * *"
+
+    # Лента активностей: за сколько дней читать (старые секции не сканируются),
+    # сколько полных месяцев хранить в БД, каталог архива старых секций
+    # (сжатые CSV) и расписание обслуживания секций, cron UTC
+    ACTIVITY_FEED_DAYS: int = 90
+    ACTIVITY_RETENTION_MONTHS: int = 12
+    ACTIVITY_PARTITIONS_AHEAD: int = 3
+    ACTIVITY_ARCHIVE_DIR: str = "/var/www/wishflick/archive/activities"
+    ACTIVITY_PARTITIONS_CRON: str = "15 3 * * *"
+
+    # Срок хранения обработанных уведомлений по типам, дней (тип без срока не
+    # удаляется), период очистки, секунд, размер пачки и каталог архива
+    # удалённых строк (пусто — удалять без архива)
+    NOTIFICATION_RETENTION_DAYS: str = "friend_request=30,join_request=30,message=90"
+    NOTIFICATION_RETENTION_SECONDS: float = 3600
+    NOTIFICATION_PURGE_BATCH: int = 500
+    NOTIFICATION_ARCHIVE_DIR: str = ""
+
+    # Планировщик задач (services/scheduler.py). SCHEDULER_LEADER_JOBS=0 — этот
+    # процесс не берёт задачи обслуживания БД (их выполнит другой хост);
+    # задачи каждого воркера, например обновление кеша, работают всегда.
+    # SCHEDULER_JITTER_SECONDS — предел случайной задержки запусков
+    SCHEDULER_LEADER_JOBS: bool = True
+    SCHEDULER_JITTER_SECONDS: float = 30
+
+    # Срок действия кода подтверждения email, минут; очистка просроченных
+    # кодов: период, секунд, и размер пачки (одна транзакция)
+    EMAIL_VERIFICATION_TTL_MINUTES: int = 1440
+    EMAIL_VERIFICATION_PURGE_SECONDS: float = 600
+    EMAIL_VERIFICATION_PURGE_BATCH: int = 1000
+
+    # Доступ к /metrics: адреса и подсети через запятую (адрес клиента — с учётом
+    # WEB_FORWARDED_ALLOW_IPS) или заголовок Authorization: Bearer METRICS_TOKEN.
+    # Остальным — 403
+    METRICS_ALLOW_IPS: str = "127.0.0.1,::1"
+    METRICS_TOKEN: str = ""
+
+    # Отладочный режим: заголовки X-DB-* и /api/debug/query-stats
+    DEBUG: bool = False
+    # Печать всех SQL-запросов
+    DB_ECHO: bool = False
+    # Проверка версии схемы при старте: verify — сверить с последней миграцией
+    # и не стартовать при расхождении, off — не проверять. DDL при старте не выполняется
+    DB_SCHEMA_CHECK: str = "verify"
+    # Превышение бюджета запросов на маршрут считать ошибкой (для CI)
+    QUERY_BUDGET_STRICT: bool = False
+
+    # Логирование (services/log_queue.py): уровень корневого логгера (LOG_LEVEL=INFO
+    # включает info-логи приложения), формат вывода (json или text), длина очереди
+    # записей и прореживание горячих логгеров ниже WARNING, например
+    # LOG_SAMPLING="uvicorn.access=0.1"
+    LOG_LEVEL: str = "WARNING"
+    LOG_FORMAT: str = "json"
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_SAMPLING: str = ""
+
+    # Ограничение частоты запросов (services/rate_limit.py). По умолчанию корзины
+    # в памяти каждого воркера; RATE_LIMIT_REDIS_URL — общие для всех воркеров
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_REDIS_URL: str = ""
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+
+    @field_validator("WEB_CONCURRENCY")
+    @classmethod
+    def default_concurrency(cls, value: int) -> int:
+        return value or (os.cpu_count() or 1)
+
+    @property
+    def DATABASE_URL(self) -> str:
+        return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:5432/{self.DB_NAME}"
+
+    def upload_dir(self, *parts: str) -> str:
+        return os.path.join(self.UPLOAD_DIR, *parts)
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
+
+
+# Каталоги загрузок внутри UPLOAD_DIR; создаются при старте приложения
+UPLOAD_SUBDIRS = ("avatars", "wishes", "community_images")
+
+# Все логгеры пишут через обработчик "queue": на event loop запись только
+# кладётся в очередь, в stdout её выводит отдельный поток. Параметры
+# обработчика, прореживание и уровень root подставляет log_queue.configure()
 LOGGING_CONFIG = {
     "version": 1,
     "disable_existing_loggers": False,
-    "formatters": {
-        "default": {
-            "format": "%(asctime)s %(levelname)s %(name)s: %(message)s",
+    "filters": {
+        "sampling": {
+            "()": "services.log_queue.SamplingFilter",
+            "rates": {},
         },
     },
     "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
-            "formatter": "default",
+        "queue": {
+            "()": "services.log_queue.queue_handler",
+            "filters": ["sampling"],
             "stream": "ext://sys.stdout",
         },
     },
     "loggers": {
         "uvicorn": {
-            "handlers": ["console"],
+            "handlers": ["queue"],
             "level": "DEBUG",
             "propagate": False,
         },
         "uvicorn.error": {
-            "handlers": ["console"],
+            "handlers": ["queue"],
             "level": "DEBUG",
             "propagate": False,
         },
         "uvicorn.access": {
-            "handlers": ["console"],
+            "handlers": ["queue"],
             "level": "INFO",
             "propagate": False,
         },
         "myapp": {
-            "handlers": ["console"],
+            "handlers": ["queue"],
             "level": "DEBUG",
             "propagate": False,
         },
+        # httpx пишет каждый исходящий запрос на INFO
+        "httpx": {
+            "level": "WARNING",
+        },
     },
     "root": {
-        "handlers": ["console"],
+        "handlers": ["queue"],
         "level": "WARNING",
     },
 }
-
-logging.config.dictConfig(LOGGING_CONFIG)
-
@@ -1,15 +1,48 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from functools import lru_cache
+
+from sqlalchemy import Integer, any_, literal
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from config import DB_USER, DB_PASSWORD, DB_HOST, DB_NAME
+from config import get_settings
+from services import query_stats
+from services.metrics import DB_POOL_CHECKOUT, register_pool_metrics
+import time
+
+Base = declarative_base()
 
-DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:5432/{DB_NAME}"
 
-engine = create_async_engine(DATABASE_URL, echo=True)
-AsyncSessionLocal = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+# Движок создаётся при первом обращении (в startup приложения, то есть уже
+# в процессе воркера), а не при импорте модуля
+@lru_cache
+def get_engine() -> AsyncEngine:
+    settings = get_settings()
+    engine = create_async_engine(
+        settings.DATABASE_URL,
+        echo=settings.DB_ECHO,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+    )
+    query_stats.install(engine)
+    register_pool_metrics(engine)
+    return engine
 
-Base = declarative_base()
+
+@lru_cache
+def get_sessionmaker() -> sessionmaker:
+    return sessionmaker(get_engine(), expire_on_commit=False, class_=AsyncSession)
 
 
 async def get_db():
-    async with AsyncSessionLocal() as session:
+    async with get_sessionmaker()() as session:
+        # Берём соединение сразу, чтобы измерить ожидание свободного слота в пуле
+        start = time.perf_counter()
+        await session.connection()
+        DB_POOL_CHECKOUT.observe(time.perf_counter() - start)
         yield session
+
+
+def any_of(column, values):
+    # column = ANY($1): один параметр-массив вместо IN ($1, $2, ...),
+    # поэтому план запроса не зависит от количества id
+    return column == any_(literal(list(values), ARRAY(Integer)))
@@ -0,0 +1,71 @@
+"""
+Продакшен-сервер: gunicorn с воркерами uvicorn (uvloop + httptools).
+
+    gunicorn -c gunicorn_conf.py main:app
+
+Для разработки по-прежнему: uvicorn main:app --reload
+
+Приложение импортируется один раз в мастер-процессе (preload_app) и достаётся
+воркерам через fork. Импорт не открывает соединений: движок и пул создаются
+в lifespan каждого воркера, там же выполняются startup и shutdown приложения.
+По SIGTERM воркеры перестают принимать соединения, дожидаются текущих
+запросов (загрузки файлов, длинные опросы) и только потом останавливают
+фоновые задачи и закрывают пул. За обратным прокси его адрес указывается в
+WEB_FORWARDED_ALLOW_IPS, иначе все клиенты для лимитов по IP — один адрес.
+Логи воркеров, включая access-лог uvicorn,
+идут через очередь services/log_queue.py.
+"""
+from uvicorn_worker import UvicornWorker as BaseUvicornWorker
+
+from config import get_settings
+from services import log_queue
+
+settings = get_settings()
+
+# Запас из graceful_timeout на shutdown приложения (запись пачки взносов,
+# остановка воркеров почты и т.п.), прежде чем gunicorn добьёт процесс
+SHUTDOWN_RESERVE_SECONDS = 5
+
+
+class UvicornWorker(BaseUvicornWorker):
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        # Ошибка startup (например, схема БД не совпала с миграциями) не даёт воркеру стартовать
+        "lifespan": "on",
+        # Адрес клиента из X-Forwarded-For, если запрос пришёл от доверенного
+        # прокси (forwarded_allow_ips ниже); иначе — адрес соединения
+        "proxy_headers": True,
+        "timeout_graceful_shutdown": max(settings.WEB_GRACEFUL_TIMEOUT - SHUTDOWN_RESERVE_SECONDS, 1),
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Базовый класс подменяет обработчики uvicorn.* синхронными обработчиками
+        # gunicorn; возвращаем их в очередь логов приложения (services/log_queue.py)
+        log_queue.attach("uvicorn.error", "uvicorn.access")
+
+
+bind = settings.WEB_BIND
+workers = settings.WEB_CONCURRENCY
+worker_class = "gunicorn_conf.UvicornWorker"
+preload_app = True
+graceful_timeout = settings.WEB_GRACEFUL_TIMEOUT
+keepalive = settings.WEB_KEEPALIVE
+forwarded_allow_ips = settings.WEB_FORWARDED_ALLOW_IPS
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    connections = workers * (settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+    if connections > settings.DB_MAX_CONNECTIONS:
+        server.log.warning(
+            "%s workers x (DB_POOL_SIZE %s + DB_MAX_OVERFLOW %s) = %s connections exceeds DB_MAX_CONNECTIONS %s",
+            workers, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW, connections, settings.DB_MAX_CONNECTIONS,
+        )
+
+
+def worker_exit(server, worker):
+    # Дописать очередь логов воркера до выхода процесса
+    log_queue.stop()
@@ -1,17 +1,23 @@
-from fastapi import (FastAPI, Request, Depends, UploadFile, File,
+from fastapi import (FastAPI, APIRouter, Request, Depends, UploadFile, File,
                      Form, status)
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+from contextlib import asynccontextmanager
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy import select, func
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import select, func, false
+from sqlalchemy.exc import IntegrityError
 
+import hmac
+import ipaddress
 import random
 import os
 import logging
+from functools import lru_cache
 
-from database import Base, engine, get_db
+from database import get_db, get_engine, get_sessionmaker
 import models as models
 from schemas.user_schemas import UserProfileResponse, PrivacyEnum
 from schemas.other_schemas import LikeResponse, LikeCreate, ActivityResponse
@@ -19,6 +25,7 @@ from schemas.wish_schemas import WishWithStats
 from schemas.comment_schemas import CommentResponse, CommentCreate
 import services.crud.user_crud as user_crud
 import services.crud.other_crud as other_crud
+import services.crud.like_crud as like_crud
 import services.auth as auth
 from routers.wishes_router import router as router_wishes
 from routers.auth_router import router as router_auth
@@ -29,67 +36,32 @@ from routers.notifications_router import router as router_notifications
 from routers.likes_router import router as router_likes
 from routers.community_router import router as router_community
 from routers.community_chat_router import router as router_community_chat
-
-from config import LOGGING_CONFIG, UPLOAD_DIR
-import logging.config
+from routers.search_router import router as router_search
+
+from services.query_stats import QueryStatsMiddleware, get_route_stats, prometheus_lines
+from services.metrics import REGISTRY, MetricsMiddleware
+from services.email_outbox import EmailOutboxWorker, SmtpPool
+from services.http_clients import OAuthHttpClients
+from services.schema import verify_schema_version
+from services.jobs import create_scheduler
+from services.trending import TrendingIndex
+from services.funding import ContributionBatcher
+from services.rate_limit import RateLimiter, client_ip, rate_limit
+import services.crud.trending_crud as trending_crud
+from config import UPLOAD_SUBDIRS, get_settings
+from services import log_queue
 
 logger = logging.getLogger(__name__)
-logging.config.dictConfig(LOGGING_CONFIG)
-
-app = FastAPI(title="WishFlick API")
-app.include_router(router_wishes, prefix="/api/wishes", tags=["wishes"])
-app.include_router(router_auth, prefix="/api/auth", tags=["wishes"])
-app.include_router(router_friends, prefix="/api/friends", tags=["friends"])
-app.include_router(router_users, prefix="/api/users", tags=["users"])
-app.include_router(router_posts, prefix="/api/posts", tags=["posts"])
-app.include_router(router_notifications, prefix="/api/notifications", tags=["notifications"])
-app.include_router(router_likes, prefix="/api/likes", tags=["likes"])
-app.include_router(router_community, prefix="/api/communities", tags=["communities"])
-app.include_router(router_community_chat, prefix="/api/community-chat", tags=["community chat"])
-
-origins = [
-    "http://localhost:5173",
-    "http://127.0.0.1:5173",
-    "http://80.78.243.30",
-    "http://80.78.243.30:5173",
-    "http://wishflick.ru",
-    "https://wishflick.ru",
-]
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],  # разрешить все методы
-    allow_headers=["*"],
-)
-
-UPLOAD_DIR_AVATARS = os.path.join(UPLOAD_DIR, "avatars")
-UPLOAD_DIR_WISHES = os.path.join(UPLOAD_DIR, "wishes")
 
-os.makedirs(UPLOAD_DIR_AVATARS, exist_ok=True)
-os.makedirs(UPLOAD_DIR_WISHES, exist_ok=True)
-
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
-
-
-# Создание таблиц (запускайте один раз)
-@app.on_event("startup")
-async def startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
-
-@app.get("/api/")
-async def api_root():
-    return {"message": "API is working"}
+# Эндпоинты, объявленные в этом модуле; приложение собирает create_app()
+router = APIRouter()
 
 
 def generate_verification_code():
     return f"{random.randint(100000, 999999)}"
 
 
-@app.put("/api/profile", response_model=UserProfileResponse)
+@router.put("/api/profile", response_model=UserProfileResponse)
 async def update_profile(
         request: Request,
         name: Optional[str] = Form(None),
@@ -101,14 +73,14 @@ async def update_profile(
         social_instagram: Optional[str] = Form(None),
         is_influencer: Optional[bool] = Form(False),
         avatar: UploadFile = File(None),
-        current_user: models.User = Depends(auth.get_current_user),
+        current_user: models.User = Depends(auth.get_current_user_or_saved_guest),
         db: AsyncSession = Depends(get_db),
 ):
     try:
         user = await user_crud.update_user_profile(
             db,
             current_user,
-            UPLOAD_DIR=UPLOAD_DIR_AVATARS,
+            UPLOAD_DIR=get_settings().upload_dir("avatars"),
             name=name,
             email=email,
             description=description,
@@ -119,6 +91,7 @@ async def update_profile(
             is_influencer=is_influencer,
             avatar_file=avatar,
         )
+        await db.commit()
 
         # Формируем полный URL для фронтенда
         if user.avatar_url and user.avatar_url.startswith('/'):
@@ -131,39 +104,47 @@ async def update_profile(
         raise HTTPException(status_code=500, detail="Failed to update profile user")
 
 
-@app.post("/api/comments", response_model=CommentResponse)
+@router.post("/api/comments", response_model=CommentResponse,
+             dependencies=[Depends(rate_limit("write.comment"))])
 async def post_comment(
         comment_create: CommentCreate,
-        current_user: models.User = Depends(auth.get_current_user),
+        current_user: models.User = Depends(auth.get_current_user_or_saved_guest),
         db: AsyncSession = Depends(get_db)
 ):
     try:
+        # Комментарий, рейтинг и активность — одна транзакция
         comment = await other_crud.create_comment(db, current_user.id, comment_create.wish_id, comment_create.content)
+        await trending_crud.record_event(db, comment_create.wish_id, trending_crud.COMMENT)
         await other_crud.create_activity(db, current_user.id, models.ActivityType.comment, target_type="wish",
                                          target_id=comment_create.wish_id)
+        await db.commit()
         return comment
     except Exception as e:
         logging.error("Failed to create comment: %s", e)
         raise HTTPException(status_code=500, detail="Failed to create comment")
 
 
-@app.post("/api/likes", response_model=LikeResponse)
+@router.post("/api/likes", response_model=LikeResponse, dependencies=[Depends(rate_limit("write.like"))])
 async def post_like(
         like_create: LikeCreate,
-        current_user: models.User = Depends(auth.get_current_user),
+        current_user: models.User = Depends(auth.get_current_user_or_saved_guest),
         db: AsyncSession = Depends(get_db)
 ):
     try:
-        like = await other_crud.create_like(db, current_user.id, like_create.wish_id)
-        await other_crud.create_activity(db, current_user.id, models.ActivityType.like, target_type="wish",
-                                         target_id=like_create.wish_id)
-        return like
+        # Лайк, счётчики и активность — одним запросом; повторный лайк возвращает существующий
+        like = await like_crud.create_like(db, current_user.id, like_create.wish_id)
+        await db.commit()
+        if like is None:
+            like = await like_crud.get_like(db, current_user.id, like_create.wish_id)
+        return LikeResponse(id=like.id, user_id=like.user_id, wish_id=like.wish_id, created_at=like.created_at)
+    except IntegrityError:
+        raise HTTPException(status_code=404, detail="Wish not found")
     except Exception as e:
         logging.error("Failed to create like: %s", e)
         raise HTTPException(status_code=500, detail="Failed to create like")
 
 
-@app.get("/api/activities", response_model=List[ActivityResponse])
+@router.get("/api/activities", response_model=List[ActivityResponse])
 async def get_activities_feed(db: AsyncSession = Depends(get_db)):
     try:
         activities = await other_crud.get_activities(db)
@@ -173,16 +154,17 @@ async def get_activities_feed(db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Failed to get activities")
 
 
-@app.post("/api/activities/{activity_id}/like",
-          status_code=status.HTTP_201_CREATED)
+@router.post("/api/activities/{activity_id}/like",
+             status_code=status.HTTP_201_CREATED, dependencies=[Depends(rate_limit("write.like"))])
 async def like_activity_endpoint(
         activity_id: int,
         db: AsyncSession = Depends(get_db),
-        current_user: models.User = Depends(auth.get_current_user),
+        current_user: models.User = Depends(auth.get_current_user_or_saved_guest),
 ):
     try:
         # Вызываем функцию из crud
         await other_crud.like_activity(db, activity_id, current_user.id)
+        await db.commit()
         return {"message": "Activity liked successfully"}
 
     except HTTPException as e:
@@ -195,9 +177,12 @@ async def like_activity_endpoint(
         raise HTTPException(status_code=500, detail="Failed to create like for activity")
 
 
-@app.get("/api/community/wishes",
+@router.get("/api/community/wishes",
          response_model=List[WishWithStats])
-async def get_public_wishes(db: AsyncSession = Depends(get_db)):
+async def get_public_wishes(
+        viewer_id: Optional[int] = Depends(auth.get_current_user_id_optional),
+        db: AsyncSession = Depends(get_db),
+):
     try:
         # Алиасы для подсчёта лайков и комментариев
         likes_subq = select(
@@ -210,6 +195,14 @@ async def get_public_wishes(db: AsyncSession = Depends(get_db)):
             func.count(models.Comment.id).label("comments_count")
         ).group_by(models.Comment.wish_id).subquery()
 
+        # Лайк текущего пользователя — в том же запросе, чтобы лента рисовалась за один запрос
+        if viewer_id is not None:
+            liked_by_me = select(models.Like.id).where(
+                models.Like.wish_id == models.Wish.id, models.Like.user_id == viewer_id
+            ).exists()
+        else:
+            liked_by_me = false()
+
         # Основной запрос — публичные вишлисты с подсчётами
         stmt = (
             select(
@@ -218,6 +211,7 @@ async def get_public_wishes(db: AsyncSession = Depends(get_db)):
                 func.coalesce(comments_subq.c.comments_count, 0),
                 models.User.name.label("owner_name"),
                 models.User.avatar_url.label("owner_avatar"),
+                liked_by_me.label("liked_by_me"),
             )
             .join(models.User, models.Wish.owner_id == models.User.id)
             .outerjoin(likes_subq, likes_subq.c.wish_id == models.Wish.id)
@@ -229,7 +223,7 @@ async def get_public_wishes(db: AsyncSession = Depends(get_db)):
 
         result = await db.execute(stmt)
         wishes_with_stats = []
-        for wish, likes_count, comments_count, owner_name, owner_avatar in result.all():
+        for wish, likes_count, comments_count, owner_name, owner_avatar, is_liked in result.all():
             wishes_with_stats.append({
                 "id": wish.id,
                 "title": wish.title,
@@ -243,8 +237,160 @@ async def get_public_wishes(db: AsyncSession = Depends(get_db)):
                 "likes_count": likes_count,
                 "comments_count": comments_count,
                 "is_public": wish.is_public,
+                "liked_by_me": is_liked,
             })
         return wishes_with_stats
     except Exception as e:
         logging.error("Failed to get public wishes wish: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get public wishes")
+
+
+ORIGINS = [
+    "http://localhost:5173",
+    "http://127.0.0.1:5173",
+    "http://80.78.243.30",
+    "http://80.78.243.30:5173",
+    "http://wishflick.ru",
+    "https://wishflick.ru",
+]
+
+
+# Схема создаётся и обновляется миграциями (python manage.py migrate),
+# при старте воркера только сверяется версия. Движок, пул соединений и
+# каталоги загрузок создаются здесь, а не при импорте модулей
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    for subdir in UPLOAD_SUBDIRS:
+        os.makedirs(settings.upload_dir(subdir), exist_ok=True)
+
+    engine = get_engine()
+    session_factory = get_sessionmaker()
+    if settings.DB_SCHEMA_CHECK == "verify":
+        await verify_schema_version(engine)
+
+    smtp_pool = SmtpPool(
+        hostname=settings.SMTP_HOST,
+        port=settings.SMTP_PORT,
+        username=settings.SMTP_USERNAME,
+        password=settings.EMAIL_BEGET_PASSWORD,
+        start_tls=settings.SMTP_START_TLS,
+        size=settings.SMTP_POOL_SIZE,
+    )
+    app.state.email_outbox = EmailOutboxWorker(
+        session_factory,
+        smtp_pool,
+        sender=settings.EMAIL_FROM,
+        batch_size=settings.EMAIL_OUTBOX_BATCH_SIZE,
+        poll_interval=settings.EMAIL_OUTBOX_POLL_SECONDS,
+        max_attempts=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+        lease_seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS,
+    )
+    app.state.email_outbox.start()
+
+    app.state.oauth_http = OAuthHttpClients.create(
+        timeout=settings.OAUTH_HTTP_TIMEOUT,
+        max_connections=settings.OAUTH_HTTP_MAX_CONNECTIONS,
+        concurrency_per_provider=settings.OAUTH_PROVIDER_CONCURRENCY,
+    )
+
+    app.state.trending = TrendingIndex()
+    # Периодические задачи: обновление кеша рейтинга и обслуживание БД
+    app.state.scheduler = create_scheduler(settings, engine, session_factory, app.state.trending)
+    app.state.scheduler.start()
+
+    app.state.funding = ContributionBatcher(session_factory, max_batch=settings.FUNDING_MAX_BATCH)
+
+    yield
+
+    await app.state.funding.stop()
+    # Текущим задачам — половина времени на остановку воркера, остальное — прочим шагам
+    await app.state.scheduler.stop(timeout=settings.WEB_GRACEFUL_TIMEOUT / 2)
+    await app.state.email_outbox.stop()
+    await app.state.oauth_http.aclose()
+    await app.state.rate_limiter.aclose()
+    # Закрываем пул воркера последним: фоновые задачи выше ещё пишут в БД
+    await engine.dispose()
+
+
+@router.get("/api/")
+async def api_root():
+    return {"message": "API is working"}
+
+
+@lru_cache
+def _metrics_networks(allow_ips: str) -> tuple:
+    return tuple(ipaddress.ip_network(item.strip(), strict=False) for item in allow_ips.split(",") if item.strip())
+
+
+def require_metrics_access(request: Request):
+    # Метрики раскрывают маршруты, нагрузку и состояние пула — не публичные
+    settings = get_settings()
+    if settings.METRICS_TOKEN and hmac.compare_digest(
+            request.headers.get("authorization", "").encode(), f"Bearer {settings.METRICS_TOKEN}".encode()):
+        return
+    try:
+        address = ipaddress.ip_address(client_ip(request))
+    except ValueError:
+        address = None
+    if address is None or not any(address in network for network in _metrics_networks(settings.METRICS_ALLOW_IPS)):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+
+@router.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_access)])
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+async def query_stats_endpoint():
+    return get_route_stats()
+
+
+def create_app() -> FastAPI:
+    """
+    Сборка приложения: маршруты, middleware, статика. Ни БД, ни файловой
+    системы не касается — это делает lifespan при старте.
+    """
+    settings = get_settings()
+    log_queue.configure(settings)
+
+    app = FastAPI(title="WishFlick API", lifespan=lifespan)
+    # Без сетевых соединений при создании: Redis (если задан) подключается при первом запросе
+    app.state.rate_limiter = RateLimiter.create(settings)
+    app.include_router(router_wishes, prefix="/api/wishes", tags=["wishes"])
+    app.include_router(router_auth, prefix="/api/auth", tags=["wishes"])
+    app.include_router(router_friends, prefix="/api/friends", tags=["friends"])
+    app.include_router(router_users, prefix="/api/users", tags=["users"])
+    app.include_router(router_posts, prefix="/api/posts", tags=["posts"])
+    app.include_router(router_notifications, prefix="/api/notifications", tags=["notifications"])
+    app.include_router(router_likes, prefix="/api/likes", tags=["likes"])
+    app.include_router(router_community, prefix="/api/communities", tags=["communities"])
+    app.include_router(router_community_chat, prefix="/api/community-chat", tags=["community chat"])
+    app.include_router(router_search, prefix="/api/search", tags=["search"])
+    app.include_router(router)
+    # Отладочный режим: статистика запросов к БД по маршрутам
+    if settings.DEBUG:
+        app.add_api_route("/api/debug/query-stats", query_stats_endpoint, methods=["GET"])
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],  # разрешить все методы
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"] + (
+            ["X-DB-Query-Count", "X-DB-Time-Ms", "X-DB-Slowest-Ms", "X-DB-Rows"] if settings.DEBUG else []
+        ),
+    )
+    app.add_middleware(QueryStatsMiddleware, debug=settings.DEBUG, strict=settings.QUERY_BUDGET_STRICT)
+    app.add_middleware(MetricsMiddleware)
+
+    REGISTRY.register_collector(prometheus_lines)
+
+    # Каталог создаётся в lifespan, поэтому при сборке его наличие не проверяем
+    app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR, check_dir=False), name="uploads")
+    return app
+
+
+# uvicorn main:app / gunicorn main:app; фабрика — uvicorn --factory main:create_app
+app = create_app()
@@ -0,0 +1,67 @@
+import argparse
+import asyncio
+
+from alembic import command
+
+from services.schema import get_alembic_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WishFlick: управление схемой БД")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser("migrate", help="применить миграции")
+    migrate.add_argument("revision", nargs="?", default="head")
+    migrate.add_argument("--sql", action="store_true", help="напечатать SQL вместо выполнения")
+
+    downgrade = subparsers.add_parser("downgrade", help="откатить миграции")
+    downgrade.add_argument("revision")
+
+    subparsers.add_parser("current", help="текущая ревизия БД")
+    subparsers.add_parser("history", help="список миграций")
+
+    stamp = subparsers.add_parser("stamp", help="пометить ревизию применённой без выполнения")
+    stamp.add_argument("revision")
+
+    subparsers.add_parser("reconcile-stats", help="пересчитать user_stats по исходным таблицам")
+
+    purge_guests = subparsers.add_parser("purge-guests", help="удалить строки гостей, созданные до гостевых токенов")
+    purge_guests.add_argument("--batch-size", type=int, default=1000)
+    purge_guests.add_argument("--reindex", action="store_true",
+                              help="затем REINDEX CONCURRENTLY и VACUUM ANALYZE таблицы users")
+
+    makemigrations = subparsers.add_parser("makemigrations", help="создать миграцию по изменениям models.py")
+    makemigrations.add_argument("-m", "--message", required=True)
+
+    args = parser.parse_args()
+    config = get_alembic_config()
+    config.attributes["configure_logger"] = True
+
+    if args.command == "migrate":
+        command.upgrade(config, args.revision, sql=args.sql)
+    elif args.command == "downgrade":
+        command.downgrade(config, args.revision)
+    elif args.command == "current":
+        command.current(config, verbose=True)
+    elif args.command == "history":
+        command.history(config)
+    elif args.command == "stamp":
+        command.stamp(config, args.revision)
+    elif args.command == "reconcile-stats":
+        from database import get_engine, get_sessionmaker
+        from services.user_stats import reconcile_all
+
+        fixed = asyncio.run(reconcile_all(get_engine(), get_sessionmaker()))
+        print("another reconciliation is running" if fixed is None else f"corrected rows: {fixed}")
+    elif args.command == "purge-guests":
+        from database import get_engine, get_sessionmaker
+        from services.guests import purge_guests
+
+        deleted = asyncio.run(purge_guests(get_engine(), get_sessionmaker(), args.batch_size, args.reindex))
+        print(f"deleted guest users: {deleted}")
+    elif args.command == "makemigrations":
+        command.revision(config, message=args.message, autogenerate=True)
+
+
+if __name__ == "__main__":
+    main()
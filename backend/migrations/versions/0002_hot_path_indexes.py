@@ -0,0 +1,71 @@
+"""hot path indexes
+
+Индексы для внешних ключей и сортировок, по которым фильтруют горячие запросы
+(лента, комментарии, лайки, уведомления, участники и чат сообществ).
+Создаются CONCURRENTLY, чтобы не блокировать запись в рабочую БД.
+Проверка планов: python -m benchmarks.explain_plans
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 13:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (имя, таблица, колонки, условие частичного индекса)
+INDEXES = [
+    ('ix_friend_association_friend_id', 'friend_association', ['friend_id'], None),
+    ('ix_email_verification_user_id', 'email_verification', ['user_id'], None),
+    ('ix_wish_supporters_wish_id', 'wish_supporters', ['wish_id'], None),
+    ('ix_wish_supporters_user_id', 'wish_supporters', ['user_id'], None),
+    ('ix_wishes_owner_id_created_at', 'wishes', ['owner_id', 'created_at'], None),
+    ('ix_wishes_public_created_at', 'wishes', [sa.text('created_at DESC')], 'is_public = true'),
+    ('ix_wishes_influencer_created_at', 'wishes', [sa.text('created_at DESC')],
+     'is_public = true AND is_influencer_public = true'),
+    ('ix_wishes_community_id', 'wishes', ['community_id'], 'community_id IS NOT NULL'),
+    ('ix_activities_created_at', 'activities', [sa.text('created_at DESC')], None),
+    ('ix_activities_user_id', 'activities', ['user_id'], None),
+    ('ix_comments_wish_id_created_at', 'comments', ['wish_id', sa.text('created_at DESC')], None),
+    ('ix_comments_user_id', 'comments', ['user_id'], None),
+    ('ix_likes_wish_id', 'likes', ['wish_id'], None),
+    ('ix_activity_likes_activity_id', 'activity_likes', ['activity_id'], None),
+    ('ix_posts_owner_id_created_at', 'posts', ['owner_id', 'created_at'], None),
+    ('ix_notifications_recipient_created_at', 'notifications',
+     ['recipient_id', sa.text('created_at DESC')], None),
+    ('ix_notifications_recipient_unread', 'notifications',
+     ['recipient_id', sa.text('created_at DESC')], 'is_read = false'),
+    ('ix_notifications_sender_id', 'notifications', ['sender_id'], None),
+    ('ix_community_members_community_user', 'community_members', ['community_id', 'user_id'], None),
+    ('ix_community_members_user_id', 'community_members', ['user_id'], None),
+    ('ix_community_chat_messages_community_sent_at', 'community_chat_messages',
+     ['community_id', 'sent_at'], None),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+    for table in sorted({table for _, table, _, _ in INDEXES}):
+        op.execute(f"ANALYZE {table}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,67 @@
+"""search columns and indexes
+
+tsvector-колонки (generated, STORED) для полнотекстового поиска по желаниям,
+пользователям и сообществам, GIN-индексы по ним и триграммные индексы
+(pg_trgm) для поиска с опечатками.
+
+Добавление STORED-колонки переписывает таблицу — применять в период низкой нагрузки.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 14:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+
+
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Должны совпадать с *_SEARCH_EXPR в models.py на момент этой ревизии
+SEARCH_COLUMNS = [
+    ('users', "to_tsvector('simple', coalesce(name, ''))"),
+    ('wishes', "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+               "setweight(to_tsvector('russian', coalesce(description, '')), 'B')"),
+    ('communities', "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+                    "setweight(to_tsvector('russian', coalesce(category, '')), 'B') || "
+                    "setweight(to_tsvector('russian', coalesce(description, '')), 'C')"),
+]
+
+TRIGRAM_INDEXES = [
+    ('ix_users_name_trgm', 'users', 'name'),
+    ('ix_wishes_title_trgm', 'wishes', 'title'),
+    ('ix_communities_name_trgm', 'communities', 'name'),
+]
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table, expression in SEARCH_COLUMNS:
+        op.add_column(table, sa.Column('search_vector', TSVECTOR(), sa.Computed(expression, persisted=True)))
+
+    with op.get_context().autocommit_block():
+        for table, _ in SEARCH_COLUMNS:
+            op.create_index(f'ix_{table}_search_vector', table, ['search_vector'],
+                            postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True)
+        for name, table, column in TRIGRAM_INDEXES:
+            op.create_index(name, table, [column], postgresql_using='gin',
+                            postgresql_ops={column: 'gin_trgm_ops'},
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in TRIGRAM_INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+        for table, _ in SEARCH_COLUMNS:
+            op.drop_index(f'ix_{table}_search_vector', table_name=table,
+                          postgresql_concurrently=True, if_exists=True)
+    for table, _ in SEARCH_COLUMNS:
+        op.drop_column(table, 'search_vector')
@@ -0,0 +1,50 @@
+"""wish trending scores
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 15:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('wish_trending',
+    sa.Column('wish_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['wish_id'], ['wishes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('wish_id')
+    )
+    op.create_index('ix_wish_trending_score', 'wish_trending', [sa.text('score DESC')], unique=False)
+
+    # Начальные рейтинги из уже накопленных лайков, комментариев и поддержек:
+    # ln(sum(вес * 2^((t - эпоха) / 24ч))), эпоха 2025-01-01 UTC, как в trending_crud
+    op.execute("""
+        INSERT INTO wish_trending (wish_id, score)
+        SELECT wish_id,
+               ln(sum(weight * exp(ln(2) * (extract(epoch FROM at) - 1735689600) / 86400.0
+                                   - ln(2) * (extract(epoch FROM now()) - 1735689600) / 86400.0)))
+               + ln(2) * (extract(epoch FROM now()) - 1735689600) / 86400.0
+        FROM (
+            SELECT wish_id, 1.0 AS weight, created_at AS at FROM likes
+            UNION ALL SELECT wish_id, 2.0, created_at FROM comments
+            UNION ALL SELECT wish_id, 4.0, supported_at FROM wish_supporters WHERE wish_id IS NOT NULL
+        ) events
+        WHERE at > now() - interval '30 days'
+        GROUP BY wish_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_wish_trending_score', table_name='wish_trending')
+    op.drop_table('wish_trending')
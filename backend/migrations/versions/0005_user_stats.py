@@ -0,0 +1,70 @@
+"""user stats read model
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 16:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('wish_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('public_wish_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('friend_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('total_raised', sa.Float(), server_default='0', nullable=False),
+    sa.Column('likes_received', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('communities_joined', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # Начальное заполнение по существующим данным. SQL зафиксирован здесь, а не
+    # берётся из services/crud/user_stats_crud.py: сверка там меняется вместе со
+    # схемой, а миграция должна выполнять то, что соответствует этой ревизии
+    op.execute("""
+        INSERT INTO user_stats (user_id, wish_count, public_wish_count, friend_count, total_raised,
+                                likes_received, communities_joined, updated_at)
+        SELECT u.id,
+               coalesce(w.wish_count, 0),
+               coalesce(w.public_wish_count, 0),
+               coalesce(f.friend_count, 0),
+               coalesce(w.total_raised, 0),
+               coalesce(l.likes_received, 0),
+               coalesce(m.communities_joined, 0),
+               now()
+        FROM users u
+        LEFT JOIN (
+            SELECT owner_id, count(*) AS wish_count, count(*) FILTER (WHERE is_public) AS public_wish_count,
+                   sum(coalesce(raised, 0)) AS total_raised
+            FROM wishes GROUP BY owner_id
+        ) w ON w.owner_id = u.id
+        LEFT JOIN (
+            SELECT user_id, count(*) AS friend_count
+            FROM friend_association GROUP BY user_id
+        ) f ON f.user_id = u.id
+        LEFT JOIN (
+            SELECT w.owner_id, count(*) AS likes_received
+            FROM likes JOIN wishes w ON w.id = likes.wish_id
+            GROUP BY w.owner_id
+        ) l ON l.owner_id = u.id
+        LEFT JOIN (
+            SELECT user_id, count(DISTINCT community_id) AS communities_joined
+            FROM community_members GROUP BY user_id
+        ) m ON m.user_id = u.id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('user_stats')
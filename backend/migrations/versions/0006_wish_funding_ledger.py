@@ -0,0 +1,57 @@
+"""wish funding ledger: decimal amounts and idempotency keys
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 17:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('wish_supporters', sa.Column('amount', sa.Numeric(precision=12, scale=2),
+                                               server_default='0', nullable=False))
+    op.add_column('wish_supporters', sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+    op.create_unique_constraint('uq_wish_supporters_user_idempotency_key', 'wish_supporters',
+                                ['user_id', 'idempotency_key'])
+
+    # raised + x при NULL даёт NULL, поэтому сначала убираем NULL.
+    # Смена типа переписывает таблицу wishes — выполнять в окно обслуживания
+    op.execute("UPDATE wishes SET raised = 0 WHERE raised IS NULL")
+    op.alter_column('wishes', 'raised',
+                    existing_type=sa.Float(),
+                    type_=sa.Numeric(precision=14, scale=2),
+                    postgresql_using='round(raised::numeric, 2)',
+                    server_default='0',
+                    nullable=False)
+    op.alter_column('user_stats', 'total_raised',
+                    existing_type=sa.Float(),
+                    type_=sa.Numeric(precision=14, scale=2),
+                    postgresql_using='round(total_raised::numeric, 2)',
+                    existing_server_default='0',
+                    existing_nullable=False)
+
+
+def downgrade() -> None:
+    op.alter_column('user_stats', 'total_raised',
+                    existing_type=sa.Numeric(precision=14, scale=2),
+                    type_=sa.Float(),
+                    existing_server_default='0',
+                    existing_nullable=False)
+    op.alter_column('wishes', 'raised',
+                    existing_type=sa.Numeric(precision=14, scale=2),
+                    type_=sa.Float(),
+                    server_default=None,
+                    nullable=True)
+    op.drop_constraint('uq_wish_supporters_user_idempotency_key', 'wish_supporters', type_='unique')
+    op.drop_column('wish_supporters', 'idempotency_key')
+    op.drop_column('wish_supporters', 'amount')
@@ -0,0 +1,41 @@
+"""email verification expiry
+
+Срок действия кодов подтверждения и индекс (user_id, code) для проверки кода.
+Уже выданным кодам срок считается от created_at (сутки, как
+EMAIL_VERIFICATION_TTL_MINUTES по умолчанию), так что брошенные регистрации
+прошлых лет удалит первая же очистка.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 19:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('email_verification', sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE email_verification "
+               "SET expires_at = coalesce(created_at, now()) + interval '1 day'")
+    op.alter_column('email_verification', 'expires_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+
+    # (user_id, code) заменяет индекс по user_id: его префикс обслуживает и FK
+    op.create_index('ix_email_verification_user_id_code', 'email_verification', ['user_id', 'code'])
+    op.drop_index('ix_email_verification_user_id', table_name='email_verification')
+    op.create_index('ix_email_verification_expires_at', 'email_verification', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_email_verification_expires_at', table_name='email_verification')
+    op.create_index('ix_email_verification_user_id', 'email_verification', ['user_id'])
+    op.drop_index('ix_email_verification_user_id_code', table_name='email_verification')
+    op.drop_column('email_verification', 'expires_at')
@@ -0,0 +1,117 @@
+"""partition activities by month
+
+activities пересоздаётся как секционированная по диапазону created_at
+(секция на месяц, services/activity_archive.py) с секциями от самого раннего
+месяца данных до трёх месяцев вперёд; дальше их создаёт задача
+activity-partitions. Секция по умолчанию activities_default принимает строки,
+для месяца которых секции ещё нет (задача отстала), — вставка не падает.
+Первичный ключ — (id, created_at), последовательность id прежняя. Внешний
+ключ activity_likes.activity_id снимается: ссылаться на секционированную
+таблицу можно только ключом с created_at.
+
+Секции создаются в SQL (DO-блок), поэтому миграция работает и в offline-режиме
+(manage.py migrate --sql).
+
+Таблица переписывается целиком — выполнять в окно обслуживания.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 20:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+COLUMNS = "id, user_id, type, target_type, target_id, created_at"
+
+
+def upgrade() -> None:
+    op.drop_constraint('activity_likes_activity_id_fkey', 'activity_likes', type_='foreignkey')
+
+    op.execute("""
+        CREATE TABLE activities_partitioned (
+            id integer NOT NULL DEFAULT nextval('activities_id_seq'),
+            user_id integer NOT NULL REFERENCES users (id),
+            type activitytype NOT NULL,
+            target_type varchar,
+            target_id integer,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            CONSTRAINT activities_partitioned_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+
+    # Секции activities_yYYYYmMM по месяцам UTC, границы явно в UTC
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month date;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', coalesce((SELECT min(created_at) FROM activities)::timestamptz, now())
+                                        AT TIME ZONE 'UTC'),
+                    date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{MONTHS_AHEAD} months',
+                    interval '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF activities_partitioned FOR VALUES FROM (%L) TO (%L)',
+                    to_char(month, '"activities_y"YYYY"m"MM'),
+                    month || ' 00:00:00+00',
+                    (month + interval '1 month')::date || ' 00:00:00+00'
+                );
+            END LOOP;
+        END
+        $$
+    """)
+    op.execute("CREATE TABLE activities_default PARTITION OF activities_partitioned DEFAULT")
+
+    op.execute(f"INSERT INTO activities_partitioned ({COLUMNS}) "
+               f"SELECT id, user_id, type, target_type, target_id, coalesce(created_at, now()) FROM activities")
+    # Последовательность удалилась бы вместе со старой таблицей
+    op.execute("ALTER SEQUENCE activities_id_seq OWNED BY activities_partitioned.id")
+    op.drop_table('activities')
+    op.rename_table('activities_partitioned', 'activities')
+    op.execute("ALTER TABLE activities RENAME CONSTRAINT activities_partitioned_pkey TO activities_pkey")
+    op.execute("ALTER TABLE activities RENAME CONSTRAINT activities_partitioned_user_id_fkey "
+               "TO activities_user_id_fkey")
+
+    # Индексы на родителе создаются и во всех секциях, в том числе будущих
+    op.create_index('ix_activities_created_at', 'activities', [sa.text('created_at DESC')])
+    op.create_index('ix_activities_user_id', 'activities', ['user_id'])
+
+
+def downgrade() -> None:
+    # Архивированные секции не возвращаются: остаются только строки из БД
+    op.execute("""
+        CREATE TABLE activities_plain (
+            id integer NOT NULL DEFAULT nextval('activities_id_seq') PRIMARY KEY,
+            user_id integer NOT NULL REFERENCES users (id),
+            type activitytype NOT NULL,
+            target_type varchar,
+            target_id integer,
+            created_at timestamptz DEFAULT now()
+        )
+    """)
+    op.execute(f"INSERT INTO activities_plain ({COLUMNS}) SELECT {COLUMNS} FROM activities")
+    op.execute("ALTER SEQUENCE activities_id_seq OWNED BY activities_plain.id")
+    op.drop_table('activities')
+    op.rename_table('activities_plain', 'activities')
+    op.execute("ALTER TABLE activities RENAME CONSTRAINT activities_plain_pkey TO activities_pkey")
+    op.execute("ALTER TABLE activities RENAME CONSTRAINT activities_plain_user_id_fkey TO activities_user_id_fkey")
+    op.create_index('ix_activities_id', 'activities', ['id'])
+    op.create_index('ix_activities_created_at', 'activities', [sa.text('created_at DESC')])
+    op.create_index('ix_activities_user_id', 'activities', ['user_id'])
+
+    op.execute("DELETE FROM activity_likes WHERE activity_id NOT IN (SELECT id FROM activities)")
+    op.create_foreign_key('activity_likes_activity_id_fkey', 'activity_likes', 'activities',
+                          ['activity_id'], ['id'])
@@ -0,0 +1,79 @@
+"""notification retention and pending request coalescing
+
+Повторяющиеся ожидающие заявки (в друзья, в сообщество) от одного
+отправителя сливаются в одну — самую новую, после чего уникальный частичный
+индекс не даёт появиться новым дубликатам. Частичный индекс по обработанным
+уведомлениям обслуживает очистку по сроку хранения. Индексы создаются
+CONCURRENTLY; если между очисткой дубликатов и созданием уникального индекса
+успел появиться новый дубликат, миграцию нужно повторить: оставшийся после
+неудачной попытки невалидный индекс (pg_index.indisvalid = false) удаляется
+и создаётся заново.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 21:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PENDING_REQUEST = "status = 'pending' AND type IN ('friend_request', 'join_request')"
+RESOLVED = "status <> 'pending' OR (type = 'message' AND is_read)"
+
+
+def drop_invalid_index(name: str) -> None:
+    # Прерванный CREATE INDEX CONCURRENTLY оставляет индекс INVALID: запросы его
+    # не используют, а IF NOT EXISTS его молча пропустил бы
+    if context.is_offline_mode():
+        # В SQL-скрипте (manage.py migrate --sql) состояние индекса не проверить:
+        # индекс, если он есть, удаляется и строится заново
+        op.drop_index(name, table_name='notifications', postgresql_concurrently=True, if_exists=True)
+        return
+    valid = op.get_bind().execute(sa.text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND c.relnamespace = current_schema()::regnamespace"
+    ), {"name": name}).scalar()
+    if valid is False:
+        op.drop_index(name, table_name='notifications', postgresql_concurrently=True)
+
+
+def upgrade() -> None:
+    op.execute("""
+        DELETE FROM notifications n
+        USING notifications newer
+        WHERE n.status = 'pending'
+          AND n.type IN ('friend_request', 'join_request')
+          AND newer.status = 'pending'
+          AND newer.type = n.type
+          AND newer.recipient_id = n.recipient_id
+          AND newer.sender_id = n.sender_id
+          AND coalesce(newer.community_id, 0) = coalesce(n.community_id, 0)
+          AND (newer.created_at, newer.id) > (n.created_at, n.id)
+    """)
+
+    with op.get_context().autocommit_block():
+        drop_invalid_index('uq_notifications_pending_request')
+        drop_invalid_index('ix_notifications_resolved_created_at')
+        op.create_index('uq_notifications_pending_request', 'notifications',
+                        ['recipient_id', 'sender_id', 'type', sa.text('coalesce(community_id, 0)')],
+                        unique=True, postgresql_where=sa.text(PENDING_REQUEST),
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_notifications_resolved_created_at', 'notifications', ['type', 'created_at'],
+                        postgresql_where=sa.text(RESOLVED),
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_notifications_resolved_created_at', table_name='notifications',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('uq_notifications_pending_request', table_name='notifications',
+                      postgresql_concurrently=True, if_exists=True)
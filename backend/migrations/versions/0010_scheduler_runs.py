@@ -0,0 +1,35 @@
+"""scheduler runs
+
+Последний выполненный запуск каждой задачи обслуживания: advisory-lock
+держится только на время выполнения, и без этой отметки процесс, сработавший
+позже лидера, повторял бы тот же запуск.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 22:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'scheduler_runs',
+        sa.Column('job_name', sa.String(), nullable=False),
+        sa.Column('fire_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('job_name'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('scheduler_runs')
@@ -0,0 +1,31 @@
+"""community member count
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 23:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0011'
+down_revision: Union[str, None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('communities', sa.Column('member_count', sa.Integer(), server_default='0', nullable=False))
+    # Начальное заполнение по существующим участникам
+    op.execute("""
+        UPDATE communities c SET member_count = m.member_count
+        FROM (SELECT community_id, count(*) AS member_count FROM community_members GROUP BY community_id) m
+        WHERE m.community_id = c.id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('communities', 'member_count')
@@ -1,13 +1,29 @@
 from sqlalchemy import (Column, Integer, String, Text, Enum, ForeignKey, Float,
                         DateTime, UniqueConstraint, func, Boolean, BigInteger,
-                        Table, Enum)
-from sqlalchemy.orm import relationship
+                        Table, Enum, Index, Computed, DDL, event, Numeric, text)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from database import Base
 import enum
 from enum import Enum as PyEnum
 from datetime import datetime, timedelta, timezone
 from sqlalchemy import Enum as SqlEnum
 
+# Триграммные индексы (поиск с опечатками) требуют расширения pg_trgm.
+# В рабочей БД его создаёт миграция 0003, здесь — для create_all в бенчмарках
+event.listen(Base.metadata, "before_create",
+             DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+
+# Выражения для поисковых колонок (generated columns), см. services/crud/search_crud.py.
+# Имена не стеммируются (simple), тексты — русским словарём с весами полей.
+# Колонки отложенные (deferred): обычные выборки моделей их не читают
+USER_SEARCH_EXPR = "to_tsvector('simple', coalesce(name, ''))"
+WISH_SEARCH_EXPR = ("setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+                    "setweight(to_tsvector('russian', coalesce(description, '')), 'B')")
+COMMUNITY_SEARCH_EXPR = ("setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+                         "setweight(to_tsvector('russian', coalesce(category, '')), 'B') || "
+                         "setweight(to_tsvector('russian', coalesce(description, '')), 'C')")
+
 
 # --- users ---
 
@@ -23,7 +39,9 @@ friend_association = Table(
     Base.metadata,
     Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
     Column("friend_id", Integer, ForeignKey("users.id"), primary_key=True),
-    UniqueConstraint("user_id", "friend_id", name="uq_user_friend")
+    UniqueConstraint("user_id", "friend_id", name="uq_user_friend"),
+    # Первичный ключ (user_id, friend_id) покрывает поиск по user_id, обратное направление — отдельно
+    Index("ix_friend_association_friend_id", "friend_id"),
 )
 
 
@@ -49,6 +67,8 @@ class User(Base):
 
     is_guest = Column(Boolean, default=False, nullable=False)
 
+    search_vector = deferred(Column(TSVECTOR, Computed(USER_SEARCH_EXPR, persisted=True)))
+
     # relationships
     wishes = relationship("Wish", back_populates="owner", lazy="selectin")
     email_verifications = relationship(
@@ -66,6 +86,26 @@ class User(Base):
     )
     posts = relationship("Post", back_populates="owner", lazy="selectin")
 
+    __table_args__ = (
+        Index("ix_users_search_vector", search_vector, postgresql_using="gin"),
+        Index("ix_users_name_trgm", name, postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+    )
+
+
+class UserStats(Base):
+    # Счётчики профиля (read model). Меняются в тех же транзакциях, что и данные
+    # (services/crud/user_stats_crud.py), и периодически сверяются с исходными таблицами
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    wish_count = Column(Integer, default=0, server_default="0", nullable=False)
+    public_wish_count = Column(Integer, default=0, server_default="0", nullable=False)
+    friend_count = Column(Integer, default=0, server_default="0", nullable=False)
+    total_raised = Column(Numeric(14, 2), default=0, server_default="0", nullable=False)
+    likes_received = Column(Integer, default=0, server_default="0", nullable=False)
+    communities_joined = Column(Integer, default=0, server_default="0", nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
 
 class EmailVerification(Base):
     __tablename__ = "email_verification"
@@ -73,19 +113,83 @@ class EmailVerification(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     code = Column(String(6), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Просроченный код не принимается и удаляется фоновой очисткой
+    expires_at = Column(DateTime(timezone=True), nullable=False)
     user = relationship("User", back_populates="email_verifications")
 
+    __table_args__ = (
+        # Проверка кода ищет по (user_id, code); префикс user_id покрывает FK
+        Index("ix_email_verification_user_id_code", "user_id", "code"),
+        Index("ix_email_verification_expires_at", "expires_at"),
+    )
+
+
+# --- email ---
+
+class EmailStatus(PyEnum):
+    pending = "pending"
+    sent = "sent"
+    failed = "failed"    # исчерпаны попытки отправки
+
+
+class EmailOutbox(Base):
+    # Письма сохраняются в той же транзакции, что и породившее их действие,
+    # и отправляются фоновым воркером (services/email_outbox.py)
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True)
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body_text = Column(Text, nullable=False)
+    body_html = Column(Text, nullable=True)
+    status = Column(Enum(EmailStatus), default=EmailStatus.pending, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_email_outbox_pending", "next_attempt_at",
+              postgresql_where=(status == EmailStatus.pending)),
+    )
+
+
+# --- scheduler ---
+
+class SchedulerRun(Base):
+    # Последний выполненный запуск задачи обслуживания (services/scheduler.py):
+    # процесс, взявший блокировку задачи позже лидера, видит, что этот запуск
+    # уже сделан, и пропускает его
+    __tablename__ = "scheduler_runs"
+
+    job_name = Column(String, primary_key=True)
+    # Плановое время запуска (одинаковое во всех процессах) и время завершения
+    fire_at = Column(DateTime(timezone=True), nullable=False)
+    finished_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
 
 # --- wishes ---
 
 class WishSupporter(Base):
+    # Журнал взносов: строки только добавляются. Wish.raised — сумма по журналу,
+    # которая увеличивается атомарно в той же транзакции (services/crud/funding_crud.py)
     __tablename__ = "wish_supporters"
 
     id = Column(Integer, primary_key=True)
     wish_id = Column(Integer, ForeignKey("wishes.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
+    amount = Column(Numeric(12, 2), default=0, server_default="0", nullable=False)
+    # Ключ из заголовка Idempotency-Key: повтор запроса не создаёт второй взнос
+    idempotency_key = Column(String(64), nullable=True)
     supported_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        UniqueConstraint("user_id", "idempotency_key", name="uq_wish_supporters_user_idempotency_key"),
+        Index("ix_wish_supporters_wish_id", "wish_id"),
+        Index("ix_wish_supporters_user_id", "user_id"),
+    )
+
 
 class Wish(Base):
     __tablename__ = "wishes"
@@ -96,7 +200,7 @@ class Wish(Base):
     description = Column(Text, nullable=True)
     image_url = Column(String, nullable=True)
     goal = Column(Float, nullable=False)
-    raised = Column(Float, default=0.0)
+    raised = Column(Numeric(14, 2), default=0, server_default="0", nullable=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     is_public = Column(Boolean, default=False)
@@ -105,20 +209,57 @@ class Wish(Base):
     category = Column(String, nullable=True)
     community_id = Column(Integer, ForeignKey("communities.id"), nullable=True)
 
+    search_vector = deferred(Column(TSVECTOR, Computed(WISH_SEARCH_EXPR, persisted=True)))
+
     # relationships
     owner = relationship("User", back_populates="wishes")
-    supporters = relationship("WishSupporter", backref="wish", lazy="selectin")
+    # Журнал взносов растёт без ограничений — не загружается вместе с желанием
+    supporters = relationship("WishSupporter", backref="wish", lazy="select")
+
+    __table_args__ = (
+        # Желания пользователя (профиль, selectin-загрузка User.wishes, подсчёты по владельцам)
+        Index("ix_wishes_owner_id_created_at", "owner_id", "created_at"),
+        # Публичная лента: только публичные желания, новые сверху
+        Index("ix_wishes_public_created_at", created_at.desc(),
+              postgresql_where=(is_public == True)),  # noqa: E712
+        Index("ix_wishes_influencer_created_at", created_at.desc(),
+              postgresql_where=((is_public == True) & (is_influencer_public == True))),  # noqa: E712
+        Index("ix_wishes_community_id", "community_id",
+              postgresql_where=(community_id.isnot(None))),
+        # Полнотекстовый поиск и поиск с опечатками по заголовку
+        Index("ix_wishes_search_vector", search_vector, postgresql_using="gin"),
+        Index("ix_wishes_title_trgm", title, postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+    )
 
     @property
     def time_left(self) -> str:
         if not hasattr(self, "duration_days") or not self.created_at:
             return "N/A"
-        end_date = self.created_at + timedelta(days=self.duration_days)
-        remaining = end_date - datetime.now(timezone.utc)
-        if remaining.total_seconds() <= 0:
-            return "Ended"
-        days = remaining.days
-        return f"{days} day{'s' if days != 1 else ''} left"
+        return format_time_left(self.created_at + timedelta(days=self.duration_days))
+
+
+def format_time_left(end_date: datetime) -> str:
+    remaining = end_date - datetime.now(timezone.utc)
+    if remaining.total_seconds() <= 0:
+        return "Ended"
+    days = remaining.days
+    return f"{days} day{'s' if days != 1 else ''} left"
+
+
+class WishTrending(Base):
+    # Время-затухающий рейтинг желания. Хранится логарифм суммы
+    # вес * 2^((t - эпоха) / период полураспада): затухание одинаково для всех
+    # желаний, поэтому порядок не меняется со временем и пересчитывать рейтинг
+    # нужно только при новых событиях (services/crud/trending_crud.py)
+    __tablename__ = "wish_trending"
+
+    wish_id = Column(Integer, ForeignKey("wishes.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_wish_trending_score", score.desc()),
+    )
 
 
 # --- activities ---
@@ -131,15 +272,19 @@ class ActivityType(PyEnum):
 
 
 class Activity(Base):
+    # Секционирована по месяцам created_at (services/activity_archive.py),
+    # поэтому created_at входит в первичный ключ таблицы. id по-прежнему
+    # уникален (одна последовательность на все секции) и идентифицирует объект
     __tablename__ = "activities"
 
     # columns
-    id = Column(Integer, primary_key=True, index=True)
+    # autoincrement явно: в составном ключе SQLAlchemy иначе не делает id SERIAL (create_all в бенчмарках)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     type = Column(Enum(ActivityType), nullable=False)
     target_type = Column(String, nullable=True)  # например, 'wish', 'comment'
     target_id = Column(Integer, nullable=True)  # id объекта действия
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), nullable=False)
 
     # relationships
     user = relationship("User", backref="activities")
@@ -150,6 +295,14 @@ class Activity(Base):
         uselist=False,
     )
 
+    __table_args__ = (
+        # Лента активностей: ORDER BY created_at DESC LIMIT n
+        Index("ix_activities_created_at", created_at.desc()),
+        Index("ix_activities_user_id", "user_id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    __mapper_args__ = {"primary_key": [id]}
+
     # Вспомогательное свойство для удобства (не колонка)
     @property
     def is_wish_activity(self):
@@ -170,6 +323,12 @@ class Comment(Base):
     user = relationship("User", backref="comments")
     wish = relationship("Wish", backref="comments")
 
+    __table_args__ = (
+        # Комментарии к желанию, новые сверху
+        Index("ix_comments_wish_id_created_at", "wish_id", created_at.desc()),
+        Index("ix_comments_user_id", "user_id"),
+    )
+
 
 class Like(Base):
     __tablename__ = "likes"
@@ -186,6 +345,8 @@ class Like(Base):
 
     __table_args__ = (
         UniqueConstraint('user_id', 'wish_id', name='uq_user_wish_like'),
+        # uq_user_wish_like покрывает поиск по user_id, подсчёт лайков желания — по wish_id
+        Index("ix_likes_wish_id", "wish_id"),
     )
 
 
@@ -195,15 +356,18 @@ class ActivityLike(Base):
     # columns
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    activity_id = Column(Integer, ForeignKey("activities.id"), nullable=False)
+    # Без внешнего ключа: activities секционирована, лайки архивируются вместе с секцией
+    activity_id = Column(Integer, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # relationships
     user = relationship("User", backref="activity_likes")
-    activity = relationship("Activity", backref="likes")
+    activity = relationship("Activity", primaryjoin="foreign(ActivityLike.activity_id) == Activity.id",
+                            backref="likes")
 
     __table_args__ = (
         UniqueConstraint('user_id', 'activity_id', name='uq_user_activity_like'),
+        Index("ix_activity_likes_activity_id", "activity_id"),
     )
 
 
@@ -220,6 +384,10 @@ class Post(Base):
     # relationships
     owner = relationship("User", back_populates="posts")
 
+    __table_args__ = (
+        Index("ix_posts_owner_id_created_at", "owner_id", "created_at"),
+    )
+
 
 class NotificationType(PyEnum):
     friend_request = "friend_request"
@@ -232,6 +400,14 @@ class NotificationStatus(PyEnum):
     rejected = "rejected"      # Отклонено
     dismissed = "dismissed"    # Просто убрали уведомление
 
+# Заявки в друзья и в сообщество, ждущие ответа: одна на отправителя,
+# получателя и сообщество, повторная заявка обновляет существующую
+PENDING_REQUEST_PREDICATE = "status = 'pending' AND type IN ('friend_request', 'join_request')"
+# Уведомления, на которые уже ответили (или прочитанные сообщения):
+# их удаляет очистка по сроку хранения (services/notification_retention.py)
+RESOLVED_PREDICATE = "status <> 'pending' OR (type = 'message' AND is_read)"
+
+
 class Notification(Base):
     __tablename__ = "notifications"
 
@@ -249,6 +425,20 @@ class Notification(Base):
     recipient = relationship("User", foreign_keys=[recipient_id])
     sender = relationship("User", foreign_keys=[sender_id])
 
+    __table_args__ = (
+        # Список уведомлений пользователя, новые сверху
+        Index("ix_notifications_recipient_created_at", "recipient_id", created_at.desc()),
+        # Непрочитанные: маленький частичный индекс для счётчика и фильтра read=false
+        Index("ix_notifications_recipient_unread", "recipient_id", created_at.desc(),
+              postgresql_where=(is_read == False)),  # noqa: E712
+        Index("ix_notifications_sender_id", "sender_id"),
+        Index("uq_notifications_pending_request", "recipient_id", "sender_id", "type",
+              func.coalesce(community_id, 0), unique=True, postgresql_where=text(PENDING_REQUEST_PREDICATE)),
+        # Очистка: старые обработанные уведомления, без просмотра ожидающих
+        Index("ix_notifications_resolved_created_at", "type", "created_at",
+              postgresql_where=text(RESOLVED_PREDICATE)),
+    )
+
 
 # Enum для ролей в сообществе
 class CommunityRole(enum.Enum):
@@ -272,6 +462,13 @@ class CommunityMember(Base):
     user = relationship("User", lazy="selectin")
     community = relationship("Community", back_populates="memberships", lazy='selectin')
 
+    __table_args__ = (
+        # Участники сообщества и проверка членства (community_id, user_id)
+        Index("ix_community_members_community_user", "community_id", "user_id"),
+        # Сообщества пользователя
+        Index("ix_community_members_user_id", "user_id"),
+    )
+
 
 class Community(Base):
     __tablename__ = "communities"
@@ -283,6 +480,11 @@ class Community(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     rules = Column(Text, nullable=True)  # Храним в JSON или в одной строке через разделитель
+    # Число участников: меняется в тех же транзакциях, что и community_members
+    # (services/crud/community_crud.py), чтобы список сообществ не загружал участников
+    member_count = Column(Integer, default=0, server_default="0", nullable=False)
+
+    search_vector = deferred(Column(TSVECTOR, Computed(COMMUNITY_SEARCH_EXPR, persisted=True)))
 
     # связи
     memberships = relationship("CommunityMember", back_populates="community", lazy="selectin",
@@ -292,9 +494,14 @@ class Community(Base):
     chat_messages = relationship("CommunityChatMessage", back_populates="community", lazy="selectin",
                                  cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_communities_search_vector", search_vector, postgresql_using="gin"),
+        Index("ix_communities_name_trgm", name, postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+    )
+
     @property
     def total_members(self):
-        return len(self.memberships)
+        return self.member_count
 
     @property
     def admins(self):
@@ -311,3 +518,8 @@ class CommunityChatMessage(Base):
 
     user = relationship("User")
     community = relationship("Community", back_populates="chat_messages")
+
+    __table_args__ = (
+        # История чата сообщества по времени
+        Index("ix_community_chat_messages_community_sent_at", "community_id", "sent_at"),
+    )
@@ -4,27 +4,33 @@ from fastapi.exceptions import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.responses import RedirectResponse
 from httpx import URL
-import requests
 import random
 import os
 import logging
 import httpx
 
-from database import Base, engine, get_db
+from config import get_settings
+from database import get_db
 import models as models
 from schemas.user_schemas import UserCreate, User
-from schemas.auth_schemas import TokenResponse, FacebookToken, EmailVerificationRequest, TokenRefreshRequest
+from schemas.auth_schemas import (TokenResponse, FacebookToken, EmailVerificationRequest,
+                                  EmailResendRequest, TokenRefreshRequest)
 import services.crud.user_crud as user_crud
 import services.crud.auth_crud as auth_crud
 from services.auth import (create_access_token, verify_password,
-                           create_refresh_token, decode_refresh_token)
+                           create_refresh_token, decode_refresh_token,
+                           create_guest_token, decode_guest_email, oauth2_scheme_optional,
+                           GUEST_USER_ID, GUEST_NAME)
 
 from backend_conf import (GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET,
                           GOOGLE_REDIRECT_URI, FACEBOOK_CLIENT_ID, FACEBOOK_CLIENT_SECRET,
                           FACEBOOK_REDIRECT_URI)
-from services.other_helpers import send_email_async
-from config import VK_CLIENT_ID, VK_CLIENT_SECRET, VK_REDIRECT_URI
+from services.other_helpers import build_verification_email
+import services.crud.email_crud as email_crud
+from services.http_clients import OAuthHttpClients, get_oauth_clients
+from services.rate_limit import rate_limit
 from datetime import timedelta
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +41,18 @@ def generate_verification_code():
     return f"{random.randint(100000, 999999)}"
 
 
+async def issue_verification_code(db: AsyncSession, user: models.User):
+    # Код и письмо с ним сохраняются в транзакции вызывающего кода
+    code = generate_verification_code()
+    subject, text_body, html_body = build_verification_email(code)
+    email_crud.enqueue_email(db, to_email=user.email, subject=subject,
+                             body_text=text_body, body_html=html_body)
+    await auth_crud.create_email_verification(
+        db, user_id=user.id, code=code,
+        ttl=timedelta(minutes=get_settings().EMAIL_VERIFICATION_TTL_MINUTES),
+    )
+
+
 @router.get("/google", tags=["auth"])
 async def google_oauth_redirect():
     try:
@@ -54,11 +72,12 @@ async def google_oauth_redirect():
         raise HTTPException(status_code=500, detail="Failed to auth with google")
 
 
-@router.get("/google/callback", tags=["auth"])
+@router.get("/google/callback", tags=["auth"], dependencies=[Depends(rate_limit("auth.oauth"))])
 async def google_oauth_callback(
         request: Request,
         code: str,
-        db: AsyncSession = Depends(get_db)
+        db: AsyncSession = Depends(get_db),
+        oauth_http: OAuthHttpClients = Depends(get_oauth_clients),
 ):
     try:
         # Обмен кода на токен
@@ -70,18 +89,18 @@ async def google_oauth_callback(
             "redirect_uri": GOOGLE_REDIRECT_URI,
             "grant_type": "authorization_code",
         }
-        async with httpx.AsyncClient() as client:
-            token_resp = await client.post(token_url, data=data)
-            token_resp.raise_for_status()
-            tokens = token_resp.json()
-
-            # Получаем информацию о пользователе
-            userinfo_resp = await client.get(
-                "https://www.googleapis.com/oauth2/v3/userinfo",
-                headers={"Authorization": f"Bearer {tokens['access_token']}"}
-            )
-            userinfo_resp.raise_for_status()
-            userinfo = userinfo_resp.json()
+        client = oauth_http.google
+        token_resp = await client.post(token_url, data=data)
+        token_resp.raise_for_status()
+        tokens = token_resp.json()
+
+        # Получаем информацию о пользователе
+        userinfo_resp = await client.get(
+            "https://www.googleapis.com/oauth2/v3/userinfo",
+            headers={"Authorization": f"Bearer {tokens['access_token']}"}
+        )
+        userinfo_resp.raise_for_status()
+        userinfo = userinfo_resp.json()
 
         email = userinfo.get("email")
         name = userinfo.get("name")
@@ -103,6 +122,7 @@ async def google_oauth_callback(
                 is_guest=False
             )
             user = await user_crud.create_user(db, user_create)
+            await db.commit()
 
         # Создаём JWT токен
         access_token = create_access_token(data={"sub": user.email})
@@ -137,11 +157,12 @@ async def facebook_oauth_redirect():
         raise HTTPException(status_code=500, detail="Failed to auth with facebook")
 
 
-@router.get("/facebook/callback", tags=["auth"])
+@router.get("/facebook/callback", tags=["auth"], dependencies=[Depends(rate_limit("auth.oauth"))])
 async def facebook_oauth_callback(
         code: str,
         state: str,
-        db: AsyncSession = Depends(get_db)
+        db: AsyncSession = Depends(get_db),
+        oauth_http: OAuthHttpClients = Depends(get_oauth_clients),
 ):
     try:
         # Обмен кода на access token
@@ -152,22 +173,22 @@ async def facebook_oauth_callback(
             "client_secret": FACEBOOK_CLIENT_SECRET,
             "code": code,
         }
-        async with httpx.AsyncClient() as client:
-            token_resp = await client.get(token_url, params=params)
-            token_resp.raise_for_status()
-            token_data = token_resp.json()
-
-            access_token = token_data.get("access_token")
-            if not access_token:
-                raise HTTPException(status_code=400, detail="Failed to get access token from Facebook")
-
-            # Получение информации о пользователе
-            userinfo_resp = await client.get(
-                "https://graph.facebook.com/me",
-                params={"fields": "id,name,email,picture", "access_token": access_token}
-            )
-            userinfo_resp.raise_for_status()
-            userinfo = userinfo_resp.json()
+        client = oauth_http.facebook
+        token_resp = await client.get(token_url, params=params)
+        token_resp.raise_for_status()
+        token_data = token_resp.json()
+
+        access_token = token_data.get("access_token")
+        if not access_token:
+            raise HTTPException(status_code=400, detail="Failed to get access token from Facebook")
+
+        # Получение информации о пользователе
+        userinfo_resp = await client.get(
+            "https://graph.facebook.com/me",
+            params={"fields": "id,name,email,picture", "access_token": access_token}
+        )
+        userinfo_resp.raise_for_status()
+        userinfo = userinfo_resp.json()
 
         email = userinfo.get("email")
         name = userinfo.get("name")
@@ -188,6 +209,7 @@ async def facebook_oauth_callback(
                 is_guest=False
             )
             user = await user_crud.create_user(db, user_create)
+            await db.commit()
 
         access_token_jwt = create_access_token(data={"sub": user.email})
 
@@ -198,20 +220,23 @@ async def facebook_oauth_callback(
         raise HTTPException(status_code=500, detail="Failed to callback with facebook")
 
 
-@router.post("/facebook/token", tags=["auth"])
-async def facebook_token_login(token_data: FacebookToken, db: AsyncSession = Depends(get_db)):
+@router.post("/facebook/token", tags=["auth"], dependencies=[Depends(rate_limit("auth.oauth"))])
+async def facebook_token_login(
+        token_data: FacebookToken,
+        db: AsyncSession = Depends(get_db),
+        oauth_http: OAuthHttpClients = Depends(get_oauth_clients),
+):
     try:
         access_token = token_data.access_token
 
-        async with httpx.AsyncClient() as client:
-            userinfo_resp = await client.get(
-                "https://graph.facebook.com/me",
-                params={"fields": "id,name,email,picture", "access_token": access_token}
-            )
-            if userinfo_resp.status_code != 200:
-                raise HTTPException(status_code=400, detail="Invalid Facebook token")
+        userinfo_resp = await oauth_http.facebook.get(
+            "https://graph.facebook.com/me",
+            params={"fields": "id,name,email,picture", "access_token": access_token}
+        )
+        if userinfo_resp.status_code != 200:
+            raise HTTPException(status_code=400, detail="Invalid Facebook token")
 
-            userinfo = userinfo_resp.json()
+        userinfo = userinfo_resp.json()
 
         email = userinfo.get("email")
         if not email:
@@ -228,6 +253,7 @@ async def facebook_token_login(token_data: FacebookToken, db: AsyncSession = Dep
                 is_guest=False
             )
             user = await user_crud.create_user(db, user_create)
+            await db.commit()
 
         jwt_token = create_access_token(data={"sub": user.email})
 
@@ -237,31 +263,37 @@ async def facebook_token_login(token_data: FacebookToken, db: AsyncSession = Dep
         raise HTTPException(status_code=500, detail="Failed to get token with facebook")
 
 
-@router.post("/register", response_model=User)
+@router.post("/register", response_model=User, dependencies=[Depends(rate_limit("auth.register"))])
 async def register(
+        request: Request,
         user_create: UserCreate,
+        token: Optional[str] = Depends(oauth2_scheme_optional),
         db: AsyncSession = Depends(get_db)
 ):
     try:
         db_user = await user_crud.get_user_by_email(db, email=user_create.email)
         if db_user:
             raise HTTPException(status_code=400, detail="Email already registered")
-        user = await user_crud.create_user(db, user_create)
-        logger.info("user created")
 
-        user = await user_crud.get_user_by_email(db, user.email)
-        logger.info("got user by email")
+        # Регистрация с гостевым токеном: если гость уже что-то создал (строка
+        # в users сохранена), она становится аккаунтом вместе с созданным
+        guest_email = decode_guest_email(token)
+        guest = await user_crud.get_user_by_email(db, email=guest_email) if guest_email else None
+        if guest is not None and guest.is_guest:
+            user = await user_crud.convert_guest_user(db, guest, user_create)
+            logger.info("guest user converted")
+        else:
+            user = await user_crud.create_user(db, user_create)
+            logger.info("user created")
 
-        # Генерируем код и сохраняем его
-        code = generate_verification_code()
-        # Сохраняем код в отдельной таблице EmailVerification
-        await auth_crud.create_email_verification(db, user_id=user.id, code=code)
+        # Генерируем код и ставим письмо в очередь: пользователь, код и письмо
+        # сохраняются одной транзакцией
+        await issue_verification_code(db, user)
+        await db.commit()
         logger.info("email verification created")
 
-        # Отправляем письмо с кодом
-        subject = "Код подтверждения регистрации"
-        await send_email_async(to_email=user.email, subject=subject, code=code)
-        logger.info("The email has been sent")
+        # Отправкой занимается фоновый воркер — регистрация не ждёт SMTP
+        request.app.state.email_outbox.notify()
 
         return user
     except HTTPException:
@@ -271,7 +303,7 @@ async def register(
         raise HTTPException(status_code=500, detail="Failed to register user")
 
 
-@router.post("/verify-email")
+@router.post("/verify-email", dependencies=[Depends(rate_limit("auth.verify_email"))])
 async def verify_email(data: EmailVerificationRequest, db: AsyncSession = Depends(get_db)):
     """
     Проверяет код подтверждения email.
@@ -286,13 +318,14 @@ async def verify_email(data: EmailVerificationRequest, db: AsyncSession = Depend
         # Найти запись о подтверждении email
         verification = await auth_crud.get_email_verification(db, user_id=user.id, code=data.code)
         if not verification:
-            raise HTTPException(status_code=400, detail="Неверный код")
+            raise HTTPException(status_code=400, detail="Неверный или просроченный код")
 
         # Сделать пользователя подтверждённым
         await auth_crud.mark_user_email_verified(db, user.id)
 
         # (Необязательно) удалить запись о подтверждении, чтобы код нельзя было использовать повторно
         await auth_crud.delete_email_verification(db, verification.id)
+        await db.commit()
 
         return {"detail": "Email успешно подтвержден"}
     except HTTPException:
@@ -302,8 +335,34 @@ async def verify_email(data: EmailVerificationRequest, db: AsyncSession = Depend
         raise HTTPException(status_code=500, detail="Failed to verify email user")
 
 
+@router.post("/resend-verification", dependencies=[Depends(rate_limit("auth.resend_verification"))])
+async def resend_verification(request: Request, data: EmailResendRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Отправляет новый код подтверждения email — например, когда прежний
+    просрочен или письмо не дошло. Прежние коды перестают действовать.
+    """
+    try:
+        user = await user_crud.get_user_by_email(db, email=data.email)
+        if not user:
+            raise HTTPException(status_code=404, detail="Пользователь не найден")
+        if user.is_verified:
+            raise HTTPException(status_code=400, detail="Email уже подтвержден")
+
+        await auth_crud.delete_user_verifications(db, user.id)
+        await issue_verification_code(db, user)
+        await db.commit()
+        request.app.state.email_outbox.notify()
+
+        return {"detail": "Новый код отправлен"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error("Failed to resend verification code: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to resend verification code")
+
+
 
-@router.post("/token", response_model=TokenResponse)
+@router.post("/token", response_model=TokenResponse, dependencies=[Depends(rate_limit("auth.token"))])
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db),
@@ -343,8 +402,12 @@ async def vk_callback(request: Request):
     return RedirectResponse(url=redirect_url)
 
 
-@router.post("/vk")
-async def vk_auth(vk_auth_request: dict, db: AsyncSession = Depends(get_db)):
+@router.post("/vk", dependencies=[Depends(rate_limit("auth.oauth"))])
+async def vk_auth(
+        vk_auth_request: dict,
+        db: AsyncSession = Depends(get_db),
+        oauth_http: OAuthHttpClients = Depends(get_oauth_clients),
+):
     code = vk_auth_request.get("code")
     code_verifier = vk_auth_request.get("code_verifier")
     device_id = vk_auth_request.get("device_id")
@@ -353,32 +416,32 @@ async def vk_auth(vk_auth_request: dict, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Missing code or code_verifier")
 
     # Обмен кода на токен у ВКонтакте
-    async with httpx.AsyncClient() as client:
-        params = {
-            "client_id": "53840991",  # ваш VK_CLIENT_ID
-            "redirect_uri": "https://wishflick.ru/api/auth/vk/callback",
-            "client_secret": "ВАШ_CLIENT_SECRET",  # если требуется
-            "code": code,
-            "code_verifier": code_verifier,
-            "grant_type": "authorization_code",
-        }
-        response = await client.post("https://oauth.vk.com/access_token", params=params)
-        if response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Failed to get access token from VK")
-
-        data = response.json()
-        access_token = data.get("access_token")
-        if not access_token:
-            raise HTTPException(status_code=400, detail="No access token received")
-
-        # Здесь ваша логика создания JWT, сохранения пользователя и т.п.
-        # Например:
-        # jwt_token = create_jwt_for_user(...)
-        return {"access_token": access_token, "token_type": "bearer"}
-
-
-
-@router.post("/refresh-token", response_model=TokenResponse)
+    params = {
+        "client_id": "53840991",  # ваш VK_CLIENT_ID
+        "redirect_uri": "https://wishflick.ru/api/auth/vk/callback",
+        "client_secret": "ВАШ_CLIENT_SECRET",  # если требуется
+        "code": code,
+        "code_verifier": code_verifier,
+        "grant_type": "authorization_code",
+    }
+    response = await oauth_http.vk.post("https://oauth.vk.com/access_token", params=params)
+    if response.status_code != 200:
+        raise HTTPException(status_code=400, detail="Failed to get access token from VK")
+
+    data = response.json()
+    access_token = data.get("access_token")
+    if not access_token:
+        raise HTTPException(status_code=400, detail="No access token received")
+
+    # Здесь ваша логика создания JWT, сохранения пользователя и т.п.
+    # Например:
+    # jwt_token = create_jwt_for_user(...)
+    return {"access_token": access_token, "token_type": "bearer"}
+
+
+
+@router.post("/refresh-token", response_model=TokenResponse,
+             dependencies=[Depends(rate_limit("auth.refresh"))])
 async def refresh_access_token(
     token_request: TokenRefreshRequest,
     db: AsyncSession = Depends(get_db),
@@ -413,19 +476,16 @@ async def refresh_access_token(
 
 
 
-@router.post("/guest-register", status_code=status.HTTP_201_CREATED)
-async def guest_register(db: AsyncSession = Depends(get_db)):
-    guest_user = await auth_crud.create_guest_user(db)
-
-    access_token = create_access_token(
-        data={"sub": str(guest_user.email)}
-    )
+@router.post("/guest-register", status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(rate_limit("auth.guest"))])
+async def guest_register():
+    # Гостевая сессия — только подписанный токен, строка в users не создаётся
     return {
-        "access_token": access_token,
+        "access_token": create_guest_token(),
         "token_type": "bearer",
         "user": {
-            "id": guest_user.id,
-            "name": guest_user.name,
-            "is_guest": guest_user.is_guest
+            "id": GUEST_USER_ID,
+            "name": GUEST_NAME,
+            "is_guest": True
         }
     }
\ No newline at end of file
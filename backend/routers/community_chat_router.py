@@ -6,19 +6,22 @@ import models
 from schemas.community_chat_schemas import CommunityChatMessage, CommunityChatMessageCreate
 import services.crud.community_chat_crud as chat_crud
 import services.auth as auth
+from services.rate_limit import rate_limit
 from database import get_db
 
 router = APIRouter()
 
-@router.post("/", response_model=CommunityChatMessage, status_code=status.HTTP_201_CREATED)
+@router.post("/", response_model=CommunityChatMessage, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(rate_limit("write.chat"))])
 async def send_chat_message_endpoint(
         chat_message: CommunityChatMessageCreate,
-        current_user: models.User = Depends(auth.get_current_user),
+        current_user: models.User = Depends(auth.get_current_user_or_saved_guest),
         db: AsyncSession = Depends(get_db)
 ):
     try:
         # Можно проверить, состоит ли пользователь в сообществе
         message = await chat_crud.create_chat_message(db, chat_message, user=current_user)
+        await db.commit()
         return message
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to send chat message: {e}")
@@ -37,7 +40,7 @@ async def get_chat_messages_endpoint(
 @router.delete("/{message_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_chat_message_endpoint(
         message_id: int,
-        current_user: models.User = Depends(auth.get_current_user),
+        current_user: models.User = Depends(auth.get_current_user_or_guest),
         db: AsyncSession = Depends(get_db)
 ):
     try:
@@ -46,6 +49,7 @@ async def delete_chat_message_endpoint(
             raise HTTPException(status_code=404, detail="Message not found")
         # Возможно, стоит проверить — автор или админ ли пользователь
         await chat_crud.delete_chat_message(db, message)
+        await db.commit()
         return None
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete chat message: {e}")
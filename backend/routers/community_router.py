@@ -2,9 +2,6 @@ from fastapi import APIRouter, Depends, HTTPException, status, Form, UploadFile,
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
-import os
-import shutil
-import uuid
 import logging
 
 from database import get_db
@@ -13,16 +10,15 @@ from schemas.community_schemas import (Community, CommunityCreate, CommunityUpda
                                        Member, CommunityMemberCreate)
 import services.crud.community_crud as community_crud
 import services.auth as auth
+from services.other_helpers import save_upload_file
+from services.dataloader import Loaders, get_loaders
 from backend_conf import API_URL
-from config import UPLOAD_DIR
+from config import get_settings
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-UPLOAD_DIR_COMMUNITIES = os.path.join(UPLOAD_DIR, "community_images")
-os.makedirs(UPLOAD_DIR_COMMUNITIES, exist_ok=True)
-
 
 @router.post("/", response_model=Community, status_code=status.HTTP_201_CREATED)
 async def create_community_endpoint(
@@ -32,18 +28,14 @@ async def create_community_endpoint(
         image_file: Optional[UploadFile] = File(None),
         category: Optional[str] = Form(None),
         rules: Optional[str] = Form(None),
-        current_user: models.User = Depends(auth.get_current_user),
+        current_user: models.User = Depends(auth.get_current_user_or_saved_guest),
         db: AsyncSession = Depends(get_db)
 ):
     try:
         # Обработка файла, если он есть
         final_image_url = image_url
         if image_file:
-            filename = f"{uuid.uuid4()}.{image_file.filename.split('.')[-1]}"
-            file_path = os.path.join(UPLOAD_DIR_COMMUNITIES, filename)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(image_file.file, buffer)
+            filename = save_upload_file(image_file, get_settings().upload_dir("community_images"), "community_image")
             final_image_url = f"/uploads/community_images/{filename}"
 
         community_create = CommunityCreate(
@@ -54,6 +46,7 @@ async def create_community_endpoint(
             rules=rules,
         )
         community = await community_crud.create_community(db, community_create, owner=current_user)
+        await db.commit()
         return community
     except Exception as e:
         logger.error("Failed to create community: %s", e)
@@ -75,7 +68,7 @@ async def get_communities_endpoint(
                 category=community.category,
                 rules=community.rules,
                 created_at=community.created_at,
-                members_count=len(community.memberships),
+                members_count=community.member_count,
                 wishes_count=len(community.wishes)
             )
             if community.image_url and not community.image_url.startswith('http'):
@@ -126,7 +119,7 @@ async def update_community_endpoint(
         image_file: Optional[UploadFile] = File(None),
         category: Optional[str] = Form(None),
         rules: Optional[str] = Form(None),
-        current_user: models.User = Depends(auth.get_current_user),
+        current_user: models.User = Depends(auth.get_current_user_or_guest),
         db: AsyncSession = Depends(get_db)
 ):
     try:
@@ -142,11 +135,7 @@ async def update_community_endpoint(
 
         final_image_url = image_url
         if image_file:
-            filename = f"{uuid.uuid4()}.{image_file.filename.split('.')[-1]}"
-            file_path = os.path.join(UPLOAD_DIR_COMMUNITIES, filename)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(image_file.file, buffer)
+            filename = save_upload_file(image_file, get_settings().upload_dir("community_images"), "community_image")
             final_image_url = f"/uploads/community_images/{filename}"
 
         update_data = {}
@@ -163,6 +152,7 @@ async def update_community_endpoint(
 
         update_obj = CommunityUpdate(**update_data)
         updated = await community_crud.update_community(db, community, update_obj)
+        await db.commit()
         return updated
     except HTTPException:
         raise
@@ -174,7 +164,7 @@ async def update_community_endpoint(
 @router.delete("/{community_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_community_endpoint(
         community_id: int,
-        current_user: models.User = Depends(auth.get_current_user),
+        current_user: models.User = Depends(auth.get_current_user_or_guest),
         db: AsyncSession = Depends(get_db)
 ):
     try:
@@ -189,6 +179,7 @@ async def delete_community_endpoint(
             )
 
         await community_crud.delete_community(db, community)
+        await db.commit()
         return None
     except HTTPException:
         raise
@@ -202,13 +193,10 @@ async def get_community_members_endpoint(
         community_id: int,
         current_user: models.User = Depends(auth.get_current_user),
         db: AsyncSession = Depends(get_db),
+        loaders: Loaders = Depends(get_loaders),
 ):
-    # Проверка на гостя
-    if getattr(current_user, "is_guest", False):
-        raise HTTPException(status_code=403, detail="Гостям запрещено просматривать участников сообщества")
-
     # Можно добавить проверку, существует ли сообщество
-    community = await db.get(models.Community, community_id)
+    community = await loaders.load_community(community_id)
     if not community:
         raise HTTPException(status_code=404, detail="Сообщество не найдено")
 
@@ -236,7 +224,7 @@ async def add_community_member_endpoint(
         community_id: int,
         payload: CommunityMemberCreate,
         db: AsyncSession = Depends(get_db),
-        current_user: models.User = Depends(auth.get_current_user)
+        current_user: models.User = Depends(auth.get_current_user_or_guest)
 ):
     try:
         member = await community_crud.add_community_member(
@@ -245,6 +233,7 @@ async def add_community_member_endpoint(
             user_id=payload.user_id,
             role=payload.role
         )
+        await db.commit()
         return Member(
             id=str(member.user_id),
             name=getattr(member.user, "name", ""),  # если у вас связь с user
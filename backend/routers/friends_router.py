@@ -4,11 +4,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 from typing import List
 
-from database import Base, engine, get_db
+from database import get_db
 import models as models
 from schemas.user_schemas import UserOut
 import services.crud.friend_crud as friend_crud
-from services.auth import get_current_user, verify_password
+from services.auth import get_current_user, get_current_user_or_guest, verify_password
 import services.crud.user_crud as user_crud
 
 logger = logging.getLogger(__name__)
@@ -23,10 +23,6 @@ async def add_friend_endpoint(
         db: AsyncSession = Depends(get_db),
 ):
     try:
-        if current_user.is_guest:
-            raise HTTPException(status_code=403, detail="Гостям запрещено добавлять пользователей в друзья")
-
-
         friend = await user_crud.get_user_by_id(db, friend_id)
         if not friend:
             raise HTTPException(status_code=404, detail="User not found")
@@ -34,6 +30,7 @@ async def add_friend_endpoint(
             raise HTTPException(status_code=400, detail="Cannot add yourself as friend")
 
         await friend_crud.add_friend(db, current_user, friend)
+        await db.commit()
         return {"detail": "Friend added"}
     except Exception as e:
         logging.error(f"Failed to add friend: {e}")
@@ -47,14 +44,12 @@ async def remove_friend_endpoint(
         db: AsyncSession = Depends(get_db),
 ):
     try:
-        if current_user.is_guest:
-            raise HTTPException(status_code=403, detail="Гостям запрещено добавлять пользователей в друзья")
-
         friend = await user_crud.get_user_by_id(db, friend_id)
         if not friend:
             raise HTTPException(status_code=404, detail="User not found")
 
         await friend_crud.remove_friend(db, current_user, friend)
+        await db.commit()
         return None
     except Exception as e:
         logging.error(f"Failed to remove friend: {e}")
@@ -63,7 +58,7 @@ async def remove_friend_endpoint(
 
 @router.get("/", response_model=List[UserOut])
 async def get_friends_list(
-        current_user: models.User = Depends(get_current_user),
+        current_user: models.User = Depends(get_current_user_or_guest),
         db: AsyncSession = Depends(get_db),
 ):
     try:
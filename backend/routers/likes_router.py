@@ -1,47 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional
 import logging
 
 from database import get_db
 import models
 import services.auth as auth
+from services.rate_limit import rate_limit
 from services.crud.like_crud import (
     create_like,
-    get_like,
     get_likes_by_wish,
     get_likes_by_user,
     delete_like,
+    get_like_states,
 )
-from schemas.likes_schemas import LikeRequest
+from schemas.likes_schemas import LikeRequest, LikeState
 
 router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
-@router.post("/", status_code=status.HTTP_201_CREATED)
+@router.post("/", status_code=status.HTTP_201_CREATED, dependencies=[Depends(rate_limit("write.like"))])
 async def like_wish(
     like_data: LikeRequest,
+    response: Response,
     current_user: models.User = Depends(auth.get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Поставить лайк желанию (авторизованный пользователь).
+    Идемпотентно: повторный лайк возвращает 200 и ничего не меняет.
     """
     wish_id = like_data.wish_id
 
-    if current_user.is_guest:
-        raise HTTPException(status_code=403, detail="Гостям запрещено ставить лайки")
-    # Проверим, не поставлен ли уже лайк этим пользователем
-    like = await get_like(db, current_user.id, wish_id)
-    if like:
-        raise HTTPException(status_code=400, detail="Лайк уже поставлен")
-    like = await create_like(db, current_user.id, wish_id)
-    if not like:
-        raise HTTPException(status_code=500, detail="Не удалось поставить лайк")
+    try:
+        like = await create_like(db, current_user.id, wish_id)
+        await db.commit()
+    except IntegrityError:
+        raise HTTPException(status_code=404, detail="Желание не найдено")
+    if like is None:
+        response.status_code = status.HTTP_200_OK
+        return {"message": "Лайк уже поставлен"}
     return {"message": "Лайк добавлен"}
 
-@router.delete("/{wish_id}", status_code=204)
+@router.delete("/{wish_id}", status_code=204, dependencies=[Depends(rate_limit("write.like"))])
 async def unlike_wish(
     wish_id: int,
     current_user: models.User = Depends(auth.get_current_user),
@@ -49,14 +52,40 @@ async def unlike_wish(
 ):
     """
     Удалить лайк (авторизованный пользователь).
+    Идемпотентно: если лайка уже нет, тоже 204.
     """
-    if current_user.is_guest:
-        raise HTTPException(status_code=403, detail="Гостям запрещено удалять лайки")
-    result = await delete_like(db, current_user.id, wish_id)
-    if not result:
-        raise HTTPException(status_code=404, detail="Лайк не найден")
+    await delete_like(db, current_user.id, wish_id)
+    await db.commit()
     return None
 
+# Ограничение на размер пачки: больше, чем помещается на экран ленты
+LIKE_STATE_MAX_IDS = 100
+
+
+@router.get("/state", response_model=List[LikeState])
+async def get_like_state(
+    wish_ids: List[int] = Query(..., description="id желаний: ?wish_ids=1&wish_ids=2"),
+    user_id: Optional[int] = Depends(auth.get_current_user_id_optional),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Состояние лайков для видимых в ленте желаний: лайкнул ли текущий пользователь
+    и сколько всего лайков — одним запросом, в порядке переданных id.
+    """
+    wish_ids = list(dict.fromkeys(wish_ids))
+    if len(wish_ids) > LIKE_STATE_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Не больше {LIKE_STATE_MAX_IDS} желаний за запрос")
+    try:
+        states = await get_like_states(db, wish_ids, user_id)
+        return [
+            LikeState(wish_id=wish_id, count=states.get(wish_id, (0, False))[0],
+                      liked=states.get(wish_id, (0, False))[1])
+            for wish_id in wish_ids
+        ]
+    except Exception as e:
+        logger.error("Failed to get like state: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to get like state")
+
 @router.get("/wish/{wish_id}", response_model=List[int])
 async def get_wish_likes(
     wish_id: int,
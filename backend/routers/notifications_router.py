@@ -7,8 +7,9 @@ from database import get_db
 from models import Notification, User, NotificationType, NotificationStatus
 from schemas.notification_schemas import NotificationOut, NotificationCreate
 import services.crud.notification_crud as notification_crud
-from services.auth import get_current_user
+from services.auth import get_current_user, get_current_user_or_guest
 from services.crud import user_crud, friend_crud, community_crud
+from services.dataloader import Loaders, get_loaders
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -17,7 +18,7 @@ logger = logging.getLogger(__name__)
 @router.get("/", response_model=List[NotificationOut])
 async def get_notifications(
         read_filter: Optional[bool] = None,
-        current_user: User = Depends(get_current_user),
+        current_user: User = Depends(get_current_user_or_guest),
         db: AsyncSession = Depends(get_db),
         limit: int = 25
 ):
@@ -49,8 +50,6 @@ async def create_notification(
         current_user: User = Depends(get_current_user),
 ):
     try:
-        if current_user.is_guest:
-            raise HTTPException(status_code=403, detail="Для данного действия необходимо зарегистрироваться")
         # Можно добавить проверку прав, например, что sender_id существует
         new_notification = await notification_crud.create_notification(
             db,
@@ -60,6 +59,7 @@ async def create_notification(
             community_id=notification.community_id if notification.community_id else None,
             message=notification.message,
         )
+        await db.commit()
         return new_notification
     except HTTPException:
         raise
@@ -75,8 +75,6 @@ async def mark_notification_read(
         db: AsyncSession = Depends(get_db),
 ):
     try:
-        if current_user.is_guest:
-            raise HTTPException(status_code=403, detail="Для данного действия необходимо зарегистрироваться")
         notification = await notification_crud.get_notification(db, notification_id)
         if not notification or notification.recipient_id != current_user.id:
             raise HTTPException(status_code=404, detail="Notification not found")
@@ -84,6 +82,7 @@ async def mark_notification_read(
         success = await notification_crud.mark_notification_as_read(db, notification_id)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to mark notification as read")
+        await db.commit()
         return None
     except HTTPException:
         raise
@@ -99,7 +98,8 @@ async def mark_notification_read(
 async def accept_friend_request(
         notification_id: int,
         db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+        loaders: Loaders = Depends(get_loaders),
+        current_user: User = Depends(get_current_user_or_guest)
 ):
     try:
         notif = await db.get(Notification, notification_id)
@@ -111,7 +111,7 @@ async def accept_friend_request(
             raise HTTPException(403, "This notification is not for you")
 
         # Получаем отправителя
-        friend = await user_crud.get_user_by_id(db, notif.sender_id)
+        friend = await loaders.load(notif.sender_id)
         if not friend:
             raise HTTPException(404, "Sender user not found")
 
@@ -143,7 +143,7 @@ async def accept_friend_request(
 async def reject_friend_request(
         notification_id: int,
         db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+        current_user: User = Depends(get_current_user_or_guest)
 ):
     try:
         notif = await db.get(Notification, notification_id)
@@ -173,7 +173,7 @@ async def reject_friend_request(
 async def accept_join_request(
         notification_id: int,
         db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+        current_user: User = Depends(get_current_user_or_guest)
 ):
     try:
         notif = await db.get(Notification, notification_id)
@@ -214,7 +214,7 @@ async def accept_join_request(
 async def reject_join_request(
         notification_id: int,
         db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+        current_user: User = Depends(get_current_user_or_guest)
 ):
     try:
         notif = await db.get(Notification, notification_id)
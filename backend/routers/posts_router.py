@@ -1,47 +1,56 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, func
 from typing import List
 from models import Post
 from schemas.other_schemas import PostCreate, PostUpdate, PostOut
 from database import get_db
-from services.auth import get_current_user
+from services.auth import get_current_user_or_guest, get_current_user_or_saved_guest
 
 router = APIRouter()
 
 @router.post("/", response_model=PostOut, status_code=status.HTTP_201_CREATED)
-def create_post(post_in: PostCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+async def create_post(post_in: PostCreate, db: AsyncSession = Depends(get_db), current_user=Depends(get_current_user_or_saved_guest)):
     post = Post(content=post_in.content, owner_id=current_user.id)
     db.add(post)
-    db.commit()
-    db.refresh(post)
+    # INSERT ... RETURNING при коммите заполняет id и created_at, refresh не нужен
+    await db.commit()
     return post
 
 @router.get("/", response_model=List[PostOut])
-def list_posts(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return db.query(Post).filter(Post.owner_id == current_user.id).all()
+async def list_posts(db: AsyncSession = Depends(get_db), current_user=Depends(get_current_user_or_guest)):
+    result = await db.execute(select(Post).filter(Post.owner_id == current_user.id))
+    return result.scalars().all()
 
 @router.get("/{post_id}", response_model=PostOut)
-def get_post(post_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    post = db.query(Post).filter(Post.id == post_id, Post.owner_id == current_user.id).first()
+async def get_post(post_id: int, db: AsyncSession = Depends(get_db), current_user=Depends(get_current_user_or_guest)):
+    result = await db.execute(select(Post).filter(Post.id == post_id, Post.owner_id == current_user.id))
+    post = result.scalars().first()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     return post
 
 @router.put("/{post_id}", response_model=PostOut)
-def update_post(post_id: int, post_in: PostUpdate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    post = db.query(Post).filter(Post.id == post_id, Post.owner_id == current_user.id).first()
+async def update_post(post_id: int, post_in: PostUpdate, db: AsyncSession = Depends(get_db), current_user=Depends(get_current_user_or_guest)):
+    # Проверка владельца, обновление и новые значения (в т.ч. updated_at) — один UPDATE ... RETURNING
+    result = await db.execute(
+        update(Post)
+        .where(Post.id == post_id, Post.owner_id == current_user.id)
+        .values(content=post_in.content, updated_at=func.now())
+        .returning(Post.id, Post.content, Post.owner_id, Post.created_at, Post.updated_at)
+    )
+    post = result.mappings().first()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
-    post.content = post_in.content
-    db.commit()
-    db.refresh(post)
+    await db.commit()
     return post
 
 @router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_post(post_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    post = db.query(Post).filter(Post.id == post_id, Post.owner_id == current_user.id).first()
-    if not post:
+async def delete_post(post_id: int, db: AsyncSession = Depends(get_db), current_user=Depends(get_current_user_or_guest)):
+    result = await db.execute(
+        delete(Post).where(Post.id == post_id, Post.owner_id == current_user.id).returning(Post.id)
+    )
+    if result.first() is None:
         raise HTTPException(status_code=404, detail="Post not found")
-    db.delete(post)
-    db.commit()
+    await db.commit()
     return None
@@ -0,0 +1,70 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.exceptions import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+import logging
+
+from database import get_db
+from schemas.search_schemas import SearchResponse, SearchType
+import services.crud.search_crud as search_crud
+from services.auth import get_current_user_id_optional
+from backend_conf import API_URL
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("", response_model=SearchResponse)
+async def search(
+        q: str = Query(..., min_length=2, max_length=100),
+        type: SearchType = SearchType.all,
+        limit: int = Query(20, ge=1, le=50),
+        offset: int = Query(0, ge=0, le=500),
+        viewer_id: Optional[int] = Depends(get_current_user_id_optional),
+        db: AsyncSession = Depends(get_db),
+):
+    """
+    Поиск по желаниям, людям и сообществам с ранжированием.
+    Слова запроса ищутся как префиксы, опечатки в названиях покрывает триграммное сходство.
+    """
+    q = q.strip()
+    try:
+        # Берём на одну запись больше, чтобы узнать, есть ли следующая страница
+        if type == SearchType.all:
+            # Общая выдача: из каждого раздела достаточно offset + limit + 1 лучших,
+            # затем слияние по рангу и срез нужной страницы
+            window = offset + limit + 1
+            hits = (
+                await search_crud.search_wishes(db, q, viewer_id, window)
+                + await search_crud.search_users(db, q, viewer_id, window)
+                + await search_crud.search_communities(db, q, window)
+            )
+            hits.sort(key=lambda hit: hit["rank"], reverse=True)
+            hits = hits[offset:offset + limit + 1]
+        elif type == SearchType.wishes:
+            hits = await search_crud.search_wishes(db, q, viewer_id, limit + 1, offset)
+        elif type == SearchType.users:
+            hits = await search_crud.search_users(db, q, viewer_id, limit + 1, offset)
+        else:
+            hits = await search_crud.search_communities(db, q, limit + 1, offset)
+
+        for hit in hits:
+            # Картинки сообществ хранятся относительным путём
+            if hit["image_url"] and hit["image_url"].startswith("/"):
+                hit["image_url"] = f"{API_URL}{hit['image_url']}"
+
+        return SearchResponse(
+            query=q,
+            type=type,
+            offset=offset,
+            limit=limit,
+            has_more=len(hits) > limit,
+            results=hits[:limit],
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Search failed for %r: %s", q, e)
+        raise HTTPException(status_code=500, detail="Search failed")
@@ -6,11 +6,12 @@ from sqlalchemy.orm import Session, selectinload
 
 from typing import List
 
+import asyncio
 import logging
 
-from database import Base, engine, get_db
+from database import get_db
 from models import Post, User, friend_association, Wish
-from schemas.user_schemas import UserOut, UserResponse, UserOutWithFriend
+from schemas.user_schemas import UserOut, UserResponse, UserOutWithFriend, UserStatsOut
 from schemas.wish_schemas import WishOut
 from schemas.other_schemas import PostOut
 from schemas.community_schemas import Community
@@ -18,7 +19,9 @@ import services.crud.user_crud as user_crud
 import services.crud.wish_crud as wish_crud
 import services.crud.friend_crud as friend_crud
 import services.crud.community_crud as community_crud
-from services.auth import get_current_user, verify_password
+import services.crud.user_stats_crud as user_stats_crud
+from services.auth import get_current_user, get_current_user_or_guest, verify_password
+from services.dataloader import Loaders, get_loaders
 from backend_conf import API_URL
 
 logger = logging.getLogger(__name__)
@@ -26,13 +29,28 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def user_stats_out(stats) -> UserStatsOut:
+    # Строки user_stats может ещё не быть (новый пользователь до первой сверки)
+    if stats is None:
+        return UserStatsOut()
+    return UserStatsOut(
+        wishlistsCount=stats.wish_count,
+        publicWishlistsCount=stats.public_wish_count,
+        friendsCount=stats.friend_count,
+        totalRaised=stats.total_raised,
+        likesReceived=stats.likes_received,
+        communitiesJoined=stats.communities_joined,
+    )
+
 @router.get("/me", response_model=UserResponse)
 async def read_users_me(
         request: Request,
-        current_user: User = Depends(get_current_user),
+        current_user: User = Depends(get_current_user_or_guest),
         db: AsyncSession = Depends(get_db)
 ):
     try:
+        if current_user.is_guest:
+            return current_user
         user = await user_crud.get_user_by_email(db, current_user.email)
 
         # Формируем абсолютный URL для аватара, если он есть и начинается с '/'
@@ -94,7 +112,7 @@ async def get_user_communities(
                 category=community.category,
                 rules=community.rules,
                 created_at=community.created_at,
-                members_count=len(community.memberships),
+                members_count=community.member_count,
                 wishes_count=len(community.wishes)
             )
             if community.image_url and not community.image_url.startswith('http'):
@@ -111,33 +129,33 @@ async def get_user_communities(
 @router.get("/{user_id}", response_model=UserOutWithFriend)
 async def get_user_by_id(
         user_id: int,
-        current_user: User = Depends(get_current_user),
-        db: AsyncSession = Depends(get_db)
+        current_user: User = Depends(get_current_user_or_guest),
+        loaders: Loaders = Depends(get_loaders),
 ):
     try:
-        user = await db.get(User, user_id)
+        # Пользователь, его счётчики из user_stats и списки друзей обоих пользователей
+        # собираются батчами вместо отдельного запроса на каждое значение
+        user, stats, user_friend_ids, my_friend_ids = await asyncio.gather(
+            loaders.load(user_id),
+            loaders.load_stats(user_id),
+            loaders.load_friend_ids(user_id),
+            loaders.load_friend_ids(current_user.id),
+        )
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        # Подсчёт wishlistsCount
-        wishlists_count_stmt = select(func.count(Wish.id)).filter(Wish.owner_id == user_id)
-        result = await db.execute(wishlists_count_stmt)
-        wishlists_count = result.scalar() or 0
-
-        # Подсчёт mutualFriends через crud
-        mutual_friends_count = await friend_crud.count_mutual_friends(db, current_user.id, user_id)
-
-        is_friend = (user in current_user.friends)
-
         return UserOutWithFriend(
             id=user.id,
             email=user.email,
             name=user.name,
             avatar_url=user.avatar_url,
-            mutualFriends=mutual_friends_count,
-            wishlistsCount=wishlists_count,
-            isFriend=is_friend
+            mutualFriends=len(user_friend_ids & my_friend_ids),
+            wishlistsCount=stats.wish_count if stats else 0,
+            isFriend=user_id in my_friend_ids,
+            stats=user_stats_out(stats),
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Failed to get user {user_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get user {e}")
@@ -145,11 +163,12 @@ async def get_user_by_id(
 
 @router.get("/", response_model=list[UserOutWithFriend])
 async def get_users_list(
-        current_user: User = Depends(get_current_user),
+        current_user: User = Depends(get_current_user_or_guest),
         db: AsyncSession = Depends(get_db),
 ):
     try:
         rows = await user_crud.get_users_list_with_is_friend(db, current_user)
+        stats = await user_stats_crud.get_stats_by_user_ids(db, [row["id"] for row in rows])
         users_list = [
             UserOutWithFriend(
                 id=row["id"],
@@ -158,7 +177,8 @@ async def get_users_list(
                 avatar_url=row["avatar_url"],
                 isFriend=row["isFriend"],
                 mutualFriends=0,  # Заглушка, т.к. не считаем
-                wishlistsCount=0  # Заглушка, т.к. не считаем
+                wishlistsCount=stats[row["id"]].wish_count if row["id"] in stats else 0,
+                stats=user_stats_out(stats.get(row["id"])),
             )
             for row in rows
         ]
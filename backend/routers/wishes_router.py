@@ -1,37 +1,35 @@
 from fastapi import (Depends, UploadFile, File,
-                     Form, HTTPException, status, APIRouter)
+                     Form, HTTPException, status, APIRouter, Query, Header, Response)
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-import os
-import shutil
-import uuid
 import logging
 
 from database import get_db
 import models as models
-from schemas.wish_schemas import Wish, WishCreate, WishWithOwner, WishUpdate
+from schemas.wish_schemas import (Wish, WishCreate, WishUpdate,
+                                 TrendingWish, TrendingWishesPage, InfluencerWish, InfluencerOwner,
+                                 ContributionCreate, ContributionOut)
 from schemas.comment_schemas import CommentResponse
 import services.crud.wish_crud as wish_crud
 import services.crud.other_crud as other_crud
 import services.auth as auth
+from services.other_helpers import save_upload_file, encode_cursor, decode_cursor
+from services.dataloader import Loaders, get_loaders
+from services.trending import TrendingIndex, get_trending_index
+from services.crud.trending_crud import decayed_weight
+from services.crud.funding_crud import Contribution, WishNotFound, IdempotencyConflict
+from services.funding import ContributionBatcher, get_contribution_batcher
 
 from backend_conf import API_URL
-from config import UPLOAD_DIR
+from config import get_settings
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
-UPLOAD_DIR_AVATARS = os.path.join(UPLOAD_DIR, "avatars")
-UPLOAD_DIR_WISHES = os.path.join(UPLOAD_DIR, "wishes")
-
-os.makedirs(UPLOAD_DIR_AVATARS, exist_ok=True)
-os.makedirs(UPLOAD_DIR_WISHES, exist_ok=True)
-
-
 @router.post("/",
              response_model=Wish,
              status_code=status.HTTP_201_CREATED,
@@ -47,20 +45,11 @@ async def create_wish_endpoint(
         db: AsyncSession = Depends(get_db)
 ):
     try:
-        if current_user.is_guest:
-            raise HTTPException(status_code=403, detail="Гостям запрещено создавать желания")
-
         # Если загружен файл, сохраняем и получаем URL
         final_image_url = image_url
         if image_file:
-            # Генерируем уникальное имя файла
-            filename = f"{uuid.uuid4()}.{image_file.filename.split('.')[-1]}"
-            file_path = os.path.join(UPLOAD_DIR_WISHES, filename)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(image_file.file, buffer)
+            # Сохраняем под уникальным именем
+            filename = save_upload_file(image_file, get_settings().upload_dir("wishes"), "wish_image")
 
             # Формируем URL для доступа к файлу
             relative_path = f"/uploads/wishes/{filename}"
@@ -75,6 +64,7 @@ async def create_wish_endpoint(
         )
 
         wish = await wish_crud.create_wish(db, wish_create, owner=current_user)
+        await db.commit()
         return wish
     except Exception as e:
         logging.error("Failed to create wish: %s", e)
@@ -85,7 +75,7 @@ async def create_wish_endpoint(
             response_model=List[Wish],
             )
 async def get_user_wishes(
-        current_user: models.User = Depends(auth.get_current_user),
+        current_user: models.User = Depends(auth.get_current_user_or_guest),
         db: AsyncSession = Depends(get_db)
 ):
     try:
@@ -105,9 +95,6 @@ async def delete_wish(
         db: AsyncSession = Depends(get_db)
 ):
     try:
-        if current_user.is_guest:
-            raise HTTPException(status_code=403, detail="Гостям запрещено создавать желания")
-
         wish = await wish_crud.get_wish_by_id(db, wish_id)
         if not wish:
             raise HTTPException(status_code=404, detail="Wish not found")
@@ -115,6 +102,7 @@ async def delete_wish(
             raise HTTPException(status_code=403, detail="Not authorized to delete this wish")
 
         await wish_crud.delete_wish(db, wish)
+        await db.commit()
         return None
     except Exception as e:
         logging.error("Failed to delete wish: %s", e)
@@ -128,9 +116,6 @@ async def get_comments(wish_id: int,
                        db: AsyncSession = Depends(get_db),
                        current_user: models.User = Depends(auth.get_current_user)):
     try:
-        if current_user.is_guest:
-            raise HTTPException(status_code=403, detail="Гостям запрещено комментировать желания")
-
         comments = await other_crud.get_comments_by_wish(db, wish_id)
         return comments
     except Exception as e:
@@ -138,15 +123,56 @@ async def get_comments(wish_id: int,
         raise HTTPException(status_code=500, detail="Failed to get comments")
 
 
+@router.post("/{wish_id}/support",
+             response_model=ContributionOut,
+             status_code=status.HTTP_201_CREATED,
+             )
+async def support_wish(
+        wish_id: int,
+        contribution: ContributionCreate,
+        response: Response,
+        idempotency_key: Optional[str] = Header(None, max_length=64),
+        current_user: models.User = Depends(auth.get_current_user),
+        batcher: ContributionBatcher = Depends(get_contribution_batcher),
+):
+    """
+    Внести сумму в желание. Повтор запроса с тем же заголовком Idempotency-Key
+    возвращает первый результат (200) и не учитывает деньги второй раз.
+    """
+    try:
+        result = await batcher.submit(wish_id, Contribution(
+            user_id=current_user.id,
+            amount=contribution.amount,
+            idempotency_key=idempotency_key,
+        ))
+        if result.replayed:
+            response.status_code = status.HTTP_200_OK
+        return ContributionOut(
+            id=result.id,
+            wish_id=result.wish_id,
+            user_id=result.user_id,
+            amount=result.amount,
+            supported_at=result.supported_at,
+            raised=result.raised,
+            replayed=result.replayed,
+        )
+    except HTTPException:
+        raise
+    except WishNotFound:
+        raise HTTPException(status_code=404, detail="Wish not found")
+    except IdempotencyConflict:
+        raise HTTPException(status_code=409, detail="Idempotency-Key already used for another contribution")
+    except Exception as e:
+        logging.error("Failed to support wish: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to support wish")
+
+
 @router.get("/{wish_id}/likes/count",
             )
 async def get_likes_count_endpoint(wish_id: int,
                                    db: AsyncSession = Depends(get_db),
                                    current_user: models.User = Depends(auth.get_current_user)):
     try:
-        if current_user.is_guest:
-            raise HTTPException(status_code=403, detail="Гостям запрещено ставить лайки")
-
         count = await other_crud.get_likes_count(db, wish_id)
         return {"count": count}
     except Exception as e:
@@ -155,28 +181,105 @@ async def get_likes_count_endpoint(wish_id: int,
 
 
 @router.get("/influencer",
-            response_model=List[WishWithOwner],
+            response_model=List[InfluencerWish],
             )
 async def get_public_influencer_wishes(
+        response: Response,
+        category: Optional[str] = Query(None),
+        limit: int = Query(12, ge=1, le=48),
+        cursor: Optional[str] = Query(None, description="значение X-Next-Cursor предыдущей страницы"),
         db: AsyncSession = Depends(get_db),
 ):
+    """
+    Публичные желания блогеров, новые сверху. Ответ — список карточек;
+    если есть следующая страница, её курсор передаётся в заголовке X-Next-Cursor.
+    """
     try:
-        wishes = await wish_crud.get_influencer_wishes(db,
-                                                  public=True,
-                                                  influencer=True
-                                                  )
-        return wishes
+        after = None
+        if cursor:
+            after = decode_cursor(cursor)
+            if after is None:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        rows = await wish_crud.get_influencer_wishes(db, limit=limit + 1, category=category, after=after)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers["X-Next-Cursor"] = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+
+        return [
+            InfluencerWish(
+                id=row["id"],
+                title=row["title"],
+                description=row["description"],
+                image_url=row["image_url"],
+                goal=row["goal"],
+                raised=row["raised"],
+                category=row["category"],
+                owner=InfluencerOwner(
+                    id=row["owner_id"],
+                    name=row["owner_name"],
+                    avatar_url=row["owner_avatar_url"],
+                ),
+                supporters=row["supporters"],
+                ends_at=row["ends_at"],
+                time_left=row["time_left"],
+            )
+            for row in rows
+        ]
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error("Failed to get influencers wishes: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get influencers wishes")
 
 
+@router.get("/trending",
+            response_model=TrendingWishesPage,
+            )
+async def get_trending_wishes(
+        limit: int = Query(20, ge=1, le=50),
+        offset: int = Query(0, ge=0),
+        trending: TrendingIndex = Depends(get_trending_index),
+        loaders: Loaders = Depends(get_loaders),
+):
+    """Популярные сейчас желания: рейтинг из памяти, данные желаний — одним запросом по id."""
+    try:
+        ranked = trending.page(offset, limit)
+        wishes = await loaders.wishes.load_many([wish_id for wish_id, _ in ranked])
+        items = [
+            TrendingWish(
+                id=wish.id,
+                title=wish.title,
+                description=wish.description,
+                image_url=wish.image_url,
+                goal=wish.goal,
+                raised=wish.raised or 0.0,
+                owner_id=wish.owner_id,
+                is_public=wish.is_public,
+                category=wish.category,
+                score=decayed_weight(score),
+            )
+            for (wish_id, score), wish in zip(ranked, wishes)
+            # Желание могло стать приватным или быть удалено после обновления списка
+            if wish is not None and wish.is_public
+        ]
+        return TrendingWishesPage(
+            items=items,
+            offset=offset,
+            limit=limit,
+            has_more=offset + limit < len(trending),
+        )
+    except Exception as e:
+        logging.error("Failed to get trending wishes: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to get trending wishes")
+
+
 @router.get("/{wish_id}",
             response_model=Wish,
             )
-async def get_wish(wish_id: int, db: AsyncSession = Depends(get_db)):
+async def get_wish(wish_id: int, loaders: Loaders = Depends(get_loaders)):
     try:
-        wish = await wish_crud.get_wish_by_id(db, wish_id)
+        wish = await loaders.load_wish(wish_id)
         if not wish:
             raise HTTPException(status_code=404, detail="Wish not found")
         return wish
@@ -200,9 +303,6 @@ async def update_wish(
         db: AsyncSession = Depends(get_db),
 ):
     try:
-        if current_user.is_guest:
-            raise HTTPException(status_code=403, detail="Гостям запрещено обновлять желания")
-
         wish = await wish_crud.get_wish_by_id(db, wish_id)
         if not wish:
             raise HTTPException(status_code=404, detail="Wish not found")
@@ -213,11 +313,7 @@ async def update_wish(
         final_image_url = image_url
         if image_file:
             # Сохраняем файл, формируем URL
-            filename = f"{uuid.uuid4()}.{image_file.filename.split('.')[-1]}"
-            file_path = os.path.join(UPLOAD_DIR_WISHES, filename)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(image_file.file, buffer)
+            filename = save_upload_file(image_file, get_settings().upload_dir("wishes"), "wish_image")
 
             # Формируем URL для доступа к файлу
             relative_path = f"/uploads/wishes/{filename}"
@@ -238,6 +334,7 @@ async def update_wish(
 
         wish_update_obj = WishUpdate(**update_data)
         updated_wish = await wish_crud.update_wish(db, wish, wish_update_obj)
+        await db.commit()
         return updated_wish
     except Exception as e:
         logging.error("Failed to update wish: %s", e)
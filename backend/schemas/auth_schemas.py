@@ -30,6 +30,10 @@ class EmailVerificationRequest(BaseModel):
     code: str
 
 
+class EmailResendRequest(BaseModel):
+    email: EmailStr
+
+
 class VKAuthRequest(BaseModel):
     code: str
     code_verifier: str
@@ -1,4 +1,10 @@
 from pydantic import BaseModel
 
 class LikeRequest(BaseModel):
-    wish_id: int
\ No newline at end of file
+    wish_id: int
+
+
+class LikeState(BaseModel):
+    wish_id: int
+    liked: bool   # лайк текущего пользователя (для анонимного запроса — false)
+    count: int
@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from typing import Optional, List
+from enum import Enum
+
+
+class SearchType(str, Enum):
+    all = "all"
+    wishes = "wishes"
+    users = "users"
+    communities = "communities"
+
+
+class SearchHit(BaseModel):
+    type: str  # wish | user | community
+    id: int
+    title: str
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+    owner_id: Optional[int] = None
+    category: Optional[str] = None
+    rank: float
+
+
+class SearchResponse(BaseModel):
+    query: str
+    type: SearchType
+    offset: int
+    limit: int
+    has_more: bool
+    results: List[SearchHit]
@@ -112,8 +112,18 @@ class UserOut(BaseModel):
         orm_mode = True
 
 
+class UserStatsOut(BaseModel):
+    wishlistsCount: int = 0
+    publicWishlistsCount: int = 0
+    friendsCount: int = 0
+    totalRaised: float = 0
+    likesReceived: int = 0
+    communitiesJoined: int = 0
+
+
 class UserOutWithFriend(UserOut):
     isFriend: bool
+    stats: Optional[UserStatsOut] = None
 
     class Config:
         orm_mode = True
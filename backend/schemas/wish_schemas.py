@@ -2,7 +2,7 @@ from pydantic import BaseModel, EmailStr, HttpUrl, Field, validator
 from typing import Optional, List
 from enum import Enum
 from datetime import datetime
-from schemas.user_schemas import UserResponse
+from decimal import Decimal
 
 
 class WishBase(BaseModel):
@@ -44,19 +44,58 @@ class WishWithStats(BaseModel):
     likes_count: int
     comments_count: int
     is_public: bool
+    liked_by_me: bool = False
 
     class Config:
         orm_mode = True
 
 
-class WishWithOwner(Wish):
-    owner: Optional[UserResponse]
+class InfluencerOwner(BaseModel):
+    id: int
+    name: Optional[str] = None
+    avatar_url: Optional[str] = None
+
+
+class InfluencerWish(BaseModel):
+    # Карточка карусели: описание обрезано, владелец — только имя и аватар
+    id: int
+    title: str
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+    goal: float
+    raised: float
+    category: Optional[str] = None
+    owner: InfluencerOwner
     supporters: int
+    ends_at: datetime
     time_left: str
+
+
+class TrendingWish(Wish):
     category: Optional[str] = None
+    score: float  # суммарный вес лайков, комментариев и поддержек с учётом затухания
 
-    class Config:
-        orm_mode = True
+
+class TrendingWishesPage(BaseModel):
+    items: List[TrendingWish]
+    offset: int
+    limit: int
+    has_more: bool
+
+
+class ContributionCreate(BaseModel):
+    # Ровно копейки: 0.001 отклоняется, а не округляется
+    amount: Decimal = Field(..., gt=0, max_digits=12, decimal_places=2)
+
+
+class ContributionOut(BaseModel):
+    id: int
+    wish_id: int
+    user_id: int
+    amount: Decimal
+    supported_at: datetime
+    raised: Decimal  # итог желания после взноса
+    replayed: bool   # повтор с тем же Idempotency-Key: взнос уже был учтён
 
 
 class WishUpdate(BaseModel):
@@ -0,0 +1,176 @@
+import asyncio
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Таблица activities секционирована по месяцам created_at (миграция 0008):
+# секция activities_y2026m10 хранит октябрь 2026 по UTC. Лента читает только
+# последние секции, а старые целиком отсоединяются, выгружаются в сжатый CSV
+# и удаляются — без DELETE по строкам и без работы VACUUM над историей.
+# Строки месяца, секция которого ещё не создана, попадают в секцию по
+# умолчанию activities_default и переносятся при создании секции месяца.
+#
+# Лайки активностей (activity_likes) ссылаются на activities.id без внешнего
+# ключа (на секционированную таблицу он возможен только с created_at) и
+# архивируются вместе со своей секцией.
+
+PARTITION_RE = re.compile(r"^activities_y(\d{4})m(\d{2})$")
+DEFAULT_PARTITION = "activities_default"
+
+
+def add_months(month: date, count: int) -> date:
+    year, index = divmod(month.year * 12 + month.month - 1 + count, 12)
+    return date(year, index + 1, 1)
+
+
+def month_of(moment: datetime) -> date:
+    moment = moment.astimezone(timezone.utc)
+    return date(moment.year, moment.month, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"activities_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_bounds(month: date) -> tuple[str, str]:
+    # Границы явно в UTC: без смещения строка читается в часовом поясе сессии
+    return f"'{month.isoformat()} 00:00:00+00'", f"'{add_months(month, 1).isoformat()} 00:00:00+00'"
+
+
+async def create_partition(conn, month: date) -> None:
+    """
+    Создаёт секцию месяца, если её нет. Строки этого месяца, уже попавшие в
+    секцию по умолчанию, переносятся в новую секцию до её присоединения:
+    иначе присоединение отказало бы из-за них.
+    """
+    name = partition_name(month)
+    if await conn.scalar(text("SELECT to_regclass(:name)"), {"name": name}) is not None:
+        return
+    lower, upper = partition_bounds(month)
+    await conn.execute(text(f"CREATE TABLE {name} (LIKE activities INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    await conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= {lower} AND created_at < {upper} "
+        f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+    ))
+    await conn.execute(text(f"ALTER TABLE activities ATTACH PARTITION {name} FOR VALUES FROM ({lower}) TO ({upper})"))
+
+
+async def ensure_partitions(conn, months_back: int = 0, months_ahead: int = 3, now: Optional[datetime] = None):
+    """
+    Создаёт секцию по умолчанию и недостающие секции от текущего месяца минус
+    months_back до плюс months_ahead. Коммит делает вызывающий код.
+    """
+    # Создание и присоединение секции ненадолго берут эксклюзивную блокировку таблицы:
+    # не встаём в очередь за долгими запросами, повторим при следующем запуске
+    await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+    await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF activities DEFAULT"))
+    current = month_of(now or datetime.now(timezone.utc))
+    month, last = add_months(current, -months_back), add_months(current, months_ahead)
+    while month <= last:
+        await create_partition(conn, month)
+        month = add_months(month, 1)
+
+
+async def list_partitions(conn) -> dict[date, tuple[str, Optional[bool]]]:
+    """
+    Месяц -> (имя секции, состояние): True — присоединена, None — отсоединение
+    не завершено (DETACH CONCURRENTLY прерван), False — уже отсоединена.
+    """
+    rows = await conn.execute(text(
+        "SELECT c.relname, i.inhdetachpending FROM pg_class c "
+        "LEFT JOIN pg_inherits i ON i.inhrelid = c.oid AND i.inhparent = 'activities'::regclass "
+        "WHERE c.relkind = 'r' AND c.relname LIKE 'activities_y%'"
+    ))
+    partitions = {}
+    for name, detach_pending in rows:
+        match = PARTITION_RE.match(name)
+        if match:
+            state = None if detach_pending else (detach_pending is not None)
+            partitions[date(int(match[1]), int(match[2]), 1)] = (name, state)
+    return partitions
+
+
+async def _copy_to_gzip(driver, path: str, *, table: Optional[str] = None, query: Optional[str] = None) -> None:
+    # Запись во временный файл и переименование: на диске либо полный архив, либо ничего.
+    # Сжатие и запись — в потоке, event loop воркера не блокируется
+    tmp_path = path + ".part"
+    archive = await asyncio.to_thread(gzip.open, tmp_path, "wb")
+    try:
+        async def write(chunk: bytes):
+            await asyncio.to_thread(archive.write, chunk)
+
+        if table is not None:
+            await driver.copy_from_table(table, output=write, format="csv", header=True)
+        else:
+            await driver.copy_from_query(query, output=write, format="csv", header=True)
+    finally:
+        await asyncio.to_thread(archive.close)
+
+    def sync_and_rename():
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    await asyncio.to_thread(sync_and_rename)
+
+
+async def archive_partition(engine, name: str, archive_dir: str, batch_size: int = 5000) -> None:
+    """Выгружает отсоединённую секцию и её лайки в archive_dir и удаляет их из БД."""
+    likes_query = f"SELECT l.* FROM activity_likes l JOIN {name} a ON a.id = l.activity_id"
+    async with engine.connect() as conn:
+        driver = (await conn.get_raw_connection()).driver_connection
+        await _copy_to_gzip(driver, os.path.join(archive_dir, f"{name}.csv.gz"), table=name)
+        await _copy_to_gzip(driver, os.path.join(archive_dir, f"activity_likes_{name[len('activities_'):]}.csv.gz"),
+                            query=likes_query)
+
+        # Лайки — пачками (короткие транзакции), секция — одним DROP
+        while True:
+            result = await conn.execute(text(
+                f"DELETE FROM activity_likes WHERE id IN "
+                f"(SELECT l.id FROM activity_likes l JOIN {name} a ON a.id = l.activity_id LIMIT :batch)"
+            ), {"batch": batch_size})
+            await conn.commit()
+            if result.rowcount < batch_size:
+                break
+        await conn.execute(text(f"DROP TABLE {name}"))
+        await conn.commit()
+
+
+async def maintain_partitions(engine, archive_dir: str, retention_months: int, months_ahead: int = 3,
+                              now: Optional[datetime] = None) -> list[str]:
+    """
+    Создаёт секции на months_ahead месяцев вперёд и архивирует секции старше
+    retention_months полных месяцев. Возвращает имена архивированных секций.
+    Повторный запуск продолжает прерванную архивацию.
+    """
+    current = month_of(now or datetime.now(timezone.utc))
+    cutoff = add_months(current, -retention_months)
+
+    async with engine.connect() as conn:
+        await ensure_partitions(conn, months_ahead=months_ahead, now=now)
+        await conn.commit()
+        partitions = await list_partitions(conn)
+
+    os.makedirs(archive_dir, exist_ok=True)
+    archived = []
+    for month, (name, state) in sorted(partitions.items()):
+        if month >= cutoff:
+            continue
+        # DETACH CONCURRENTLY не выполняется в транзакции и не блокирует чтение и запись ленты
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            if state is True:
+                await conn.execute(text(f"ALTER TABLE activities DETACH PARTITION {name} CONCURRENTLY"))
+            elif state is None:
+                await conn.execute(text(f"ALTER TABLE activities DETACH PARTITION {name} FINALIZE"))
+        await archive_partition(engine, name, archive_dir)
+        logger.info("Archived activity partition %s", name)
+        archived.append(name)
+    return archived
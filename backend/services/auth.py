@@ -1,14 +1,16 @@
 from datetime import datetime, timedelta
 from typing import Optional
+import uuid
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import lazyload
 from database import get_db
-from models import User
+from models import PrivacyEnum, User
 
 # TODO прописать получение секретного ключа из переменных окружения
 SECRET_KEY = "your-secret-key"  # Замените на свой секрет
@@ -19,6 +21,16 @@ REFRESH_TOKEN_EXPIRE_DAYS = 30
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# Для эндпоинтов, доступных и без входа: без токена не отвечает 401
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+# Гость существует только в подписанном токене (claim "guest"): строки в users
+# нет, пока гость ничего не создал. Первое действие, создающее данные
+# (комментарий, лайк, сообщение в чате и т.п.), сохраняет гостя в users с email
+# из токена (get_current_user_or_saved_guest); при регистрации с гостевым
+# токеном эта строка становится аккаунтом и созданное гостем остаётся за ним
+GUEST_USER_ID = 0
+GUEST_NAME = "Гость"
 
 
 def verify_password(plain_password, hashed_password):
@@ -36,7 +48,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
+def create_guest_token() -> str:
+    return create_access_token(data={"sub": f"guest_{uuid.uuid4()}@example.com", "guest": True})
+
+
+def decode_guest_email(token: Optional[str]) -> Optional[str]:
+    # Email гостя из действующего гостевого токена, иначе None
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub") if payload.get("guest") else None
+
+
+def guest_user(payload: dict) -> User:
+    # Транзиентный объект: в сессию не добавляется и в БД не попадает
+    return User(id=GUEST_USER_ID, email=payload["sub"], name=GUEST_NAME, is_guest=True, is_verified=True,
+                privacy=PrivacyEnum.private, wishes=[], friends=[])
+
+
+async def get_current_user_or_guest(token: str = Depends(oauth2_scheme),
+                                    db: AsyncSession = Depends(get_db)) -> User:
+    # Для эндпоинтов, открытых гостям, которые ничего не создают от их имени.
+    # Сохранённый гость (см. get_current_user_or_saved_guest) — строка из users
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -49,20 +85,71 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    # Коллекции пользователя (желания, друзья, посты) не загружаем: эндпоинты,
+    # которым они нужны, читают их сами одним запросом
     result = await db.execute(
         select(User)
-        .options(
-            selectinload(User.wishes),
-            selectinload(User.friends)
-        )
+        .options(lazyload("*"))
         .filter(User.email == email)
     )
 
     user = result.scalars().first()
     if user is None:
+        if payload.get("guest"):
+            return guest_user(payload)
         raise credentials_exception
     return user
 
+
+async def get_current_user_or_saved_guest(user: User = Depends(get_current_user_or_guest),
+                                          db: AsyncSession = Depends(get_db)) -> User:
+    # Для эндпоинтов, создающих данные от имени пользователя, открытых и гостям:
+    # гостя без строки в users сохраняет в транзакции запроса (коммит делает
+    # эндпоинт вместе с созданными данными; при ошибке строка не остаётся)
+    if user.id != GUEST_USER_ID:
+        return user
+    # ON CONFLICT: параллельные запросы с одним гостевым токеном создают одну строку
+    await db.execute(
+        insert(User)
+        .values(email=user.email, hashed_password=get_password_hash(uuid.uuid4().hex), name=GUEST_NAME,
+                is_guest=True, is_verified=True, privacy=PrivacyEnum.private)
+        .on_conflict_do_nothing(index_elements=[User.email])
+    )
+    result = await db.execute(
+        select(User)
+        .options(lazyload("*"))
+        .filter(User.email == user.email)
+    )
+    return result.scalars().one()
+
+
+async def get_current_user(user: User = Depends(get_current_user_or_guest)) -> User:
+    # Только зарегистрированный пользователь; гостю — 403, а не 401, чтобы клиент не сбрасывал вход
+    if user.is_guest:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail="Для данного действия необходимо зарегистрироваться")
+    return user
+
+async def get_current_user_id_optional(
+        token: Optional[str] = Depends(oauth2_scheme_optional),
+        db: AsyncSession = Depends(get_db),
+) -> Optional[int]:
+    # Только id: без загрузки связей пользователя, которые здесь не нужны.
+    # Невалидный или просроченный токен — просто анонимный запрос; гость без
+    # строки в users тоже анонимен, сохранённый гость — по своей строке
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    email = payload.get("sub")
+    if email is None:
+        return None
+    result = await db.execute(select(User.id).filter(User.email == email))
+    return result.scalar_one_or_none()
+
+
 def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
@@ -1,57 +1,85 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import update, delete, exists, func
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List
 import logging
 import secrets
-import uuid
 
 from models import (User, Wish, Comment, Activity, ActivityType, Like,
                     ActivityLike, EmailVerification, friend_association)
+from database import Base, any_of
 from services.auth import get_password_hash
 
 logger = logging.getLogger(__name__)
 
 
-async def create_email_verification(db: AsyncSession, user_id: int, code: str):
-    logger.info("start create_email_verification")
+async def create_email_verification(db: AsyncSession, user_id: int, code: str, ttl: timedelta):
+    logger.debug("start create_email_verification")
 
-    verification = EmailVerification(user_id=user_id, code=code)
+    # Запись уходит в БД при коммите вызывающего кода вместе с пользователем
+    verification = EmailVerification(user_id=user_id, code=code,
+                                      expires_at=datetime.now(timezone.utc) + ttl)
     db.add(verification)
-    await db.commit()
-    await db.refresh(verification)
     return verification
 
 
+# Перед выдачей нового кода: действует только последний отправленный.
+# Коммит делает вызывающий код
+async def delete_user_verifications(db, user_id: int):
+    await db.execute(
+        delete(EmailVerification)
+        .where(EmailVerification.user_id == user_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
 async def get_email_verification(db, user_id: int, code: str):
+    # Просроченные коды не принимаются, даже если очистка до них ещё не дошла
     result = await db.execute(
         select(EmailVerification).where(
             EmailVerification.user_id == user_id,
-            EmailVerification.code == code
+            EmailVerification.code == code,
+            EmailVerification.expires_at > func.now(),
         )
     )
     return result.scalars().first()
 
 
-async def mark_user_email_verified(db, user_id: int):
+async def delete_expired_verifications(db, batch_size: int) -> int:
+    # Одна пачка просроченных кодов; SKIP LOCKED — параллельные очистки
+    # (другие воркеры) не ждут друг друга. Коммит делает вызывающий код
+    expired = (
+        select(EmailVerification.id)
+        .where(EmailVerification.expires_at <= func.now())
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
     result = await db.execute(
-        select(User).where(User.id == user_id)
+        delete(EmailVerification)
+        .where(EmailVerification.id.in_(expired.scalar_subquery()))
+        .execution_options(synchronize_session=False)
     )
-    user = result.scalars().first()
-    if user:
-        user.is_verified = True
-        await db.commit()
-        await db.refresh(user)
-    return user
+    return result.rowcount
 
 
-async def delete_email_verification(db, verification_id: int):
+# Коммит делает вызывающий код: подтверждение и удаление кода — одна транзакция
+async def mark_user_email_verified(db, user_id: int) -> bool:
     result = await db.execute(
-        select(EmailVerification).where(EmailVerification.id == verification_id)
+        update(User)
+        .where(User.id == user_id)
+        .values(is_verified=True)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+
+async def delete_email_verification(db, verification_id: int):
+    await db.execute(
+        delete(EmailVerification)
+        .where(EmailVerification.id == verification_id)
+        .execution_options(synchronize_session=False)
     )
-    verification = result.scalars().first()
-    if verification:
-        await db.delete(verification)
-        await db.commit()
 
 
 async def get_user_by_vk_id(db: AsyncSession, vk_id: int) -> User | None:
@@ -77,11 +105,11 @@ async def create_user_from_vk(
         avatar_url=avatar_url,
         hashed_password=get_password_hash(fake_password),
         is_verified=True,
-        is_guest=False
+        is_guest=False,
+        wishes=[],
     )
     db.add(user)
-    await db.commit()
-    await db.refresh(user)
+    await db.flush()
     return user
 
 
@@ -89,23 +117,52 @@ async def link_vk_to_user(db: AsyncSession, user_id: int, vk_id: int) -> User:
     user = await db.get(User, user_id)
     if user:
         user.vk_id = vk_id
-        await db.commit()
-        await db.refresh(user)
+        await db.flush()
     return user
 
 
-async def create_guest_user(db: AsyncSession):
-    # Создаем уникальный email для гостя, например, с префиксом guest и uuid
-    guest_email = f"guest_{uuid.uuid4()}@example.com"
-    guest_user = User(
-        email=guest_email,
-        hashed_password=get_password_hash(uuid.uuid4().hex),
-        name="Гость",
-        is_guest=True,
-        is_verified=True
+def _guest_content_columns():
+    # Все ссылки на users, кроме служебных строк, удаляемых вместе с гостем
+    # (коды подтверждения; user_stats удаляется каскадом)
+    for table in Base.metadata.sorted_tables:
+        if table.name in ("email_verification", "user_stats"):
+            continue
+        for fk in table.foreign_keys:
+            if fk.column.table is User.__table__:
+                yield fk.parent
+
+
+async def delete_guest_batch(db: AsyncSession, after_id: int, batch_size: int) -> tuple[int, Optional[int]]:
+    """
+    Удаляет очередную пачку гостей из прежней схемы (строка в users на каждого
+    гостя) с id больше after_id. Гости, успевшие что-то создать (комментарии,
+    сообщения и т.п.), остаются. Возвращает число удалённых и последний
+    просмотренный id (None — гостей больше нет). Коммит делает вызывающий код.
+    """
+    result = await db.execute(
+        select(User.id)
+        .where(User.is_guest.is_(True), User.id > after_id)
+        .order_by(User.id)
+        .limit(batch_size)
+    )
+    ids = result.scalars().all()
+    if not ids:
+        return 0, None
+
+    doomed = (
+        select(User.id)
+        .where(any_of(User.id, ids), *(~exists().where(column == User.id) for column in _guest_content_columns()))
+        .cte("doomed_guests")
+    )
+    verifications = (
+        delete(EmailVerification)
+        .where(EmailVerification.user_id.in_(select(doomed.c.id)))
+        .returning(EmailVerification.id)
+        .cte("doomed_verifications")
+    )
+    # Коды подтверждения и пользователи удаляются одним запросом: проверка
+    # внешних ключей выполняется в конце запроса
+    result = await db.execute(
+        delete(User).where(User.id.in_(select(doomed.c.id))).returning(User.id).add_cte(verifications)
     )
-    db.add(guest_user)
-    await db.commit()
-    await db.refresh(guest_user)
-    # Возвращайте нужные данные, например, токен или id
-    return guest_user
+    return len(result.all()), ids[-1]
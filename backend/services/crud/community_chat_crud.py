@@ -4,7 +4,7 @@ from sqlalchemy.orm import selectinload
 from models import CommunityChatMessage, User
 from schemas.community_chat_schemas import CommunityChatMessageCreate
 
-# Отправить сообщение в чат
+# Отправить сообщение в чат. Коммит делает вызывающий код
 async def create_chat_message(db: AsyncSession, chat_message_create: CommunityChatMessageCreate, user: User):
     db_message = CommunityChatMessage(
         community_id=chat_message_create.community_id,
@@ -12,8 +12,7 @@ async def create_chat_message(db: AsyncSession, chat_message_create: CommunityCh
         message=chat_message_create.message
     )
     db.add(db_message)
-    await db.commit()
-    await db.refresh(db_message)
+    await db.flush()
     return db_message
 
 # Получить все сообщения чата сообщества (по community_id)
@@ -31,4 +30,4 @@ async def get_chat_messages(db: AsyncSession, community_id: int, skip: int = 0,
 # Удалить сообщение чата (например, по id)
 async def delete_chat_message(db: AsyncSession, message: CommunityChatMessage):
     await db.delete(message)
-    await db.commit()
+    await db.flush()
@@ -1,14 +1,26 @@
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.orm import selectinload, joinedload, lazyload
+from sqlalchemy import update, text
 from sqlalchemy.exc import IntegrityError
 
 from models import Community, CommunityMember, User, CommunityRole
 from schemas.community_schemas import CommunityCreate, CommunityUpdate
+from database import any_of
+import services.crud.user_stats_crud as user_stats_crud
 
 
-# Создать сообщество
+# Пересчёт Community.member_count по community_members — для данных, загруженных
+# в обход CRUD (benchmarks/dataset.py). Обновляются только расходящиеся строки
+RECOUNT_MEMBERS_SQL = text("""
+    UPDATE communities c SET member_count = m.member_count
+    FROM (SELECT community_id, count(*) AS member_count FROM community_members GROUP BY community_id) m
+    WHERE m.community_id = c.id AND c.member_count <> m.member_count
+""")
+
+
+# Создать сообщество. Коммит делает вызывающий код
 async def create_community(db: AsyncSession, community_create: CommunityCreate, owner: User):
     db_community = Community(
         name=community_create.name,
@@ -17,11 +29,13 @@ async def create_community(db: AsyncSession, community_create: CommunityCreate,
         category=community_create.category,
         is_active=True,
         rules=community_create.rules,
+        # Создатель — первый участник
+        member_count=1,
     )
 
     db.add(db_community)
-    await db.commit()
-    await db.refresh(db_community)
+    # INSERT ... RETURNING: id и created_at приходят без отдельного SELECT
+    await db.flush()
 
     # Добавить создателя как администратора
     db_member = CommunityMember(
@@ -30,18 +44,17 @@ async def create_community(db: AsyncSession, community_create: CommunityCreate,
         role="admin"
     )
     db.add(db_member)
-    await db.commit()
-    await db.refresh(db_member)
+    await user_stats_crud.bump(db, owner.id, communities_joined=1)
 
     return db_community
 
 
-# Получить список всех сообществ
+# Получить список всех сообществ. Участники и сообщения чата не загружаются:
+# число участников — Community.member_count
 async def get_communities(db: AsyncSession, skip: int = 0, limit: int = 20):
     result = await db.execute(
         select(Community)
-        .options(selectinload(Community.memberships))
-        .options(selectinload(Community.wishes))
+        .options(lazyload("*"), selectinload(Community.wishes))
         .offset(skip)
         .limit(limit)
     )
@@ -53,7 +66,7 @@ async def get_communities_by_user_id(db: AsyncSession, user_id: int):
     result = await db.execute(
         select(Community)
         .join(Community.memberships)
-        .options(selectinload(Community.wishes), selectinload(Community.memberships))
+        .options(lazyload("*"), selectinload(Community.wishes))
         .where(CommunityMember.user_id == user_id)
     )
     return result.scalars().all()
@@ -69,21 +82,28 @@ async def get_community_by_id(db: AsyncSession, community_id: int):
     return result.scalars().first()
 
 
+# Получить несколько сообществ одним запросом (для DataLoader)
+async def get_communities_by_ids(db: AsyncSession, community_ids) -> dict[int, Community]:
+    result = await db.execute(
+        select(Community).where(any_of(Community.id, community_ids))
+    )
+    return {community.id: community for community in result.scalars().all()}
+
+
 # Обновить сообщество
 async def update_community(db: AsyncSession, db_community: Community, community_update: CommunityUpdate):
     update_data = community_update.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_community, key, value)
     db.add(db_community)
-    await db.commit()
-    await db.refresh(db_community)
+    await db.flush()
     return db_community
 
 
 # Удалить сообщество
 async def delete_community(db: AsyncSession, db_community: Community):
     await db.delete(db_community)
-    await db.commit()
+    await db.flush()
 
 
 # Проверить, является ли пользователь админом
@@ -127,31 +147,33 @@ async def add_community_member(
         role: str = "member"
 ):
     # Проверка, нет ли уже этого пользователя в этом сообществе
-    result = await db.execute(
-        select(CommunityMember)
-        .options(selectinload(CommunityMember.user), selectinload(CommunityMember.community))
-        .where(
-            CommunityMember.community_id == community_id,
-            CommunityMember.user_id == user_id
-        )
-    )
-    exists = result.scalar_one_or_none()
-    if exists:
+    if await is_community_member(db, community_id, user_id):
         raise HTTPException(status_code=400, detail="Пользователь уже является участником сообщества")
 
-    # Добавление участника
+    # Ответу нужны только имя и аватар — коллекции пользователя не загружаем
+    user = await db.get(User, user_id, options=[lazyload("*")])
+    if not user:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+
+    # Добавление участника; member.user уже заполнен — ответу не нужен refresh.
+    # Вставка в точке сохранения: при ошибке откатывается только она, а
+    # транзакция вызывающего кода остаётся целой. Коммит делает вызывающий код
     member = CommunityMember(
         community_id=community_id,
-        user_id=user_id,
+        user=user,
         role=role
     )
-    db.add(member)
     try:
-        await db.commit()
+        async with db.begin_nested():
+            db.add(member)
     except IntegrityError:
-        await db.rollback()
         raise HTTPException(status_code=400, detail="Ошибка при добавлении участника")
-    await db.refresh(member)
+    await db.execute(
+        update(Community)
+        .where(Community.id == community_id)
+        .values(member_count=Community.member_count + 1)
+    )
+    await user_stats_crud.bump(db, user_id, communities_joined=1)
     return member
 
 
@@ -0,0 +1,78 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import func, update
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import logging
+
+from models import EmailOutbox, EmailStatus
+
+logger = logging.getLogger(__name__)
+
+
+# Поставить письмо в очередь. Коммит делает вызывающий код —
+# письмо сохраняется в одной транзакции с породившим его действием
+def enqueue_email(
+        db: AsyncSession,
+        to_email: str,
+        subject: str,
+        body_text: str,
+        body_html: Optional[str] = None,
+) -> EmailOutbox:
+    email = EmailOutbox(
+        to_email=to_email,
+        subject=subject,
+        body_text=body_text,
+        body_html=body_html,
+        status=EmailStatus.pending,
+    )
+    db.add(email)
+    return email
+
+
+# Взять пачку писем в аренду: next_attempt_at сдвигается на lease_seconds,
+# и другие воркеры их не видят, пока аренда не истечёт. Вызывающий код сразу
+# коммитит — отправка идёт без открытой транзакции и блокировок строк. Если
+# воркер упадёт до записи результата, письмо снова станет доступным по
+# истечении аренды. SKIP LOCKED — параллельные захваты не ждут друг друга
+async def claim_pending_emails(db: AsyncSession, limit: int, lease_seconds: float = 600) -> List[EmailOutbox]:
+    due = (
+        select(EmailOutbox.id)
+        .where(
+            EmailOutbox.status == EmailStatus.pending,
+            EmailOutbox.next_attempt_at <= func.now(),
+        )
+        .order_by(EmailOutbox.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    leased = (
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(due.scalar_subquery()))
+        .values(next_attempt_at=func.now() + timedelta(seconds=lease_seconds))
+        .returning(EmailOutbox)
+    )
+    result = await db.execute(
+        select(EmailOutbox).from_statement(leased).execution_options(populate_existing=True)
+    )
+    return result.scalars().all()
+
+
+def mark_email_sent(email: EmailOutbox):
+    email.status = EmailStatus.sent
+    email.attempts += 1
+    email.sent_at = datetime.now(timezone.utc)
+    email.last_error = None
+
+
+def mark_email_failed(email: EmailOutbox, error: str, max_attempts: int):
+    email.attempts += 1
+    email.last_error = error[:1000]
+    if email.attempts >= max_attempts:
+        email.status = EmailStatus.failed
+        logger.error("Giving up on email %s to %s after %s attempts: %s",
+                     email.id, email.to_email, email.attempts, error)
+        return
+    # Экспоненциальная задержка: 30с, 1м, 2м, 4м, ...
+    delay = timedelta(seconds=30 * 2 ** (email.attempts - 1))
+    email.next_attempt_at = datetime.now(timezone.utc) + delay
@@ -1,117 +1,113 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
-from sqlalchemy import func, or_, and_
+from sqlalchemy import func, or_, and_, delete
+from sqlalchemy.dialects.postgresql import insert
 from typing import List
 import logging
 
-from models import (User, Wish, Comment, Activity, ActivityType, Like,
+from models import (User, UserStats, Wish, Comment, Activity, ActivityType, Like,
                     ActivityLike, EmailVerification, friend_association)
 from schemas.user_schemas import UserOut
+from database import any_of
+import services.crud.user_stats_crud as user_stats_crud
 
 logger = logging.getLogger(__name__)
 
 
-async def add_friend(db: AsyncSession, user: User, friend: User):
-    if friend not in user.friends:
-        user.friends.append(friend)
-        await db.commit()
-
-    if user not in friend.friends:
-        friend.friends.append(user)
-        await db.commit()
-    await db.refresh(user)
-    return user
+# Дружба взаимна: записи в обе стороны и счётчики friend_count — один запрос.
+# Уже существующие записи пропускаются (ON CONFLICT DO NOTHING), счётчик
+# меняется только для реально вставленных. Коммит делает вызывающий код
+async def add_friend(db: AsyncSession, user: User, friend: User) -> bool:
+    inserted = (
+        insert(friend_association)
+        .values([
+            {"user_id": user.id, "friend_id": friend.id},
+            {"user_id": friend.id, "friend_id": user.id},
+        ])
+        .on_conflict_do_nothing()
+        .returning(friend_association.c.user_id)
+        .cte("inserted_friendship")
+    )
+    stats = user_stats_crud.users_upsert(inserted.c.user_id, friend_count=1).cte("friendship_stats")
+    result = await db.execute(select(inserted.c.user_id).add_cte(stats))
+    return bool(result.all())
+
+
+# Удалить дружбу в обе стороны и уменьшить счётчики — один запрос.
+# Коммит делает вызывающий код
+async def remove_friend(db: AsyncSession, user: User, friend: User) -> bool:
+    deleted = (
+        delete(friend_association)
+        .where(or_(
+            and_(friend_association.c.user_id == user.id, friend_association.c.friend_id == friend.id),
+            and_(friend_association.c.user_id == friend.id, friend_association.c.friend_id == user.id),
+        ))
+        .returning(friend_association.c.user_id)
+        .cte("deleted_friendship")
+    )
+    stats = user_stats_crud.users_upsert(deleted.c.user_id, friend_count=-1).cte("unfriend_stats")
+    result = await db.execute(select(deleted.c.user_id).add_cte(stats))
+    return bool(result.all())
 
 
-async def remove_friend(db: AsyncSession, user: User, friend: User):
-    # Удаляем запись где user -> friend
-    if friend in user.friends:
-        user.friends.remove(friend)
-    # Удаляем запись где friend -> user
-    if user in friend.friends:
-        friend.friends.remove(user)
-    await db.commit()
-    await db.refresh(user)
-    await db.refresh(friend)
-    return user
+async def get_friend_ids_by_user_ids(db: AsyncSession, user_ids) -> dict[int, set[int]]:
+    # id друзей сразу для нескольких пользователей одним запросом
+    result = await db.execute(
+        select(friend_association.c.user_id, friend_association.c.friend_id)
+        .where(any_of(friend_association.c.user_id, user_ids))
+    )
+    friend_ids = {user_id: set() for user_id in user_ids}
+    for user_id, friend_id in result.all():
+        friend_ids[user_id].add(friend_id)
+    return friend_ids
+
+
+async def _get_friends_out(db: AsyncSession, user_id: int) -> List[UserOut]:
+    # Друзья, их счётчик желаний из user_stats и число общих друзей — один запрос
+    # на весь список; коллекции пользователей (желания, посты) не загружаются
+    user_friend_ids = select(friend_association.c.friend_id).where(friend_association.c.user_id == user_id)
+    friends_of_friend = friend_association.alias("friends_of_friend")
+    mutual_friends = (
+        select(func.count())
+        .select_from(friends_of_friend)
+        .where(friends_of_friend.c.user_id == User.id, friends_of_friend.c.friend_id.in_(user_friend_ids))
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(
+            User.id,
+            User.email,
+            User.name,
+            User.avatar_url,
+            mutual_friends.label("mutual_friends"),
+            func.coalesce(UserStats.wish_count, 0).label("wish_count"),
+        )
+        .join(friend_association, friend_association.c.friend_id == User.id)
+        .outerjoin(UserStats, UserStats.user_id == User.id)
+        .where(friend_association.c.user_id == user_id)
+    )
+    return [
+        UserOut(
+            id=row.id,
+            email=row.email,
+            name=row.name,
+            avatar_url=row.avatar_url,
+            mutualFriends=row.mutual_friends,
+            wishlistsCount=row.wish_count,
+        )
+        for row in result.all()
+    ]
 
 
 async def get_friends(db: AsyncSession, user: User) -> List[UserOut]:
-    # Обновляем объект пользователя, чтобы получить актуальный список друзей
-    await db.refresh(user)
-
-    user_friends = user.friends
-    user_friends_ids = {friend.id for friend in user_friends}
-
-    friends_out = []
-
-    for friend in user_friends:
-        # Количество желаний друга
-        wishlists_count = (await db.execute(
-            select(func.count(Wish.id)).where(Wish.owner_id == friend.id)
-        )).scalar() or 0
-
-        # Количество общих друзей
-        friend_obj = (await db.execute(
-            select(User).options(selectinload(User.friends)).where(User.id == friend.id)
-        )).scalars().first()
-        friend_friends_ids = {f.id for f in friend_obj.friends} if friend_obj else set()
-
-        mutual_friends_count = len(user_friends_ids.intersection(friend_friends_ids))
-
-        friends_out.append(
-            UserOut(
-                id=friend.id,
-                email=friend.email,
-                name=friend.name,
-                avatar_url=friend.avatar_url,
-                mutualFriends=mutual_friends_count,
-                wishlistsCount=wishlists_count,
-            )
-        )
-
-    return friends_out
+    return await _get_friends_out(db, user.id)
 
 
 async def get_friends_by_user_id(db: AsyncSession, user_id: int) -> List[UserOut]:
-    user = (await db.execute(
-        select(User).options(selectinload(User.friends)).where(User.id == user_id)
-    )).scalars().first()
-
-    if not user:
+    if await db.scalar(select(User.id).where(User.id == user_id)) is None:
         return None
 
-    user_friends = user.friends
-    user_friends_ids = {f.id for f in user_friends}
-
-    friends_out = []
-    for friend in user_friends:
-        # Количество желаний друга
-        wishlists_count = (await db.execute(
-            select(func.count(Wish.id)).where(Wish.owner_id == friend.id)
-        )).scalar() or 0
-
-        # Количество общих друзей
-        friend_obj = (await db.execute(
-            select(User).options(selectinload(User.friends)).where(User.id == friend.id)
-        )).scalars().first()
-        friend_friends_ids = {f.id for f in friend_obj.friends} if friend_obj else set()
-
-        mutual_friends_count = len(user_friends_ids.intersection(friend_friends_ids))
-
-        friends_out.append(
-            UserOut(
-                id=friend.id,
-                email=friend.email,
-                name=friend.name,
-                avatar_url=friend.avatar_url,
-                mutualFriends=mutual_friends_count,
-                wishlistsCount=wishlists_count,
-            )
-        )
-
-    return friends_out
+    return await _get_friends_out(db, user_id)
 
 
 async def count_mutual_friends(db: AsyncSession, user_id_1: int, user_id_2: int) -> int:
@@ -0,0 +1,135 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import func, update, tuple_
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional
+import logging
+
+from models import Wish, WishSupporter
+import services.crud.trending_crud as trending_crud
+import services.crud.user_stats_crud as user_stats_crud
+
+logger = logging.getLogger(__name__)
+
+class WishNotFound(LookupError):
+    pass
+
+
+class IdempotencyConflict(ValueError):
+    # Ключ уже использован этим пользователем для другого взноса
+    pass
+
+
+@dataclass
+class Contribution:
+    user_id: int
+    amount: Decimal
+    idempotency_key: Optional[str] = None
+
+
+@dataclass
+class ContributionResult:
+    id: int
+    wish_id: int
+    user_id: int
+    amount: Decimal
+    supported_at: datetime
+    raised: Decimal
+    replayed: bool  # повтор запроса с тем же ключом: деньги повторно не учтены
+
+
+# Применить пачку взносов в одно желание. Записи в журнал (wish_supporters)
+# вставляются одним INSERT, повторы по ключу идемпотентности пропускаются
+# (ON CONFLICT DO NOTHING), итог желания увеличивается одним атомарным
+# UPDATE ... SET raised = raised + сумма — без чтения старого значения,
+# поэтому параллельные взносы не теряются. Строка желания блокируется
+# последней, чтобы держать блокировку как можно меньше.
+# Возвращает результат или исключение для каждого взноса, в том же порядке.
+# Коммит делает вызывающий код
+async def apply_contributions(db: AsyncSession, wish_id: int,
+                              contributions: List[Contribution]) -> list:
+    exists = (await db.execute(select(Wish.id).where(Wish.id == wish_id))).scalar()
+    if exists is None:
+        return [WishNotFound(wish_id)] * len(contributions)
+
+    rows = [
+        {
+            "wish_id": wish_id,
+            "user_id": c.user_id,
+            "amount": c.amount,
+            "idempotency_key": c.idempotency_key,
+        }
+        for c in contributions
+    ]
+    stmt = (
+        insert(WishSupporter)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[WishSupporter.user_id, WishSupporter.idempotency_key])
+        .returning(WishSupporter)
+    )
+    inserted = (await db.execute(stmt)).scalars().all()
+
+    # Ключи, которых нет среди вставленных, — повторы (в т.ч. внутри пачки)
+    new_keys = {(s.user_id, s.idempotency_key) for s in inserted if s.idempotency_key is not None}
+    replay_keys = {(c.user_id, c.idempotency_key) for c in contributions
+                   if c.idempotency_key is not None and (c.user_id, c.idempotency_key) not in new_keys}
+    existing = {}
+    if replay_keys:
+        result = await db.execute(
+            select(WishSupporter).where(
+                tuple_(WishSupporter.user_id, WishSupporter.idempotency_key).in_(list(replay_keys))
+            )
+        )
+        existing = {(s.user_id, s.idempotency_key): s for s in result.scalars().all()}
+
+    total = sum((s.amount for s in inserted), Decimal(0))
+    if total:
+        raised = (await db.execute(
+            update(Wish)
+            .where(Wish.id == wish_id)
+            .values(raised=Wish.raised + total)
+            .returning(Wish.raised)
+        )).scalar_one()
+        await user_stats_crud.bump_wish_owner(db, wish_id, total_raised=total)
+        await trending_crud.record_event(db, wish_id, trending_crud.SUPPORT * len(inserted))
+    else:
+        raised = (await db.execute(select(Wish.raised).where(Wish.id == wish_id))).scalar_one()
+
+    # Сопоставляем вставленные строки взносам: RETURNING не гарантирует порядок
+    fresh = {}
+    for s in inserted:
+        fresh.setdefault((s.user_id, s.idempotency_key, s.amount), []).append(s)
+
+    by_key = {**existing, **{(s.user_id, s.idempotency_key): s for s in inserted}}
+
+    results = []
+    for c in contributions:
+        candidates = fresh.get((c.user_id, c.idempotency_key, c.amount))
+        if candidates:
+            supporter, replayed = candidates.pop(), False
+        else:
+            supporter, replayed = by_key.get((c.user_id, c.idempotency_key)), True
+            if supporter is None or supporter.wish_id != wish_id or supporter.amount != c.amount:
+                results.append(IdempotencyConflict(c.idempotency_key))
+                continue
+        results.append(ContributionResult(
+            id=supporter.id,
+            wish_id=wish_id,
+            user_id=supporter.user_id,
+            amount=supporter.amount,
+            supported_at=supporter.supported_at,
+            raised=raised,
+            replayed=replayed,
+        ))
+    return results
+
+
+# Сверка итога с журналом: расхождение означает взносы мимо журнала
+async def get_ledger_total(db: AsyncSession, wish_id: int) -> Decimal:
+    result = await db.execute(
+        select(func.coalesce(func.sum(WishSupporter.amount), 0)).where(WishSupporter.wish_id == wish_id)
+    )
+    return result.scalar_one()
@@ -1,22 +1,44 @@
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, func, false, delete, literal
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.exc import IntegrityError
-from models import Like
+from typing import Dict, Iterable, Optional, Tuple
+from models import Like, Activity, ActivityType
+import services.crud.user_stats_crud as user_stats_crud
+import services.crud.trending_crud as trending_crud
+from database import any_of
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def create_like(db: AsyncSession, user_id: int, wish_id: int) -> Like:
-    like = Like(user_id=user_id, wish_id=wish_id)
-    db.add(like)
-    try:
-        await db.commit()
-        await db.refresh(like)
-        return like
-    except IntegrityError:
-        await db.rollback()
-        logger.warning("Like already exists for user_id=%s, wish_id=%s", user_id, wish_id)
-        return None  # или выбросьте исключение, если нужно
+
+# Лайк за один запрос: INSERT ... ON CONFLICT DO NOTHING RETURNING, а счётчик
+# владельца, рейтинг желания и запись в ленту активностей — изменяющие CTE
+# того же запроса, срабатывающие только если лайк действительно вставлен.
+# Возвращает строку (id, user_id, wish_id, created_at); повторный лайк
+# (двойной тап) ничего не меняет и возвращает None.
+# Коммит делает вызывающий код
+async def create_like(db: AsyncSession, user_id: int, wish_id: int):
+    inserted = (
+        insert(Like)
+        .values(user_id=user_id, wish_id=wish_id)
+        .on_conflict_do_nothing(constraint="uq_user_wish_like")
+        .returning(Like.id, Like.user_id, Like.wish_id, Like.created_at)
+        .cte("inserted_like")
+    )
+    inserted_wish_id = select(inserted.c.wish_id).scalar_subquery()
+    stats = user_stats_crud.wish_owner_upsert(inserted_wish_id, likes_received=1).cte("like_stats")
+    trending = trending_crud.event_upsert(inserted.c.wish_id, trending_crud.LIKE).cte("like_trending")
+    activity = insert(Activity).from_select(
+        [Activity.user_id, Activity.type, Activity.target_type, Activity.target_id],
+        select(inserted.c.user_id, literal(ActivityType.like, Activity.type.type),
+               literal("wish"), inserted.c.wish_id),
+    ).cte("like_activity")
+
+    result = await db.execute(
+        select(inserted.c.id, inserted.c.user_id, inserted.c.wish_id, inserted.c.created_at)
+        .add_cte(stats, trending, activity)
+    )
+    return result.first()
 
 async def get_like(db: AsyncSession, user_id: int, wish_id: int):
     result = await db.execute(
@@ -28,14 +50,33 @@ async def get_likes_by_user(db: AsyncSession, user_id: int):
     result = await db.execute(select(Like).filter(Like.user_id == user_id))
     return result.scalars().all()
 
+# Число лайков и «лайкнул ли пользователь» для набора желаний одним запросом
+# по ix_likes_wish_id. Желаний без лайков в результате нет — у них (0, False)
+async def get_like_states(db: AsyncSession, wish_ids: Iterable[int],
+                          user_id: Optional[int]) -> Dict[int, Tuple[int, bool]]:
+    liked = func.bool_or(Like.user_id == user_id) if user_id is not None else false()
+    result = await db.execute(
+        select(Like.wish_id, func.count(), liked)
+        .where(any_of(Like.wish_id, wish_ids))
+        .group_by(Like.wish_id)
+    )
+    return {wish_id: (count, bool(is_liked)) for wish_id, count, is_liked in result.all()}
+
 async def get_likes_by_wish(db: AsyncSession, wish_id: int):
     result = await db.execute(select(Like).filter(Like.wish_id == wish_id))
     return result.scalars().all()
 
-async def delete_like(db: AsyncSession, user_id: int, wish_id: int):
-    like = await get_like(db, user_id, wish_id)
-    if like:
-        await db.delete(like)
-        await db.commit()
-        return True
-    return False
+# Снять лайк за один запрос: DELETE ... RETURNING и счётчик владельца в CTE.
+# Возвращает False, если лайка не было. Коммит делает вызывающий код
+async def delete_like(db: AsyncSession, user_id: int, wish_id: int) -> bool:
+    deleted = (
+        delete(Like)
+        .where(Like.user_id == user_id, Like.wish_id == wish_id)
+        .returning(Like.wish_id)
+        .cte("deleted_like")
+    )
+    stats = user_stats_crud.wish_owner_upsert(
+        select(deleted.c.wish_id).scalar_subquery(), likes_received=-1
+    ).cte("unlike_stats")
+    result = await db.execute(select(deleted.c.wish_id).add_cte(stats))
+    return result.first() is not None
@@ -1,10 +1,14 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
-from sqlalchemy.orm import selectinload
-from models import Notification
+from sqlalchemy import select, update, delete, func, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import joinedload
+from models import Notification, NotificationType, PENDING_REQUEST_PREDICATE, RESOLVED_PREDICATE
 from typing import List, Optional
+from datetime import datetime
 
-# Создать уведомление
+REQUEST_TYPES = (NotificationType.friend_request, NotificationType.join_request)
+
+# Создать уведомление. Коммит делает вызывающий код
 async def create_notification(
     db: AsyncSession,
     recipient_id: int,
@@ -14,17 +18,32 @@ async def create_notification(
     community_id: Optional[int] = None,
 
 ) -> Notification:
-    new_notification = Notification(
-        recipient_id=recipient_id,
-        sender_id=sender_id,
-        community_id=community_id,
-        type=type,
-        message=message,
-        is_read=False,
-    )
+    type = NotificationType(getattr(type, "value", type))
+    values = dict(recipient_id=recipient_id, sender_id=sender_id, community_id=community_id,
+                  type=type, message=message, is_read=False)
+    if type in REQUEST_TYPES and sender_id is not None:
+        # Повторная заявка от того же отправителя не создаёт дубликат: ожидающая
+        # заявка поднимается наверх списка как непрочитанная
+        stmt = (
+            insert(Notification)
+            .values(**values)
+            .on_conflict_do_update(
+                # Выражение — литералом, как в индексе: с параметром вместо 0 индекс не найдётся
+                index_elements=[Notification.recipient_id, Notification.sender_id, Notification.type,
+                                text("coalesce(community_id, 0)")],
+                index_where=text(PENDING_REQUEST_PREDICATE),
+                set_={"message": message, "is_read": False, "created_at": func.now()},
+            )
+            .returning(Notification)
+        )
+        result = await db.execute(
+            select(Notification).from_statement(stmt).execution_options(populate_existing=True)
+        )
+        return result.scalar_one()
+
+    new_notification = Notification(**values)
     db.add(new_notification)
-    await db.commit()
-    await db.refresh(new_notification)
+    await db.flush()
     return new_notification
 
 # Получить одно уведомление по id
@@ -46,7 +65,8 @@ async def get_notifications_for_user(
 ) -> List[Notification]:
     query = (
         select(Notification)
-        .options(selectinload(Notification.sender))  # Подгружаем отправителя
+        # Отправитель — в том же запросе; ответу нужен только его аватар
+        .options(joinedload(Notification.sender).lazyload("*"))
         .filter(Notification.recipient_id == user_id)
     )
     if read_filter is not None:
@@ -66,5 +86,29 @@ async def mark_notification_as_read(
         .values(is_read=True)
         .execution_options(synchronize_session="fetch")
     )
-    await db.commit()
     return result.rowcount > 0
+
+
+# Удалить пачку обработанных уведомлений типа type старше before и вернуть
+# удалённые строки (для архива). Коммит делает вызывающий код
+async def delete_resolved_batch(
+    db: AsyncSession,
+    type: NotificationType,
+    before: datetime,
+    batch_size: int,
+) -> List[dict]:
+    doomed = (
+        select(Notification.id)
+        .where(Notification.type == type, Notification.created_at < before, text(f"({RESOLVED_PREDICATE})"))
+        .order_by(Notification.created_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    columns = Notification.__table__.c
+    result = await db.execute(
+        delete(Notification)
+        .where(Notification.id.in_(doomed.scalar_subquery()))
+        .returning(*columns)
+        .execution_options(synchronize_session=False)
+    )
+    return [dict(row) for row in result.mappings()]
@@ -2,23 +2,25 @@ from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import joinedload
-from sqlalchemy import func
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import func, literal, Integer
+from sqlalchemy.dialects.postgresql import insert
 from typing import Optional
+from datetime import datetime, timedelta, timezone
 import logging
 
 from models import (User, Wish, Comment, Activity, ActivityType, Like,
                     ActivityLike, EmailVerification, friend_association)
 from schemas.user_schemas import PrivacyEnum
+from config import get_settings
 
 logger = logging.getLogger(__name__)
 
 
+# Коммит делает вызывающий код
 async def create_comment(db: AsyncSession, user_id: int, wish_id: int, content: str):
     comment = Comment(user_id=user_id, wish_id=wish_id, content=content)
     db.add(comment)
-    await db.commit()
-    await db.refresh(comment)
+    await db.flush()
     return comment
 
 
@@ -32,40 +34,30 @@ async def get_comments_by_wish(db: AsyncSession, wish_id: int):
     return result.scalars().all()
 
 
-async def create_like(db: AsyncSession, user_id: int, wish_id: int):
-    # Проверка, есть ли уже лайк
-    existing = await db.execute(select(Like)
-                                .filter(Like.user_id == user_id, Like.wish_id == wish_id))
-    if existing.scalars().first():
-        raise Exception("User already liked this wish")
-    like = Like(user_id=user_id, wish_id=wish_id)
-    db.add(like)
-    await db.commit()
-    await db.refresh(like)
-    return like
-
-
 async def get_likes_count(db: AsyncSession, wish_id: int):
     result = await db.execute(select(func.count(Like.id))
                               .filter(Like.wish_id == wish_id))
     return result.scalar_one()
 
 
+# Коммит делает вызывающий код
 async def create_activity(db: AsyncSession, user_id: int,
                           type: ActivityType, target_type: Optional[str] = None,
                           target_id: Optional[int] = None):
     activity = Activity(user_id=user_id, type=type, target_type=target_type, target_id=target_id)
     db.add(activity)
-    await db.commit()
-    await db.refresh(activity)
+    await db.flush()
     return activity
 
 
 async def get_activities(db: AsyncSession, limit: int = 20):
+    # Условие по created_at отсекает старые месячные секции activities ещё до
+    # выполнения: лента читает одну-две последние, сколько бы ни было истории
+    since = datetime.now(timezone.utc) - timedelta(days=get_settings().ACTIVITY_FEED_DAYS)
     result = await db.execute(
         select(Activity)
         .join(User, Activity.user_id == User.id)
-        .filter(User.privacy != PrivacyEnum.private)
+        .filter(Activity.created_at >= since, User.privacy != PrivacyEnum.private)
         .options(
             joinedload(Activity.user),
             joinedload(Activity.wish)  # теперь работает благодаря связи
@@ -82,37 +74,22 @@ async def like_activity(
         activity_id: int,
         user_id: int
 ):
-    # Проверяем существование активности
-    result = await db.execute(select(Activity).filter(Activity.id == activity_id))
-    activity = result.scalar_one_or_none()
-    if not activity:
-        raise HTTPException(status_code=404, detail="Activity not found")
-
-    # Проверяем, не лайкал ли пользователь уже
+    # Вставка только если активность существует; повторный лайк ничего не делает.
+    # Один запрос вместо проверок «есть ли активность» и «есть ли уже лайк».
+    # Коммит делает вызывающий код
     result = await db.execute(
-        select(ActivityLike).filter(
-            ActivityLike.user_id == user_id,
-            ActivityLike.activity_id == activity_id
+        insert(ActivityLike)
+        .from_select(
+            [ActivityLike.user_id, ActivityLike.activity_id],
+            select(literal(user_id, Integer), Activity.id).where(Activity.id == activity_id),
         )
+        .on_conflict_do_nothing(constraint="uq_user_activity_like")
+        .returning(ActivityLike.id)
     )
-    existing_like = result.scalar_one_or_none()
-    if existing_like:
-        raise HTTPException(status_code=400, detail="You have already liked this activity")
-
-    # Создаём лайк
-    new_like = ActivityLike(user_id=user_id, activity_id=activity_id)
-    db.add(new_like)
-
-    # Обновляем счетчик лайков у активности
-    if hasattr(activity, "likes_count"):
-        activity.likes_count = (activity.likes_count or 0) + 1
-
-    try:
-        await db.commit()
-    except IntegrityError:
-        await db.rollback()
-        raise HTTPException(status_code=400, detail="Failed to like activity")
-
-    return new_like
-
-
+    like_id = result.scalar_one_or_none()
+    if like_id is None:
+        # Редкий путь: отличаем повторный лайк от несуществующей активности
+        found = await db.execute(select(Activity.id).where(Activity.id == activity_id))
+        if found.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="Activity not found")
+    return like_id
@@ -0,0 +1,147 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import func, or_, and_, exists, literal, literal_column
+from typing import Optional
+import logging
+import re
+
+from models import User, Wish, Community, PrivacyEnum, friend_association
+
+logger = logging.getLogger(__name__)
+
+# Не больше стольких слов из запроса попадает в tsquery
+MAX_QUERY_TERMS = 8
+# Вклад триграммного сходства (опечатки) относительно ts_rank
+SIMILARITY_WEIGHT = 0.5
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def build_prefix_tsquery(query: str) -> Optional[str]:
+    # «зелён вел» -> «зелён:* & вел:*»: каждое слово как префикс,
+    # спецсимволы tsquery из пользовательского ввода отбрасываются
+    terms = _TERM_RE.findall(query.lower())[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def _tsquery(config: str, tsquery_text: str):
+    # Конфигурация — литерал regconfig, иначе планировщик не сопоставит
+    # выражение с параметром-строкой однозначно
+    return func.to_tsquery(literal_column(f"'{config}'::regconfig"), tsquery_text)
+
+
+def _is_friend_of(viewer_id: Optional[int], user_id_column):
+    if viewer_id is None:
+        return literal(False)
+    return exists().where(
+        friend_association.c.user_id == viewer_id,
+        friend_association.c.friend_id == user_id_column,
+    )
+
+
+def _visible_owner(viewer_id: Optional[int]):
+    # Владелец виден в поиске: public и anonymous — всем, friends — друзьям и себе, private — никому
+    conditions = [User.privacy.in_([PrivacyEnum.public, PrivacyEnum.anonymous])]
+    if viewer_id is not None:
+        conditions.append(and_(
+            User.privacy == PrivacyEnum.friends,
+            or_(User.id == viewer_id, _is_friend_of(viewer_id, User.id)),
+        ))
+    return or_(*conditions)
+
+
+async def search_wishes(db: AsyncSession, query: str, viewer_id: Optional[int], limit: int, offset: int = 0):
+    tsquery_text = build_prefix_tsquery(query)
+    if tsquery_text is None:
+        return []
+    tsquery = _tsquery("russian", tsquery_text)
+    rank = (func.ts_rank_cd(Wish.search_vector, tsquery)
+            + SIMILARITY_WEIGHT * func.word_similarity(query, Wish.title))
+    stmt = (
+        select(Wish.id, Wish.title, Wish.description, Wish.image_url, Wish.owner_id,
+               User.privacy, rank.label("rank"))
+        .join(User, Wish.owner_id == User.id)
+        .where(
+            Wish.is_public == True,  # noqa: E712
+            or_(Wish.search_vector.op("@@")(tsquery), Wish.title.op("%>")(query)),
+            _visible_owner(viewer_id),
+        )
+        .order_by(rank.desc(), Wish.id.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+    result = await db.execute(stmt)
+    return [
+        {
+            "type": "wish",
+            "id": row.id,
+            "title": row.title,
+            "description": row.description,
+            "image_url": row.image_url,
+            # Для анонимных профилей автора не раскрываем
+            "owner_id": None if row.privacy == PrivacyEnum.anonymous else row.owner_id,
+            "rank": row.rank,
+        }
+        for row in result.all()
+    ]
+
+
+async def search_users(db: AsyncSession, query: str, viewer_id: Optional[int], limit: int, offset: int = 0):
+    tsquery_text = build_prefix_tsquery(query)
+    if tsquery_text is None:
+        return []
+    tsquery = _tsquery("simple", tsquery_text)
+    rank = (func.ts_rank_cd(User.search_vector, tsquery)
+            + SIMILARITY_WEIGHT * func.word_similarity(query, User.name))
+    # Анонимные профили в поиске людей не показываем
+    visible = [User.privacy == PrivacyEnum.public]
+    if viewer_id is not None:
+        visible.append(and_(
+            User.privacy == PrivacyEnum.friends,
+            or_(User.id == viewer_id, _is_friend_of(viewer_id, User.id)),
+        ))
+    stmt = (
+        select(User.id, User.name, User.avatar_url, rank.label("rank"))
+        .where(
+            User.is_guest.is_(False),
+            or_(User.search_vector.op("@@")(tsquery), User.name.op("%>")(query)),
+            or_(*visible),
+        )
+        .order_by(rank.desc(), User.id.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+    result = await db.execute(stmt)
+    return [
+        {"type": "user", "id": row.id, "title": row.name or "", "description": None,
+         "image_url": row.avatar_url, "owner_id": None, "rank": row.rank}
+        for row in result.all()
+    ]
+
+
+async def search_communities(db: AsyncSession, query: str, limit: int, offset: int = 0):
+    tsquery_text = build_prefix_tsquery(query)
+    if tsquery_text is None:
+        return []
+    tsquery = _tsquery("russian", tsquery_text)
+    rank = (func.ts_rank_cd(Community.search_vector, tsquery)
+            + SIMILARITY_WEIGHT * func.word_similarity(query, Community.name))
+    stmt = (
+        select(Community.id, Community.name, Community.description, Community.image_url,
+               Community.category, rank.label("rank"))
+        .where(
+            Community.is_active == True,  # noqa: E712
+            or_(Community.search_vector.op("@@")(tsquery), Community.name.op("%>")(query)),
+        )
+        .order_by(rank.desc(), Community.id.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+    result = await db.execute(stmt)
+    return [
+        {"type": "community", "id": row.id, "title": row.name, "description": row.description,
+         "image_url": row.image_url, "owner_id": None, "category": row.category, "rank": row.rank}
+        for row in result.all()
+    ]
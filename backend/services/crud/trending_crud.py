@@ -0,0 +1,80 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import func, delete, literal, Float, Integer
+from typing import List, Optional, Tuple
+import logging
+import math
+import time
+
+from models import WishTrending, Wish, User, PrivacyEnum
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Веса событий
+LIKE = 1.0
+COMMENT = 2.0
+SUPPORT = 4.0
+
+# Точка отсчёта для экспоненты; менять нельзя — сохранённые рейтинги к ней привязаны
+TRENDING_EPOCH = 1735689600  # 2025-01-01 UTC
+# Рейтинги, затухшие ниже этого веса, удаляются при очистке
+PRUNE_WEIGHT = 0.001
+
+def log_time(now: Optional[float] = None) -> float:
+    # ln(2^((t - эпоха) / период полураспада)): «логарифм текущего момента»
+    growth = math.log(2) / (get_settings().TRENDING_HALF_LIFE_HOURS * 3600)
+    return ((now if now is not None else time.time()) - TRENDING_EPOCH) * growth
+
+
+def decayed_weight(score: float, now: Optional[float] = None) -> float:
+    # Текущий суммарный вес событий желания с учётом затухания
+    return math.exp(score - log_time(now))
+
+
+# Upsert рейтинга для события (лайк, комментарий, поддержка). Одна строка на желание:
+# score = ln(exp(score) + вес * 2^(...)) считается в БД без чтения старого значения.
+# wish_id — число или колонка (например, id из CTE вставленного лайка:
+# тогда строка рейтинга пишется, только если лайк действительно вставлен)
+def event_upsert(wish_id, weight: float, now: Optional[float] = None):
+    increment = math.log(weight) + log_time(now)
+    if isinstance(wish_id, int):
+        wish_id = literal(wish_id, Integer)
+    source = select(wish_id, literal(increment, Float))
+    stmt = insert(WishTrending).from_select([WishTrending.wish_id, WishTrending.score], source)
+    current, new = WishTrending.score, stmt.excluded.score
+    # log-sum-exp без переполнения: max(a, b) + ln(1 + e^-|a - b|)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[WishTrending.wish_id],
+        set_={
+            "score": func.greatest(current, new) + func.ln(1 + func.exp(-func.abs(current - new))),
+            "updated_at": func.now(),
+        },
+    )
+    return stmt
+
+
+# Учесть событие. Коммит делает вызывающий код — вместе с самим событием
+async def record_event(db: AsyncSession, wish_id: int, weight: float, now: Optional[float] = None):
+    await db.execute(event_upsert(wish_id, weight, now))
+
+
+# Верхние N публичных желаний по рейтингу (для обновления списка в памяти)
+async def get_top_wish_scores(db: AsyncSession, limit: int) -> List[Tuple[int, float]]:
+    result = await db.execute(
+        select(WishTrending.wish_id, WishTrending.score)
+        .join(Wish, Wish.id == WishTrending.wish_id)
+        .join(User, User.id == Wish.owner_id)
+        .where(Wish.is_public == True, User.privacy != PrivacyEnum.private)  # noqa: E712
+        .order_by(WishTrending.score.desc())
+        .limit(limit)
+    )
+    return [(wish_id, score) for wish_id, score in result.all()]
+
+
+async def prune_scores(db: AsyncSession, now: Optional[float] = None) -> int:
+    threshold = math.log(PRUNE_WEIGHT) + log_time(now)
+    result = await db.execute(delete(WishTrending).where(WishTrending.score < threshold))
+    await db.commit()
+    return result.rowcount
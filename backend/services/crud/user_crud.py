@@ -1,22 +1,21 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, lazyload
 from sqlalchemy import case
 from typing import Optional
 import logging
 
-import shutil
-import os
-import uuid
 from models import (User, Wish, Comment, Activity, ActivityType, Like,
                     ActivityLike, EmailVerification, friend_association)
 from services.auth import get_password_hash
+from database import any_of
+from services.other_helpers import save_upload_file
 
 logger = logging.getLogger(__name__)
 
 
 async def get_user_by_email(db: AsyncSession, email: str):
-    logger.info("start get_user_by_email")
+    logger.debug("start get_user_by_email")
 
     result = await db.execute(
         select(User)
@@ -34,8 +33,18 @@ async def get_user_by_id(db: AsyncSession, user_id: int) -> User | None:
     return result.scalars().first()
 
 
+async def get_users_by_ids(db: AsyncSession, user_ids) -> dict[int, User]:
+    # Батч-загрузка для DataLoader: один запрос на все id. Коллекции
+    # пользователей не загружаем — загрузчику нужны только поля строки
+    result = await db.execute(
+        select(User).options(lazyload("*")).where(any_of(User.id, user_ids))
+    )
+    return {user.id: user for user in result.scalars().all()}
+
+
+# id получаем flush'ем (INSERT ... RETURNING), коммит делает вызывающий код
 async def create_user(db: AsyncSession, user_create):
-    logger.info("start create_user")
+    logger.debug("start create_user")
     hashed_password = get_password_hash(user_create.password)
     db_user = User(
         email=user_create.email,
@@ -47,14 +56,34 @@ async def create_user(db: AsyncSession, user_create):
         social_facebook=str(user_create.social_facebook) if user_create.social_facebook else None,
         social_twitter=str(user_create.social_twitter) if user_create.social_twitter else None,
         social_instagram=str(user_create.social_instagram) if user_create.social_instagram else None,
+        # Пустые коллекции сразу помечены загруженными: ответу не нужен повторный SELECT
+        wishes=[],
     )
     db.add(db_user)
-    await db.commit()
-    await db.refresh(db_user)
+    await db.flush()
 
     return db_user
 
 
+async def convert_guest_user(db: AsyncSession, guest: User, user_create) -> User:
+    # Сохранённый гость становится обычным пользователем: id не меняется,
+    # поэтому всё созданное гостем остаётся за аккаунтом. Email подтверждается заново
+    logger.debug("start convert_guest_user")
+    guest.email = user_create.email
+    guest.hashed_password = get_password_hash(user_create.password)
+    guest.name = user_create.name
+    guest.avatar_url = user_create.avatar_url
+    guest.description = user_create.description
+    guest.privacy = user_create.privacy
+    guest.social_facebook = str(user_create.social_facebook) if user_create.social_facebook else None
+    guest.social_twitter = str(user_create.social_twitter) if user_create.social_twitter else None
+    guest.social_instagram = str(user_create.social_instagram) if user_create.social_instagram else None
+    guest.is_guest = False
+    guest.is_verified = False
+    await db.flush()
+    return guest
+
+
 async def update_user_profile(
         db: AsyncSession,
         user: User,
@@ -72,12 +101,7 @@ async def update_user_profile(
 ) -> User:
     avatar_url = user.avatar_url
     if avatar_file:
-        ext = avatar_file.filename.split(".")[-1]
-        filename = f"{uuid.uuid4()}.{ext}"
-        file_path = os.path.join(UPLOAD_DIR, filename)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(avatar_file.file, buffer)
+        filename = save_upload_file(avatar_file, UPLOAD_DIR, "avatar")
         avatar_url = f"/uploads/avatars/{filename}"
 
     if name is not None:
@@ -99,12 +123,7 @@ async def update_user_profile(
     user.avatar_url = avatar_url
 
     db.add(user)
-    try:
-        await db.commit()
-        await db.refresh(user)
-    except Exception:
-        await db.rollback()
-        raise
+    await db.flush()
     return user
 
 
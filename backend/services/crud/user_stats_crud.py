@@ -0,0 +1,146 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import func, text, literal
+import logging
+
+from models import UserStats, Wish
+from database import any_of
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ("wish_count", "public_wish_count", "friend_count", "total_raised",
+            "likes_received", "communities_joined")
+
+
+def _add_deltas_on_conflict(stmt, columns):
+    # INSERT ... ON CONFLICT (user_id) DO UPDATE SET c = user_stats.c + excluded.c
+    return stmt.on_conflict_do_update(
+        index_elements=[UserStats.user_id],
+        set_={
+            **{column: getattr(UserStats, column) + getattr(stmt.excluded, column) for column in columns},
+            "updated_at": func.now(),
+        },
+    )
+
+
+# Изменить счётчики пользователя на заданные величины: bump(db, user_id, wish_count=1).
+# Коммит делает вызывающий код — вместе с изменением, которое учитывается
+async def bump(db: AsyncSession, user_id: int, **deltas):
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if not deltas or user_id is None:
+        return
+    stmt = insert(UserStats).values(user_id=user_id, **deltas)
+    await db.execute(_add_deltas_on_conflict(stmt, deltas))
+
+
+# Upsert счётчиков владельца желания, без отдельного запроса за owner_id.
+# wish_id — число или SQL-выражение (например, id из CTE вставленного лайка).
+# Остальные счётчики заполняет DEFAULT базы: внутри CTE SQLAlchemy не вычисляет
+# Python-умолчания колонок и подставил бы NULL (include_defaults=False)
+def wish_owner_upsert(wish_id, **deltas):
+    columns = list(deltas)
+    source = select(Wish.owner_id, *(literal(deltas[column]) for column in columns)).where(
+        Wish.id == wish_id, Wish.owner_id.isnot(None)
+    )
+    stmt = insert(UserStats).from_select(["user_id", *columns], source, include_defaults=False)
+    return _add_deltas_on_conflict(stmt, columns)
+
+
+# Upsert одинаковых приращений для нескольких пользователей.
+# user_id — колонка с id (например, из CTE вставленных записей дружбы)
+def users_upsert(user_id, **deltas):
+    columns = list(deltas)
+    source = select(user_id, *(literal(deltas[column]) for column in columns))
+    stmt = insert(UserStats).from_select(["user_id", *columns], source, include_defaults=False)
+    return _add_deltas_on_conflict(stmt, columns)
+
+
+# То же для владельца желания
+async def bump_wish_owner(db: AsyncSession, wish_id: int, **deltas):
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    await db.execute(wish_owner_upsert(wish_id, **deltas))
+
+
+async def get_stats_by_user_ids(db: AsyncSession, user_ids) -> dict[int, UserStats]:
+    result = await db.execute(select(UserStats).where(any_of(UserStats.user_id, user_ids)))
+    return {stats.user_id: stats for stats in result.scalars().all()}
+
+
+# Пересчёт по исходным таблицам для диапазона id пользователей.
+# Исправляет расхождения (ручные правки в БД, пути записи без счётчиков, каскадные удаления).
+# Поправка применяется как приращение: расчёт и текущие user_stats читаются из
+# одного снимка, и к актуальной строке прибавляется их разница. Взносы, лайки и
+# прочие изменения, закоммиченные после начала запроса, уже учтены в строке
+# своими приращениями и не затираются. Строки без расхождений не трогаются
+RECONCILE_SQL = text("""
+    WITH computed AS (
+        SELECT u.id AS user_id,
+               coalesce(w.wish_count, 0) AS wish_count,
+               coalesce(w.public_wish_count, 0) AS public_wish_count,
+               coalesce(f.friend_count, 0) AS friend_count,
+               coalesce(w.total_raised, 0) AS total_raised,
+               coalesce(l.likes_received, 0) AS likes_received,
+               coalesce(m.communities_joined, 0) AS communities_joined
+        FROM users u
+        LEFT JOIN (
+            SELECT owner_id, count(*) AS wish_count, count(*) FILTER (WHERE is_public) AS public_wish_count,
+                   sum(coalesce(raised, 0)) AS total_raised
+            FROM wishes WHERE owner_id BETWEEN :first_id AND :last_id GROUP BY owner_id
+        ) w ON w.owner_id = u.id
+        LEFT JOIN (
+            SELECT user_id, count(*) AS friend_count
+            FROM friend_association WHERE user_id BETWEEN :first_id AND :last_id GROUP BY user_id
+        ) f ON f.user_id = u.id
+        LEFT JOIN (
+            SELECT w.owner_id, count(*) AS likes_received
+            FROM likes JOIN wishes w ON w.id = likes.wish_id
+            WHERE w.owner_id BETWEEN :first_id AND :last_id GROUP BY w.owner_id
+        ) l ON l.owner_id = u.id
+        LEFT JOIN (
+            SELECT user_id, count(DISTINCT community_id) AS communities_joined
+            FROM community_members WHERE user_id BETWEEN :first_id AND :last_id GROUP BY user_id
+        ) m ON m.user_id = u.id
+        WHERE u.id BETWEEN :first_id AND :last_id
+    ),
+    drift AS (
+        SELECT c.user_id,
+               c.wish_count - coalesce(s.wish_count, 0) AS wish_count,
+               c.public_wish_count - coalesce(s.public_wish_count, 0) AS public_wish_count,
+               c.friend_count - coalesce(s.friend_count, 0) AS friend_count,
+               c.total_raised - coalesce(s.total_raised, 0) AS total_raised,
+               c.likes_received - coalesce(s.likes_received, 0) AS likes_received,
+               c.communities_joined - coalesce(s.communities_joined, 0) AS communities_joined
+        FROM computed c
+        LEFT JOIN user_stats s ON s.user_id = c.user_id
+    )
+    INSERT INTO user_stats (user_id, wish_count, public_wish_count, friend_count, total_raised,
+                            likes_received, communities_joined, updated_at)
+    SELECT user_id, wish_count, public_wish_count, friend_count, total_raised,
+           likes_received, communities_joined, now()
+    FROM drift
+    WHERE (wish_count, public_wish_count, friend_count, total_raised, likes_received, communities_joined)
+          IS DISTINCT FROM (0, 0, 0, 0, 0, 0)
+    ON CONFLICT (user_id) DO UPDATE SET
+        wish_count = user_stats.wish_count + excluded.wish_count,
+        public_wish_count = user_stats.public_wish_count + excluded.public_wish_count,
+        friend_count = user_stats.friend_count + excluded.friend_count,
+        total_raised = user_stats.total_raised + excluded.total_raised,
+        likes_received = user_stats.likes_received + excluded.likes_received,
+        communities_joined = user_stats.communities_joined + excluded.communities_joined,
+        updated_at = excluded.updated_at
+""")
+
+
+async def reconcile_range(db: AsyncSession, first_id: int, last_id: int) -> int:
+    # Возвращает число исправленных (или созданных) строк
+    result = await db.execute(RECONCILE_SQL, {"first_id": first_id, "last_id": last_id})
+    await db.commit()
+    return result.rowcount
+
+
+async def get_max_user_id(db: AsyncSession) -> int:
+    result = await db.execute(text("SELECT coalesce(max(id), 0) FROM users"))
+    return result.scalar_one()
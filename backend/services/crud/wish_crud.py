@@ -1,17 +1,22 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
+from sqlalchemy import func, tuple_
+from datetime import datetime
+from typing import List, Optional, Tuple
 import logging
 
-from models import (User, Wish, Comment, Activity, ActivityType, Like,
-                    ActivityLike, EmailVerification, friend_association)
+from models import (User, Wish, WishSupporter, Comment, Activity, ActivityType, Like,
+                    ActivityLike, EmailVerification, friend_association, format_time_left)
 from schemas.wish_schemas import WishCreate, WishUpdate
+from database import any_of
+import services.crud.user_stats_crud as user_stats_crud
 
 logger = logging.getLogger(__name__)
 
 
-
-
+# Функции записи только выполняют flush (INSERT/UPDATE ... RETURNING),
+# коммит делает роутер — одна транзакция на запрос
 async def create_wish(db: AsyncSession, wish_create: WishCreate, owner: User):
     is_influencer_public = False
     if owner.is_influencer and wish_create.is_public:
@@ -27,8 +32,8 @@ async def create_wish(db: AsyncSession, wish_create: WishCreate, owner: User):
         is_influencer_public=is_influencer_public,
     )
     db.add(db_wish)
-    await db.commit()
-    await db.refresh(db_wish)
+    await db.flush()
+    await user_stats_crud.bump(db, owner.id, wish_count=1, public_wish_count=int(bool(wish_create.is_public)))
     return db_wish
 
 
@@ -46,31 +51,68 @@ async def get_wish_by_id(db: AsyncSession, wish_id: int):
     return result.scalars().first()
 
 
+async def get_wishes_by_ids(db: AsyncSession, wish_ids) -> dict[int, Wish]:
+    result = await db.execute(select(Wish).where(any_of(Wish.id, wish_ids)))
+    return {wish.id: wish for wish in result.scalars().all()}
+
+
+async def count_wishes_by_owner_ids(db: AsyncSession, owner_ids) -> dict[int, int]:
+    # Количество желаний сразу для нескольких владельцев (GROUP BY вместо N запросов)
+    result = await db.execute(
+        select(Wish.owner_id, func.count(Wish.id))
+        .where(any_of(Wish.owner_id, owner_ids))
+        .group_by(Wish.owner_id)
+    )
+    return {owner_id: count for owner_id, count in result.all()}
+
+
 async def delete_wish(db: AsyncSession, wish: Wish):
     await db.delete(wish)
-    await db.commit()
+    # likes_received по лайкам удалённого желания поправит периодическая сверка
+    await user_stats_crud.bump(db, wish.owner_id, wish_count=-1, public_wish_count=-int(bool(wish.is_public)),
+                               total_raised=-(wish.raised or 0))
 
 
-async def get_influencer_wishes(db: AsyncSession, public=True, influencer=True):
-    query = (
-        select(Wish)
-        .options(selectinload(Wish.owner), selectinload(Wish.supporters))
-        .where(Wish.is_public == public, Wish.is_influencer_public == influencer)
-    )
-    result = await db.execute(query)
-    wishes = result.scalars().all()
+# Длина описания в карточке карусели; полный текст — на странице желания
+INFLUENCER_DESCRIPTION_LENGTH = 200
 
-    enriched_wishes = []
-    for wish in wishes:
-        supporters_count = len(wish.supporters) if wish.supporters else 0
 
-        enriched_wishes.append({
-            **wish.__dict__,
-            "supporters": supporters_count,
-            "time_left": wish.time_left,
-        })
+# Публичные желания блогеров для карусели на главной: один запрос
+# с владельцем, числом поддержавших и датой окончания, новые сверху.
+# Keyset-пагинация: after — (created_at, id) последней карточки предыдущей страницы
+async def get_influencer_wishes(db: AsyncSession, limit: int = 12, category: Optional[str] = None,
+                                after: Optional[Tuple[datetime, int]] = None) -> List[dict]:
+    supporters = (
+        select(func.count(WishSupporter.user_id.distinct()))
+        .where(WishSupporter.wish_id == Wish.id)
+        .scalar_subquery()
+    )
+    ends_at = Wish.created_at + func.make_interval(0, 0, 0, func.coalesce(Wish.duration_days, 30))
+    query = (
+        select(
+            Wish.id, Wish.title,
+            func.left(Wish.description, INFLUENCER_DESCRIPTION_LENGTH).label("description"),
+            Wish.image_url, Wish.goal, Wish.raised, Wish.category, Wish.created_at,
+            ends_at.label("ends_at"),
+            supporters.label("supporters"),
+            User.id.label("owner_id"), User.name.label("owner_name"),
+            User.avatar_url.label("owner_avatar_url"),
+        )
+        .join(User, User.id == Wish.owner_id)
+        .where(Wish.is_public == True, Wish.is_influencer_public == True)  # noqa: E712
+        .order_by(Wish.created_at.desc(), Wish.id.desc())
+        .limit(limit)
+    )
+    if category:
+        query = query.where(Wish.category == category)
+    if after:
+        query = query.where(tuple_(Wish.created_at, Wish.id) < tuple_(*after))
 
-    return enriched_wishes
+    result = await db.execute(query)
+    return [
+        {**row, "time_left": format_time_left(row["ends_at"])}
+        for row in result.mappings().all()
+    ]
 
 
 async def update_wish(db: AsyncSession, db_wish: Wish, wish_update: WishUpdate):
@@ -80,10 +122,12 @@ async def update_wish(db: AsyncSession, db_wish: Wish, wish_update: WishUpdate):
     if 'image_url' in update_data and update_data['image_url'] is not None:
         update_data['image_url'] = str(update_data['image_url'])
 
+    was_public = bool(db_wish.is_public)
     for key, value in update_data.items():
         setattr(db_wish, key, value)
 
+    if bool(db_wish.is_public) != was_public:
+        await user_stats_crud.bump(db, db_wish.owner_id, public_wish_count=1 if db_wish.is_public else -1)
     db.add(db_wish)
-    await db.commit()
-    await db.refresh(db_wish)
+    await db.flush()
     return db_wish
@@ -0,0 +1,120 @@
+import asyncio
+from functools import partial
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db
+from services.metrics import CACHE_REQUESTS
+import services.crud.user_crud as user_crud
+import services.crud.wish_crud as wish_crud
+import services.crud.friend_crud as friend_crud
+import services.crud.community_crud as community_crud
+import services.crud.user_stats_crud as user_stats_crud
+
+_CACHE_HITS = CACHE_REQUESTS.labels("dataloader", "hit")
+_CACHE_MISSES = CACHE_REQUESTS.labels("dataloader", "miss")
+
+
+class DataLoader:
+    """
+    Собирает все load(key), вызванные в пределах одного шага event loop,
+    и выполняет их одним батч-запросом. Результаты кешируются на время запроса.
+
+    batch_load_fn(keys) должна вернуть dict {key: value}; для отсутствующих
+    ключей возвращается default.
+    """
+
+    def __init__(self, batch_load_fn, lock: asyncio.Lock, default=None):
+        self._batch_load_fn = batch_load_fn
+        self._lock = lock
+        self._default = default
+        self._cache: dict = {}
+        self._queue: list = []
+        self._tasks: set = set()
+
+    def load(self, key) -> asyncio.Future:
+        future = self._cache.get(key)
+        if future is not None:
+            _CACHE_HITS.inc()
+            return future
+        _CACHE_MISSES.inc()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._cache[key] = future
+        if not self._queue:
+            # Отправляем батч после того, как остальные корутины этого шага
+            # успеют добавить свои ключи
+            loop.call_soon(self._dispatch)
+        self._queue.append((key, future))
+        return future
+
+    async def load_many(self, keys) -> list:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def prime(self, key, value):
+        if key not in self._cache:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(value)
+            self._cache[key] = future
+
+    def clear(self, key):
+        self._cache.pop(key, None)
+
+    def _dispatch(self):
+        queue, self._queue = self._queue, []
+        task = asyncio.ensure_future(self._run_batch(queue))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, queue):
+        keys = list(dict.fromkeys(key for key, _ in queue))
+        try:
+            # AsyncSession не допускает параллельных запросов,
+            # поэтому батчи разных загрузчиков одного запроса идут по очереди
+            async with self._lock:
+                values = await self._batch_load_fn(keys)
+        except Exception as e:
+            for key, future in queue:
+                self._cache.pop(key, None)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for key, future in queue:
+            if not future.done():
+                future.set_result(values.get(key, self._default))
+
+
+class Loaders:
+    """Набор загрузчиков, живущий в рамках одного HTTP-запроса."""
+
+    def __init__(self, db: AsyncSession):
+        lock = asyncio.Lock()
+        self.users = DataLoader(partial(user_crud.get_users_by_ids, db), lock)
+        self.wishes = DataLoader(partial(wish_crud.get_wishes_by_ids, db), lock)
+        self.user_stats = DataLoader(partial(user_stats_crud.get_stats_by_user_ids, db), lock)
+        self.friend_ids = DataLoader(partial(friend_crud.get_friend_ids_by_user_ids, db), lock, default=frozenset())
+        self.communities = DataLoader(partial(community_crud.get_communities_by_ids, db), lock)
+
+    def load(self, user_id: int):
+        return self.users.load(user_id)
+
+    def load_wish(self, wish_id: int):
+        return self.wishes.load(wish_id)
+
+    def load_stats(self, user_id: int):
+        return self.user_stats.load(user_id)
+
+    def load_friend_ids(self, user_id: int):
+        return self.friend_ids.load(user_id)
+
+    def load_community(self, community_id: int):
+        return self.communities.load(community_id)
+
+
+async def get_loaders(db: AsyncSession = Depends(get_db)) -> Loaders:
+    # get_db кешируется FastAPI в пределах запроса,
+    # так что загрузчики работают в той же сессии, что и обработчик
+    return Loaders(db)
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import ssl
+import time
+from email.message import EmailMessage
+from typing import Optional
+
+import aiosmtplib
+import certifi
+
+import services.crud.email_crud as email_crud
+from models import EmailOutbox
+from services.metrics import EMAIL_SEND_LATENCY
+
+logger = logging.getLogger(__name__)
+
+_SEND_OK = EMAIL_SEND_LATENCY.labels("ok")
+_SEND_ERROR = EMAIL_SEND_LATENCY.labels("error")
+
+
+class SmtpPool:
+    """
+    Пул долгоживущих SMTP-соединений. TLS-контекст создаётся один раз,
+    соединение открывается при первой отправке и переиспользуется;
+    после простоя проверяется командой NOOP, при ошибке — пересоздаётся.
+    """
+
+    def __init__(self, hostname: str, port: int, username: str = "", password: str = "",
+                 start_tls: bool = True, size: int = 2, timeout: float = 30,
+                 idle_check_seconds: float = 60):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.timeout = timeout
+        self.idle_check_seconds = idle_check_seconds
+        self._tls_context = ssl.create_default_context(cafile=certifi.where()) if start_tls else None
+        # Слоты пула: (соединение или None, время последнего использования)
+        self._slots: asyncio.LifoQueue = asyncio.LifoQueue()
+        for _ in range(size):
+            self._slots.put_nowait((None, 0.0))
+        self.size = size
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            start_tls=self.start_tls,
+            tls_context=self._tls_context,
+            timeout=self.timeout,
+        )
+        await smtp.connect()
+        if self.username:
+            await smtp.login(self.username, self.password)
+        return smtp
+
+    async def _ensure_alive(self, smtp: Optional[aiosmtplib.SMTP], last_used: float) -> aiosmtplib.SMTP:
+        if smtp is not None and smtp.is_connected:
+            if time.monotonic() - last_used < self.idle_check_seconds:
+                return smtp
+            try:
+                await smtp.noop()
+                return smtp
+            except aiosmtplib.SMTPException:
+                smtp.close()
+        return await self._connect()
+
+    async def send(self, message: EmailMessage):
+        smtp, last_used = await self._slots.get()
+        start = time.perf_counter()
+        try:
+            smtp = await self._ensure_alive(smtp, last_used)
+            await smtp.send_message(message)
+        except Exception:
+            _SEND_ERROR.observe(time.perf_counter() - start)
+            if smtp is not None:
+                smtp.close()
+            self._slots.put_nowait((None, 0.0))
+            raise
+        _SEND_OK.observe(time.perf_counter() - start)
+        self._slots.put_nowait((smtp, time.monotonic()))
+
+    async def close(self):
+        while not self._slots.empty():
+            smtp, _ = self._slots.get_nowait()
+            if smtp is not None and smtp.is_connected:
+                try:
+                    await smtp.quit()
+                except aiosmtplib.SMTPException:
+                    smtp.close()
+
+
+def build_message(email: EmailOutbox, sender: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = email.to_email
+    message["Subject"] = email.subject
+    message.set_content(email.body_text)
+    if email.body_html:
+        message.add_alternative(email.body_html, subtype="html")
+    return message
+
+
+class EmailOutboxWorker:
+    """
+    Фоновая отправка писем из таблицы email_outbox.
+
+    Берёт пачку писем в аренду короткой транзакцией, отправляет их через
+    SmtpPool с параллельностью, равной размеру пула, и второй короткой
+    транзакцией фиксирует результат. Пока идёт отправка, соединение с БД
+    не занято и строки не заблокированы. Неудачные отправки повторяются
+    с экспоненциальной задержкой.
+    """
+
+    def __init__(self, session_factory, smtp_pool: SmtpPool, sender: str,
+                 batch_size: int = 20, poll_interval: float = 5, max_attempts: int = 6,
+                 lease_seconds: float = 600):
+        self.session_factory = session_factory
+        self.smtp_pool = smtp_pool
+        self.sender = sender
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="email-outbox")
+
+    def notify(self):
+        # Вызывается после коммита нового письма, чтобы не ждать очередного опроса
+        self._wakeup.set()
+
+    async def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+        await self.smtp_pool.close()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                processed = await self.process_batch()
+            except Exception as e:
+                logger.error("Email outbox batch failed: %s", e)
+                processed = 0
+            if processed >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def process_batch(self) -> int:
+        async with self.session_factory() as db:
+            emails = await email_crud.claim_pending_emails(db, self.batch_size, self.lease_seconds)
+            # Коммит возвращает соединение в пул до начала отправки
+            await db.commit()
+            if not emails:
+                return 0
+
+            results = await asyncio.gather(
+                *(self.smtp_pool.send(build_message(email, self.sender)) for email in emails),
+                return_exceptions=True,
+            )
+            for email, result in zip(emails, results):
+                if isinstance(result, BaseException):
+                    logger.warning("Failed to send email %s: %s", email.id, result)
+                    email_crud.mark_email_failed(email, str(result), self.max_attempts)
+                else:
+                    email_crud.mark_email_sent(email)
+            await db.commit()
+            return len(emails)
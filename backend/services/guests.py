@@ -0,0 +1,33 @@
+import logging
+
+from sqlalchemy import text
+
+import services.crud.auth_crud as auth_crud
+
+logger = logging.getLogger(__name__)
+
+
+async def purge_guests(engine, session_factory, batch_size: int = 1000, reindex: bool = False) -> int:
+    """
+    Удаляет накопившихся гостей прежней схемы пачками, каждая — отдельной
+    транзакцией (короткие блокировки, без одной огромной транзакции).
+    reindex — затем перестроить индексы users без блокировки записи и
+    обновить статистику, чтобы таблица и индексы действительно уменьшились.
+    Возвращает число удалённых пользователей.
+    """
+    deleted, after_id = 0, 0
+    async with session_factory() as db:
+        while after_id is not None:
+            count, after_id = await auth_crud.delete_guest_batch(db, after_id, batch_size)
+            await db.commit()
+            deleted += count
+            if count:
+                logger.info("Purged %s guest users (%s total)", count, deleted)
+
+    if reindex:
+        # REINDEX CONCURRENTLY и VACUUM нельзя выполнять внутри транзакции
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("REINDEX TABLE CONCURRENTLY users"))
+            await conn.execute(text("VACUUM (ANALYZE) users"))
+    return deleted
@@ -0,0 +1,77 @@
+import asyncio
+from typing import Optional
+
+import httpx
+from fastapi import Request
+
+OAUTH_PROVIDERS = ("google", "facebook", "vk")
+
+
+class ProviderClient:
+    """Обёртка над общим AsyncClient с ограничением параллельных запросов к провайдеру."""
+
+    def __init__(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore):
+        self._client = client
+        self._semaphore = semaphore
+
+    async def get(self, url, **kwargs) -> httpx.Response:
+        async with self._semaphore:
+            return await self._client.get(url, **kwargs)
+
+    async def post(self, url, **kwargs) -> httpx.Response:
+        async with self._semaphore:
+            return await self._client.post(url, **kwargs)
+
+
+class OAuthHttpClients:
+    """
+    Один AsyncClient на процесс: пул соединений и keep-alive к Google, Facebook и VK
+    вместо нового TCP+TLS-соединения на каждый вход через соцсеть.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, concurrency_per_provider: int):
+        self._client = client
+        self._providers = {
+            name: ProviderClient(client, asyncio.Semaphore(concurrency_per_provider))
+            for name in OAUTH_PROVIDERS
+        }
+
+    @classmethod
+    def create(cls, timeout: float = 10, max_connections: int = 100,
+               max_keepalive_connections: int = 20, concurrency_per_provider: int = 20,
+               transport: Optional[httpx.AsyncBaseTransport] = None) -> "OAuthHttpClients":
+        # transport позволяет подменить сеть в тестах (httpx.MockTransport
+        # или ASGITransport локального мок-провайдера)
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 5)),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=60,
+            ),
+            transport=transport,
+        )
+        return cls(client, concurrency_per_provider)
+
+    def provider(self, name: str) -> ProviderClient:
+        return self._providers[name]
+
+    @property
+    def google(self) -> ProviderClient:
+        return self._providers["google"]
+
+    @property
+    def facebook(self) -> ProviderClient:
+        return self._providers["facebook"]
+
+    @property
+    def vk(self) -> ProviderClient:
+        return self._providers["vk"]
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+def get_oauth_clients(request: Request) -> OAuthHttpClients:
+    # Зависимость FastAPI; в тестах переопределяется через app.dependency_overrides
+    return request.app.state.oauth_http
@@ -0,0 +1,75 @@
+import logging
+from functools import partial
+
+from services.activity_archive import maintain_partitions
+from services.guests import purge_guests
+from services.notification_retention import parse_retention, purge_notifications
+from services.scheduler import CronTrigger, IntervalTrigger, Scheduler
+from services.trending import TrendingIndex, prune_trending, refresh_trending
+from services.user_stats import reconcile_all
+from services.verification import purge_expired_verifications
+
+logger = logging.getLogger(__name__)
+
+
+async def _reconcile_user_stats(engine, session_factory):
+    fixed = await reconcile_all(engine, session_factory)
+    if fixed:
+        logger.warning("User stats reconciliation corrected %s rows", fixed)
+
+
+async def _purge_notifications(session_factory, retention, settings):
+    deleted = await purge_notifications(
+        session_factory,
+        retention,
+        batch_size=settings.NOTIFICATION_PURGE_BATCH,
+        archive_dir=settings.NOTIFICATION_ARCHIVE_DIR or None,
+    )
+    if deleted:
+        logger.info("Purged %s resolved notifications", deleted)
+
+
+async def _purge_verifications(session_factory, batch_size: int):
+    deleted = await purge_expired_verifications(session_factory, batch_size)
+    if deleted:
+        logger.info("Purged %s expired email verification codes", deleted)
+
+
+def create_scheduler(settings, engine, session_factory, trending: TrendingIndex) -> Scheduler:
+    """Задачи обслуживания приложения; запуск и остановка — в lifespan."""
+    scheduler = Scheduler(engine)
+
+    def maintenance(name, func, trigger):
+        # Задача одного процесса. Джиттер не больше десятой части периода
+        jitter = settings.SCHEDULER_JITTER_SECONDS
+        if isinstance(trigger, IntervalTrigger):
+            jitter = min(jitter, trigger.seconds / 10)
+        if settings.SCHEDULER_LEADER_JOBS:
+            scheduler.add_job(name, func, trigger, jitter=jitter)
+
+    # Кеш в памяти — в каждом воркере, первый раз сразу при старте
+    scheduler.add_job(
+        "trending-refresh",
+        partial(refresh_trending, session_factory, trending, settings.TRENDING_SIZE),
+        IntervalTrigger(settings.TRENDING_REFRESH_SECONDS, immediate=True),
+        leader=False,
+    )
+
+    maintenance("trending-prune", partial(prune_trending, session_factory),
+                IntervalTrigger(settings.TRENDING_PRUNE_SECONDS))
+    maintenance("user-stats-reconcile", partial(_reconcile_user_stats, engine, session_factory),
+                IntervalTrigger(settings.USER_STATS_RECONCILE_SECONDS))
+    maintenance("verification-purge",
+                partial(_purge_verifications, session_factory, settings.EMAIL_VERIFICATION_PURGE_BATCH),
+                IntervalTrigger(settings.EMAIL_VERIFICATION_PURGE_SECONDS))
+    # Ошибка в NOTIFICATION_RETENTION_DAYS видна при старте, а не раз в час в логе
+    retention = parse_retention(settings.NOTIFICATION_RETENTION_DAYS)
+    maintenance("notification-retention", partial(_purge_notifications, session_factory, retention, settings),
+                IntervalTrigger(settings.NOTIFICATION_RETENTION_SECONDS))
+    maintenance("activity-partitions",
+                partial(maintain_partitions, engine, settings.ACTIVITY_ARCHIVE_DIR,
+                        settings.ACTIVITY_RETENTION_MONTHS, settings.ACTIVITY_PARTITIONS_AHEAD),
+                CronTrigger(settings.ACTIVITY_PARTITIONS_CRON))
+    maintenance("guest-purge", partial(purge_guests, engine, session_factory),
+                CronTrigger(settings.GUEST_PURGE_CRON))
+    return scheduler
@@ -0,0 +1,194 @@
+import atexit
+import copy
+import json
+import logging
+import logging.config
+import os
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from config import LOGGING_CONFIG
+from services.metrics import LOG_RECORDS_DROPPED
+
+# Логирование без записи в stdout на event loop.
+#
+# Обработчик логгеров только кладёт запись в ограниченную очередь; в поток
+# вывода пишет отдельный поток QueueListener. Если вывод не успевает
+# (stdout упёрся в pipe контейнера), очередь заполняется и новые записи
+# отбрасываются со счётчиком log_records_dropped_total — запросы не ждут.
+# Горячие логгеры можно проредить: LOG_SAMPLING="uvicorn.access=0.1".
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Атрибуты LogRecord; остальные поля записи пришли из extra= и попадают в JSON.
+# color_message — копия сообщения с ANSI-цветами, которую добавляет uvicorn
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "color_message",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "pid": record.process,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def parse_sampling(spec: str) -> dict[str, float]:
+    # "uvicorn.access=0.1,services.crud=0" -> {"uvicorn.access": 0.1, "services.crud": 0.0}
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Прореживание записей ниже WARNING: при rates={"uvicorn.access": 0.1}
+    проходит каждая десятая запись uvicorn.access и его потомков, при 0 —
+    ни одной. Предупреждения и ошибки проходят всегда.
+    """
+
+    def __init__(self, rates: Optional[dict] = None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        # Имя логгера -> шаг (1 — всё, 0 — ничего) и номер очередной записи
+        self._steps: dict[str, int] = {}
+        self._counters: dict[str, int] = {}
+
+    def _step(self, name: str) -> int:
+        step = self._steps.get(name)
+        if step is None:
+            # Ближайший настроенный предок: самый длинный совпавший префикс
+            matches = [prefix for prefix in self.rates if name == prefix or name.startswith(prefix + ".")]
+            rate = self.rates[max(matches, key=len)] if matches else 1.0
+            step = self._steps[name] = 0 if rate <= 0 else max(1, round(1 / rate))
+        return step
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        step = self._step(record.name)
+        if step == 1:
+            return True
+        if step:
+            number = self._counters.get(record.name, 0)
+            self._counters[record.name] = number + 1
+            if number % step == 0:
+                return True
+        LOG_RECORDS_DROPPED.labels("sampled").inc()
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels("queue_full").inc()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение и трейсбек фиксируются в вызывающем потоке: аргументы могут
+        # измениться до записи, а exc_info держит кадры стека живыми. В отличие
+        # от QueueHandler.prepare трейсбек остаётся отдельным полем (exc_text)
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = record.exc_text or _traceback_formatter.formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class _DrainingQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # put_nowait базового класса падает на полной очереди; ждём, пока поток её разберёт
+        self.queue.put(self._sentinel)
+
+
+_traceback_formatter = logging.Formatter()
+_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def queue_handler(stream=None, fmt: str = "json", queue_size: int = 10000) -> logging.Handler:
+    # Фабрика обработчика "queue" из LOGGING_CONFIG
+    global _handler, _listener
+    sink = logging.StreamHandler(stream or sys.stdout)
+    sink.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    _handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+    _listener = _DrainingQueueListener(_handler.queue, sink)
+    _listener.start()
+    return _handler
+
+
+def configure(settings, **handler_options):
+    """
+    Настройка логирования процесса по LOGGING_CONFIG и настройкам LOG_*.
+    handler_options переопределяют параметры обработчика (например, stream).
+    Повторный вызов дописывает прежнюю очередь и заменяет её новой.
+    """
+    config = copy.deepcopy(LOGGING_CONFIG)
+    config["handlers"]["queue"].update(fmt=settings.LOG_FORMAT, queue_size=settings.LOG_QUEUE_SIZE,
+                                       **handler_options)
+    config["filters"]["sampling"]["rates"] = parse_sampling(settings.LOG_SAMPLING)
+    config["root"]["level"] = settings.LOG_LEVEL
+    stop()
+    logging.config.dictConfig(config)
+
+
+def attach(*names: str, level: int = logging.INFO):
+    # Вернуть логгеры в очередь, если их обработчики заменил кто-то другой
+    # (uvicorn_worker ставит uvicorn.* синхронные обработчики gunicorn)
+    if _handler is None:
+        return
+    for name in names:
+        logger = logging.getLogger(name)
+        logger.handlers = [_handler]
+        logger.setLevel(level)
+        logger.propagate = False
+
+
+def stop():
+    # Дописать накопленные записи и остановить поток вывода
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_in_child():
+    # После fork (воркеры gunicorn при preload_app) потока вывода в дочернем
+    # процессе нет, а в очереди могут лежать записи родителя — новая очередь и поток
+    global _listener
+    if _handler is None or _listener is None:
+        return
+    _handler.queue = queue.Queue(_handler.queue.maxsize)
+    _listener = _DrainingQueueListener(_handler.queue, *_listener.handlers)
+    _listener.start()
+
+
+atexit.register(stop)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_in_child)
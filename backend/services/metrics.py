@@ -0,0 +1,278 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Optional
+
+# Метрики в формате Prometheus без внешних зависимостей.
+#
+# Все обновления происходят в потоке event loop, поэтому счётчики обходятся
+# без блокировок. Дочерние метрики для набора меток создаются один раз и
+# кешируются: на горячем пути остаются только поиск в dict и сложение.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values) -> str:
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in self._children.items():
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._children[()].inc(amount)
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        # Значение, вычисляемое в момент сбора (например, состояние пула соединений)
+        self._function = function
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0):
+        self._children[()].inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._children[()].dec(amount)
+
+    def set(self, value: float):
+        self._children[()].set(value)
+
+    def render(self) -> list[str]:
+        if self._function is not None:
+            try:
+                self._children[()].set(self._function())
+            except Exception:
+                pass
+        return super().render()
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "count")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labelnames, values):
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.upper_bounds + (float("inf"),), self.counts):
+            cumulative += bucket_count
+            labels = _format_labels(labelnames + ("le",), values + (_format_value(bound),))
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, values)
+        lines.append(f"{name}_sum{labels} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{labels} {self.count}")
+        return lines
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: list[Callable[[], list[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], list[str]]):
+        # Функция, возвращающая готовые строки в текстовом формате Prometheus.
+        # Повторная регистрация (несколько вызовов create_app) ничего не добавляет
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")))
+HTTP_RESPONSE_BYTES = REGISTRY.register(Counter(
+    "http_response_bytes_total", "HTTP response body bytes", ("method", "route")))
+HTTP_IN_PROGRESS = REGISTRY.register(Gauge(
+    "http_requests_in_progress", "HTTP requests currently being handled"))
+
+DB_POOL_CHECKOUT = REGISTRY.register(Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled DB connection",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)))
+
+UPLOAD_BYTES = REGISTRY.register(Counter(
+    "upload_bytes_total", "Bytes of uploaded files written to disk", ("kind",)))
+
+EMAIL_SEND_LATENCY = REGISTRY.register(Histogram(
+    "email_send_duration_seconds", "SMTP send latency", ("result",)))
+
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit/miss)", ("cache", "result")))
+
+RATE_LIMITED = REGISTRY.register(Counter(
+    "rate_limited_total", "Requests rejected with 429 by rate limit policy", ("policy",)))
+
+LOG_RECORDS_DROPPED = REGISTRY.register(Counter(
+    "log_records_dropped_total", "Log records not written (sampled out or queue full)", ("reason",)))
+
+SCHEDULER_JOB_RUNS = REGISTRY.register(Counter(
+    "scheduler_job_runs_total", "Scheduled job runs by result (ok/error/skipped/not_leader/done)", ("job", "result")))
+SCHEDULER_JOB_DURATION = REGISTRY.register(Histogram(
+    "scheduler_job_duration_seconds", "Scheduled job run time", ("job",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)))
+SCHEDULER_JOB_LAST_SUCCESS = REGISTRY.register(Gauge(
+    "scheduler_job_last_success_timestamp_seconds", "Unix time of the last successful run", ("job",)))
+
+
+def register_pool_metrics(engine):
+    pool = engine.pool
+    REGISTRY.register(Gauge("db_pool_size", "Configured DB pool size", function=pool.size))
+    REGISTRY.register(Gauge("db_pool_checked_out", "DB connections in use", function=pool.checkedout))
+    REGISTRY.register(Gauge("db_pool_overflow", "DB connections over pool size", function=pool.overflow))
+
+
+class MetricsMiddleware:
+    """ASGI middleware: латентность, количество запросов и объём ответов по маршрутам."""
+
+    def __init__(self, app):
+        self.app = app
+        # (method, route, status) -> (requests child, latency child, bytes child)
+        self._children: dict = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+        body_bytes = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, body_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                body_bytes += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_PROGRESS.dec()
+            route = scope.get("route")
+            key = (scope["method"], route.path if route is not None else "unmatched", status_code)
+            children = self._children.get(key)
+            if children is None:
+                children = self._children[key] = (
+                    HTTP_REQUESTS.labels(key[0], key[1], str(status_code)),
+                    HTTP_LATENCY.labels(key[0], key[1]),
+                    HTTP_RESPONSE_BYTES.labels(key[0], key[1]),
+                )
+            requests_child, latency_child, bytes_child = children
+            requests_child.inc()
+            latency_child.observe(time.perf_counter() - start)
+            bytes_child.inc(body_bytes)
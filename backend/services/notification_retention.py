@@ -0,0 +1,63 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import services.crud.notification_crud as notification_crud
+from models import NotificationType
+
+logger = logging.getLogger(__name__)
+
+# Срок хранения обработанных уведомлений: принятые, отклонённые и скрытые
+# заявки, прочитанные сообщения. Ожидающие ответа не удаляются никогда.
+# Таблица и её индексы остаются размером с «живые» уведомления, и список
+# последних 25 читает плотный индекс recipient_id, created_at.
+
+
+def parse_retention(spec: str) -> dict[NotificationType, int]:
+    # "friend_request=30,message=90" -> {NotificationType.friend_request: 30, ...}; тип без срока не удаляется
+    retention = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, days = item.partition("=")
+        retention[NotificationType(name.strip())] = int(days)
+    return retention
+
+
+def _append_archive(archive_dir: str, rows: list[dict]):
+    # Один файл на день; gzip допускает дописывание отдельными членами, файл читается целиком zcat
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"notifications-{datetime.now(timezone.utc):%Y-%m-%d}.jsonl.gz")
+    with gzip.open(path, "at", encoding="utf-8") as archive:
+        for row in rows:
+            archive.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+        archive.flush()
+        os.fsync(archive.fileno())
+
+
+async def purge_notifications(session_factory, retention: dict[NotificationType, int], batch_size: int = 500,
+                              archive_dir: Optional[str] = None, pause: float = 0.05) -> int:
+    """
+    Удаляет обработанные уведомления старше срока своего типа пачками по
+    batch_size, каждая — отдельной короткой транзакцией; между пачками пауза
+    pause, чтобы не занимать диск и реплику. С archive_dir удалённые строки
+    дописываются в суточный архив JSON Lines до коммита. Возвращает число
+    удалённых уведомлений.
+    """
+    now = datetime.now(timezone.utc)
+    deleted = 0
+    async with session_factory() as db:
+        for type, days in retention.items():
+            before = now - timedelta(days=days)
+            while True:
+                rows = await notification_crud.delete_resolved_batch(db, type, before, batch_size)
+                if rows and archive_dir:
+                    await asyncio.to_thread(_append_archive, archive_dir, rows)
+                await db.commit()
+                deleted += len(rows)
+                if len(rows) < batch_size:
+                    break
+                await asyncio.sleep(pause)
+    return deleted
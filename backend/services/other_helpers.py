@@ -1,15 +1,42 @@
-import aiosmtplib
+import base64
 import logging
-import ssl
-import certifi
-from fastapi.exceptions import HTTPException
+import os
+import shutil
+import uuid
+from datetime import datetime
+from typing import Optional, Tuple
 
-from email.message import EmailMessage
-from config import EMAIL_BEGET_PASSWORD
+from services.metrics import UPLOAD_BYTES
 
 logger = logging.getLogger(__name__)
 
 
+def save_upload_file(upload_file, directory: str, kind: str) -> str:
+    """Сохраняет загруженный файл под случайным именем и возвращает это имя."""
+    filename = f"{uuid.uuid4()}.{upload_file.filename.split('.')[-1]}"
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, filename), "wb") as buffer:
+        shutil.copyfileobj(upload_file.file, buffer)
+        UPLOAD_BYTES.labels(kind).inc(buffer.tell())
+    return filename
+
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    """Курсор keyset-пагинации: позиция последнего элемента страницы (created_at, id)."""
+    raw = f"{created_at.isoformat()}|{item_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, int]]:
+    """Обратное к encode_cursor; None для повреждённого курсора."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, item_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(item_id)
+    except ValueError:
+        return None
+
+
 def make_html_email(code):
     return f"""
     <html>
@@ -30,34 +57,9 @@ def make_html_email(code):
     """
 
 
-async def send_email_async(to_email: str, subject: str, code: str):
-    logger.error("start send_email_async")
-
-    try:
-        message = EmailMessage()
-        message["From"] = "WishFlick <info@wishflick.ru>"
-        message["To"] = to_email
-        message["Subject"] = subject
-
-        # Текстовая версия (на всякий случай)
-        text_body = f"Здравствуйте!\n\nВаш код подтверждения: {code}\n\nВведите его на сайте для завершения регистрации."
-        message.set_content(text_body)
-
-        # HTML-версия
-        html_body = make_html_email(code)
-        message.add_alternative(html_body, subtype="html")
-
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-
-        await aiosmtplib.send(
-            message,
-            hostname="smtp.beget.com",
-            port=2525,
-            username="info@wishflick.ru",
-            password=EMAIL_BEGET_PASSWORD,
-            start_tls=True,
-            tls_context=ssl_context,
-        )
-    except Exception as e:
-        logging.error("Failed to send message for verification email: %s", e)
-        raise HTTPException(status_code=500, detail="Failed to send message for verification email")
+def build_verification_email(code):
+    """Тема, текстовая и HTML-версии письма с кодом подтверждения."""
+    subject = "Код подтверждения регистрации"
+    # Текстовая версия (на всякий случай)
+    text_body = f"Здравствуйте!\n\nВаш код подтверждения: {code}\n\nВведите его на сайте для завершения регистрации."
+    return subject, text_body, make_html_email(code)
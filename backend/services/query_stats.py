@@ -0,0 +1,228 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryStats:
+    """Статистика SQL-запросов одного HTTP-запроса (или блока capture_queries)."""
+
+    __slots__ = ("count", "total_time", "slowest_time", "slowest_statement",
+                 "rows", "statements")
+
+    def __init__(self, record_statements: bool = False):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.rows = 0
+        # (statement, parameters) — только если явно запрошено, чтобы не копить в проде
+        self.statements: Optional[list] = [] if record_statements else None
+
+    def record(self, statement: str, parameters, elapsed: float, rows: int):
+        self.count += 1
+        self.total_time += elapsed
+        self.rows += rows
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_statement = statement
+        if self.statements is not None:
+            self.statements.append((statement, parameters))
+
+
+class RouteQueryStats:
+    """Агрегированные значения по одному маршруту."""
+
+    __slots__ = ("requests", "queries", "max_queries", "db_time", "rows")
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+
+    def add(self, stats: QueryStats):
+        self.requests += 1
+        self.queries += stats.count
+        self.max_queries = max(self.max_queries, stats.count)
+        self.db_time += stats.total_time
+        self.rows += stats.rows
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "queries": self.queries,
+            "avg_queries": self.queries / self.requests if self.requests else 0,
+            "max_queries": self.max_queries,
+            "db_time_ms": round(self.db_time * 1000, 3),
+            "rows": self.rows,
+        }
+
+
+# Верхние границы количества запросов на маршрут. При превышении пишем warning,
+# а в строгом режиме (QUERY_BUDGET_STRICT=1, для CI) запрос падает с ошибкой.
+# Значения — измеренное число запросов, одинаковое для наборов данных разного
+# размера (python -m benchmarks.query_budgets проверяет и то, и другое);
+# после оптимизации эндпоинта уменьшайте бюджет до нового измерения.
+QUERY_BUDGETS = {
+    ("GET", "/api/friends/"): 2,
+    ("GET", "/api/users/{user_id}"): 4,
+    ("GET", "/api/users/{user_id}/friends"): 2,
+    ("GET", "/api/notifications/"): 2,
+    ("GET", "/api/community/wishes"): 2,
+    ("GET", "/api/activities"): 3,
+    ("GET", "/api/search"): 4,
+    ("GET", "/api/wishes/trending"): 1,
+    ("GET", "/api/wishes/influencer"): 1,
+    ("GET", "/api/likes/state"): 2,
+}
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+route_stats: dict[tuple[str, str], RouteQueryStats] = {}
+
+
+# Время старта хранится в контексте выполнения, а не в conn.info: при ошибке
+# запроса after_cursor_execute не вызывается, и контекст просто уходит вместе с ним
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    stats = _current_stats.get()
+    if stats is None or start is None:
+        return
+    elapsed = time.perf_counter() - start
+    rows = cursor.rowcount
+    if rows is None or rows < 0:
+        # asyncpg-адаптер не заполняет rowcount для SELECT, строки уже выбраны в _rows
+        rows = len(getattr(cursor, "_rows", None) or ())
+    stats.record(statement, parameters, elapsed, rows)
+
+
+def install(engine):
+    """Подписывается на события движка. engine — AsyncEngine или обычный Engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def capture_queries(record_statements: bool = False):
+    """Считает запросы внутри блока: with capture_queries() as stats: ..."""
+    stats = QueryStats(record_statements=record_statements)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+@contextmanager
+def query_budget(max_queries: int):
+    """Падает с QueryBudgetExceeded, если внутри блока выполнено больше max_queries запросов."""
+    with capture_queries(record_statements=True) as stats:
+        yield stats
+    if stats.count > max_queries:
+        statements = "\n".join(statement for statement, _ in stats.statements)
+        raise QueryBudgetExceeded(
+            f"Expected at most {max_queries} queries, got {stats.count}:\n{statements}"
+        )
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware: собирает статистику запросов к БД на каждый HTTP-запрос,
+    агрегирует её по маршрутам и в debug-режиме отдаёт в заголовках X-DB-*.
+    """
+
+    def __init__(self, app, debug: bool = False, strict: bool = False):
+        self.app = app
+        self.debug = debug
+        self.strict = strict
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                # Бюджет проверяется до отправки ответа: в строгом режиме клиент
+                # получает 500 вместо успешного ответа
+                self._check_budget(scope, stats)
+            if self.debug and message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers += [
+                    (b"x-db-query-count", str(stats.count).encode()),
+                    (b"x-db-time-ms", f"{stats.total_time * 1000:.2f}".encode()),
+                    (b"x-db-slowest-ms", f"{stats.slowest_time * 1000:.2f}".encode()),
+                    (b"x-db-rows", str(stats.rows).encode()),
+                ]
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current_stats.reset(token)
+            self._finish(scope, stats)
+
+    def _finish(self, scope, stats: QueryStats):
+        route = scope.get("route")
+        if route is None:
+            return
+        key = (scope["method"], route.path)
+        aggregated = route_stats.get(key)
+        if aggregated is None:
+            aggregated = route_stats[key] = RouteQueryStats()
+        aggregated.add(stats)
+
+    def _check_budget(self, scope, stats: QueryStats):
+        # Маршрут к этому моменту уже записан роутером в scope
+        route = scope.get("route")
+        if route is None:
+            return
+        key = (scope["method"], route.path)
+        budget = QUERY_BUDGETS.get(key)
+        if budget is not None and stats.count > budget:
+            logger.warning("Query budget exceeded for %s %s: %s > %s (slowest: %s)",
+                           key[0], key[1], stats.count, budget, stats.slowest_statement)
+            if self.strict:
+                raise QueryBudgetExceeded(f"{key[0]} {key[1]}: {stats.count} queries > {budget}")
+
+
+def get_route_stats() -> dict:
+    return {f"{method} {path}": stats.as_dict() for (method, path), stats in route_stats.items()}
+
+
+def prometheus_lines() -> list[str]:
+    """Агрегаты по маршрутам в текстовом формате Prometheus (для /metrics)."""
+    lines = [
+        "# HELP db_queries_total SQL statements executed, by route",
+        "# TYPE db_queries_total counter",
+    ]
+    for (method, path), stats in route_stats.items():
+        lines.append(f'db_queries_total{{method="{method}",route="{path}"}} {stats.queries}')
+    lines += [
+        "# HELP db_query_seconds_total Time spent in SQL statements, by route",
+        "# TYPE db_query_seconds_total counter",
+    ]
+    for (method, path), stats in route_stats.items():
+        lines.append(f'db_query_seconds_total{{method="{method}",route="{path}"}} {stats.db_time}')
+    return lines
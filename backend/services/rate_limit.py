@@ -0,0 +1,210 @@
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+from jose import JWTError, jwt
+
+from services.auth import ALGORITHM, SECRET_KEY
+from services.metrics import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+# Ограничение частоты запросов: token bucket на ключ (IP, пользователь, email).
+#
+# Проверка — зависимость FastAPI, объявленная первой в dependencies маршрута:
+# она выполняется до get_db и до тела эндпоинта, поэтому отказ 429 не стоит
+# ни запроса к БД, ни bcrypt, ни письма. Ключ "user" — sub из токена после
+# проверки подписи JWT (HMAC), без запроса к БД.
+
+
+@dataclass(frozen=True)
+class Limit:
+    # Ёмкость корзины (сколько запросов подряд) и скорость пополнения
+    burst: int
+    per_seconds: float
+    # "ip", "user" (иначе ip) или "email" (из JSON-тела или поля username формы)
+    key: str = "ip"
+
+    @property
+    def rate(self) -> float:
+        return self.burst / self.per_seconds
+
+
+MINUTE = 60
+HOUR = 3600
+
+POLICIES: dict[str, tuple[Limit, ...]] = {
+    "auth.register": (Limit(5, MINUTE), Limit(20, HOUR)),
+    "auth.guest": (Limit(3, MINUTE), Limit(20, HOUR)),
+    # Подбор 6-значного кода: ограничение и по адресу, и по email, на который он отправлен
+    "auth.verify_email": (Limit(10, MINUTE), Limit(5, 10 * MINUTE, key="email")),
+    # Каждый запрос — письмо: не больше трёх на адрес за 10 минут
+    "auth.resend_verification": (Limit(5, MINUTE), Limit(3, 10 * MINUTE, key="email")),
+    "auth.token": (Limit(20, MINUTE), Limit(10, MINUTE, key="email")),
+    "auth.refresh": (Limit(30, MINUTE),),
+    "auth.oauth": (Limit(20, MINUTE),),
+    "write.like": (Limit(60, MINUTE, key="user"),),
+    "write.comment": (Limit(20, MINUTE, key="user"),),
+    "write.chat": (Limit(30, MINUTE, key="user"),),
+}
+
+
+class MemoryStore:
+    """
+    Корзины в памяти процесса: OrderedDict, O(1) на проверку. Давно не
+    использованные ключи вытесняются при превышении max_keys. У каждого
+    воркера gunicorn свои корзины — общий лимит даёт RedisStore.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # ключ -> (токены, время последнего обновления)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int, now: Optional[float] = None) -> float:
+        """Забрать токен. Возвращает 0, если можно, иначе секунды до появления токена."""
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    async def aclose(self):
+        pass
+
+
+# Та же логика атомарно на стороне Redis; корзина живёт, пока не наполнится снова
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(retry_after)
+"""
+
+
+class RedisStore:
+    """Общие корзины для всех воркеров и хостов (RATE_LIMIT_REDIS_URL)."""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        # Необязательный бэкенд: redis импортируется, только если он настроен
+        import redis.asyncio as redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._take = self._client.register_script(TAKE_SCRIPT)
+        self.prefix = prefix
+
+    async def take(self, key: str, rate: float, burst: int, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        try:
+            return float(await self._take(keys=[self.prefix + key], args=[rate, burst, now]))
+        except Exception as e:
+            # Недоступный Redis не должен останавливать вход и запись: пропускаем
+            logger.warning("Rate limit store unavailable: %s", e)
+            return 0.0
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+class RateLimiter:
+    def __init__(self, store, enabled: bool = True, policies: Optional[dict] = None):
+        self.store = store
+        self.enabled = enabled
+        self.policies = POLICIES if policies is None else policies
+
+    @classmethod
+    def create(cls, settings) -> "RateLimiter":
+        if settings.RATE_LIMIT_REDIS_URL:
+            store = RedisStore(settings.RATE_LIMIT_REDIS_URL)
+        else:
+            store = MemoryStore(settings.RATE_LIMIT_MAX_KEYS)
+        return cls(store, enabled=settings.RATE_LIMIT_ENABLED)
+
+    async def check(self, policy: str, keys: dict[str, str]):
+        # keys: вид ключа -> значение ({"ip": ..., "user": ..., "email": ...})
+        for index, limit in enumerate(self.policies[policy]):
+            value = keys.get(limit.key)
+            if value is None:
+                continue
+            retry_after = await self.store.take(f"{policy}:{index}:{limit.key}:{value}", limit.rate, limit.burst)
+            if retry_after:
+                RATE_LIMITED.labels(policy).inc()
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many requests",
+                    headers={"Retry-After": str(max(1, round(retry_after)))},
+                )
+
+    async def aclose(self):
+        await self.store.aclose()
+
+
+def client_ip(request: Request) -> str:
+    # За прокси адрес клиента подставляет uvicorn из X-Forwarded-For, если прокси
+    # указан в WEB_FORWARDED_ALLOW_IPS (gunicorn_conf.py: forwarded_allow_ips)
+    return request.client.host if request.client else "unknown"
+
+
+async def _request_email(request: Request) -> Optional[str]:
+    # Тело уже прочитано FastAPI и закешировано в request, повторного чтения нет
+    try:
+        if request.headers.get("content-type", "").startswith("application/json"):
+            value = (await request.json()).get("email")
+        else:
+            value = (await request.form()).get("username")
+    except Exception:
+        return None
+    return value.strip().lower() if isinstance(value, str) and value else None
+
+
+def _token_subject(request: Request) -> Optional[str]:
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+
+def rate_limit(policy: str):
+    """Зависимость маршрута: @router.post(..., dependencies=[Depends(rate_limit("auth.register"))])."""
+    limits = POLICIES[policy]
+    kinds = {limit.key for limit in limits}
+
+    async def dependency(request: Request):
+        limiter: Optional[RateLimiter] = getattr(request.app.state, "rate_limiter", None)
+        if limiter is None or not limiter.enabled:
+            return
+        keys = {"ip": client_ip(request)}
+        if "user" in kinds:
+            # Без валидного токена — по адресу; эндпоинт всё равно ответит 401
+            keys["user"] = _token_subject(request) or keys["ip"]
+        if "email" in kinds:
+            keys["email"] = await _request_email(request)
+        await limiter.check(policy, keys)
+
+    return dependency
+
@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import math
+import random
+import time
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import text
+
+from services.metrics import SCHEDULER_JOB_DURATION, SCHEDULER_JOB_LAST_SUCCESS, SCHEDULER_JOB_RUNS
+
+logger = logging.getLogger(__name__)
+
+# Периодические задачи обслуживания внутри процесса приложения.
+#
+# Каждая задача — корутина без аргументов с триггером (интервал или cron).
+# Моменты запуска у всех процессов одни и те же: cron — по минутам UTC,
+# интервал — кратно периоду от эпохи Unix; джиттер только сдвигает
+# пробуждение. Задача с leader=True выполняется один раз за плановый запуск
+# на все воркеры и хосты: под advisory-lock PostgreSQL по имени задачи
+# процесс сверяет плановое время с последним выполненным запуском
+# (таблица scheduler_runs) и пропускает запуск, уже сделанный другим
+# процессом; успешный запуск отмечается там же до снятия блокировки.
+# Блокировка сессионная и живёт на отдельном соединении пула до конца
+# выполнения: параллельно задача не выполняется. Упавший запуск не
+# отмечается — его повторит процесс, проснувшийся позже в пределах джиттера.
+# leader=False — задача каждого процесса (например, обновление кеша в памяти
+# воркера).
+
+# Первый ключ двухключевого advisory-lock: пространство задач планировщика
+LOCK_NAMESPACE = 4801
+
+LAST_RUN_DONE_SQL = "SELECT fire_at >= :fire_at FROM scheduler_runs WHERE job_name = :name"
+# Отметка не сдвигается назад: запуск вне расписания не «отменяет» более поздний плановый
+RECORD_RUN_SQL = """
+    INSERT INTO scheduler_runs (job_name, fire_at) VALUES (:name, :fire_at)
+    ON CONFLICT (job_name) DO UPDATE
+    SET fire_at = greatest(scheduler_runs.fire_at, excluded.fire_at), finished_at = now()
+"""
+
+
+class IntervalTrigger:
+    """
+    Каждые seconds секунд, в моменты, кратные периоду от эпохи Unix;
+    immediate — первый запуск сразу при старте (его плановое время — начало
+    текущего периода).
+    """
+
+    def __init__(self, seconds: float, immediate: bool = False):
+        self.seconds = seconds
+        self.immediate = immediate
+
+    def next_fire(self, after: datetime, first: bool = False) -> datetime:
+        periods = after.timestamp() / self.seconds
+        periods = math.floor(periods) if first and self.immediate else math.floor(periods) + 1
+        return datetime.fromtimestamp(periods * self.seconds, timezone.utc)
+
+
+def _parse_cron_field(spec: str, low: int, high: int) -> frozenset[int]:
+    # "*", "*/15", "1-5", "0,30", "8-18/2"
+    values = set()
+    for part in spec.split(","):
+        part, _, step = part.partition("/")
+        if part == "*":
+            first, last = low, high
+        elif "-" in part:
+            first, last = (int(value) for value in part.split("-"))
+        else:
+            first = last = int(part)
+        if step and part != "*" and "-" not in part:
+            last = high
+        if not low <= first <= last <= high:
+            raise ValueError(f"cron field {spec!r} out of range {low}-{high}")
+        values.update(range(first, last + 1, int(step) if step else 1))
+    return frozenset(values)
+
+
+class CronTrigger:
+    """
+    Расписание в формате cron из пяти полей (минута, час, день месяца, месяц,
+    день недели, 0 — воскресенье), по UTC: "30 3 * * *" — ежедневно в 03:30.
+    """
+
+    def __init__(self, expr: str):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression must have 5 fields: {expr!r}")
+        self.expr = expr
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        self.weekdays = frozenset(day % 7 for day in _parse_cron_field(fields[4], 0, 7))
+        # Как в cron: если заданы и день месяца, и день недели, подходит любой из них
+        self._any_day = fields[2] != "*" and fields[4] != "*"
+        self._days_star = fields[2] == "*"
+
+    def _day_matches(self, moment: datetime) -> bool:
+        in_days = moment.day in self.days
+        in_weekdays = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day:
+            return in_days or in_weekdays
+        return in_weekdays if self._days_star else in_days and in_weekdays
+
+    def next_fire(self, after: datetime, first: bool = False) -> datetime:
+        moment = after.astimezone(timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Пропускаем целыми месяцами, днями и часами; пять лет — заведомо невыполнимое расписание
+        limit = moment + timedelta(days=5 * 366)
+        while moment < limit:
+            if moment.month not in self.months:
+                year, month = divmod(moment.month, 12)
+                moment = moment.replace(year=moment.year + year, month=month + 1, day=1, hour=0, minute=0)
+            elif not self._day_matches(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"cron expression never fires: {self.expr!r}")
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], Awaitable[object]]
+    trigger: object
+    # Один раз на все процессы (advisory-lock и scheduler_runs) или в каждом
+    leader: bool = True
+    # Сколько запусков задачи может выполняться одновременно в процессе
+    max_instances: int = 1
+    # Случайная добавка к каждой задержке, секунд: воркеры и хосты не
+    # просыпаются одновременно и не спорят за блокировку в одну миллисекунду
+    jitter: float = 0.0
+    running: int = field(default=0, init=False)
+
+    @property
+    def lock_key(self) -> int:
+        # Стабильный между процессами ключ (hash() строк зависит от PYTHONHASHSEED), int4 со знаком
+        key = zlib.crc32(self.name.encode())
+        return key - 2 ** 32 if key >= 2 ** 31 else key
+
+
+class Scheduler:
+    """Планировщик задач; запускается и останавливается в lifespan приложения."""
+
+    def __init__(self, engine=None):
+        self.engine = engine
+        self.jobs: dict[str, Job] = {}
+        self._stopping = asyncio.Event()
+        self._loops: list[asyncio.Task] = []
+        self._runs: set[asyncio.Task] = set()
+
+    def add_job(self, name: str, func: Callable[[], Awaitable[object]], trigger, *,
+                leader: bool = True, max_instances: int = 1, jitter: float = 0.0) -> Job:
+        if name in self.jobs:
+            raise ValueError(f"job {name!r} already registered")
+        if leader and self.engine is None:
+            raise ValueError(f"job {name!r}: leader election needs an engine")
+        job = self.jobs[name] = Job(name, func, trigger, leader=leader, max_instances=max_instances, jitter=jitter)
+        return job
+
+    def start(self):
+        for job in self.jobs.values():
+            self._loops.append(asyncio.create_task(self._loop(job), name=f"scheduler-{job.name}"))
+
+    async def stop(self, timeout: float = 30):
+        # Новые запуски прекращаются сразу, текущим даётся timeout на завершение
+        self._stopping.set()
+        await asyncio.gather(*self._loops)
+        if self._runs:
+            done, pending = await asyncio.wait(list(self._runs), timeout=timeout)
+            for task in pending:
+                logger.warning("Scheduled job %s cancelled on shutdown", task.get_name())
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _loop(self, job: Job):
+        first, fire_at = True, None
+        while True:
+            # Не раньше предыдущего планового времени: таймер может разбудить
+            # чуть раньше срока, и тот же запуск повторился бы
+            now = datetime.now(timezone.utc)
+            fire_at = job.trigger.next_fire(max(now, fire_at) if fire_at else now, first)
+            first = False
+            delay = max((fire_at - now).total_seconds(), 0.0) + random.uniform(0, job.jitter)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+                return
+            except asyncio.TimeoutError:
+                pass
+            if job.running >= job.max_instances:
+                # Предыдущий запуск ещё идёт — этот пропускаем, а не копим очередь
+                SCHEDULER_JOB_RUNS.labels(job.name, "skipped").inc()
+                continue
+            job.running += 1
+            task = asyncio.create_task(self._execute(job, fire_at), name=f"job-{job.name}")
+            self._runs.add(task)
+            task.add_done_callback(self._runs.discard)
+
+    async def run_job(self, name: str) -> str:
+        """Выполнить задачу сейчас, вне расписания (с теми же блокировкой и метриками)."""
+        job = self.jobs[name]
+        job.running += 1
+        return await self._execute(job)
+
+    async def _execute(self, job: Job, fire_at: Optional[datetime] = None) -> str:
+        # fire_at — плановое время запуска; None — запуск вне расписания
+        start = time.perf_counter()
+        try:
+            if job.leader:
+                result = await self._run_as_leader(job, fire_at)
+            else:
+                await job.func()
+                result = "ok"
+        except Exception as e:
+            result = "error"
+            logger.error("Scheduled job %s failed: %s", job.name, e)
+        finally:
+            job.running -= 1
+        SCHEDULER_JOB_RUNS.labels(job.name, result).inc()
+        if result not in ("not_leader", "done"):
+            SCHEDULER_JOB_DURATION.labels(job.name).observe(time.perf_counter() - start)
+        if result == "ok":
+            SCHEDULER_JOB_LAST_SUCCESS.labels(job.name).set(time.time())
+        return result
+
+    async def _run_as_leader(self, job: Job, fire_at: Optional[datetime]) -> str:
+        """
+        ok — выполнена здесь; not_leader — задачу сейчас выполняет другой
+        процесс; done — этот плановый запуск уже выполнен другим процессом.
+        """
+        params = {"namespace": LOCK_NAMESPACE, "key": job.lock_key}
+        async with self.engine.connect() as conn:
+            locked = (await conn.execute(text("SELECT pg_try_advisory_lock(:namespace, :key)"), params)).scalar()
+            await conn.commit()
+            if not locked:
+                return "not_leader"
+            try:
+                if fire_at is not None:
+                    done = (await conn.execute(text(LAST_RUN_DONE_SQL),
+                                               {"name": job.name, "fire_at": fire_at})).scalar()
+                    await conn.commit()
+                    if done:
+                        return "done"
+                await job.func()
+                await conn.execute(text(RECORD_RUN_SQL),
+                                   {"name": job.name, "fire_at": fire_at or datetime.now(timezone.utc)})
+                await conn.commit()
+                return "ok"
+            finally:
+                # Ошибка запроса к scheduler_runs оставила бы транзакцию прерванной,
+                # и снятие блокировки не выполнилось бы
+                await conn.rollback()
+                await conn.execute(text("SELECT pg_advisory_unlock(:namespace, :key)"), params)
+                await conn.commit()
@@ -0,0 +1,50 @@
+import logging
+import os
+
+# alembic (вместе с mako и pygments) импортируется только при проверке схемы
+# и в manage.py: импорт приложения и старт тестов от него не зависят
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+
+class SchemaVersionMismatch(RuntimeError):
+    pass
+
+
+def get_alembic_config():
+    from alembic.config import Config
+
+    config = Config(ALEMBIC_INI)
+    # Логирование уже настроено приложением, alembic.ini его не перенастраивает
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def get_head_revisions() -> set:
+    from alembic.script import ScriptDirectory
+
+    return set(ScriptDirectory.from_config(get_alembic_config()).get_heads())
+
+
+def _current_revisions(connection) -> set:
+    from alembic.migration import MigrationContext
+
+    return set(MigrationContext.configure(connection).get_current_heads())
+
+
+async def verify_schema_version(engine):
+    """
+    Проверяет, что БД мигрирована до последней ревизии. Никакого DDL:
+    один SELECT из alembic_version. Миграции применяются отдельно —
+    python manage.py migrate — до запуска воркеров.
+    """
+    expected = get_head_revisions()
+    async with engine.connect() as conn:
+        current = await conn.run_sync(_current_revisions)
+    if current != expected:
+        raise SchemaVersionMismatch(
+            f"Database schema is at {sorted(current) or 'no revision'}, "
+            f"expected {sorted(expected)}. Run `python manage.py migrate`."
+        )
+    logger.info("Database schema is at revision %s", ", ".join(sorted(current)))
@@ -0,0 +1,51 @@
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from fastapi import Request
+
+import services.crud.trending_crud as trending_crud
+
+logger = logging.getLogger(__name__)
+
+
+class TrendingIndex:
+    """
+    Готовый отсортированный список (wish_id, score) в памяти процесса.
+    Чтение страницы — срез кортежа: время не зависит ни от числа желаний,
+    ни от числа событий. Список целиком заменяется при обновлении.
+    """
+
+    def __init__(self):
+        self._ranked: Tuple[Tuple[int, float], ...] = ()
+        self.refreshed_at: Optional[float] = None
+
+    def replace(self, ranked: List[Tuple[int, float]]):
+        # Атомарная замена ссылки: читатели видят либо старый, либо новый список
+        self._ranked = tuple(ranked)
+        self.refreshed_at = time.time()
+
+    def page(self, offset: int, limit: int) -> List[Tuple[int, float]]:
+        return list(self._ranked[offset:offset + limit])
+
+    def __len__(self):
+        return len(self._ranked)
+
+
+async def refresh_trending(session_factory, index: TrendingIndex, size: int = 1000):
+    # Задача планировщика в каждом воркере: у каждого процесса свой индекс в памяти
+    async with session_factory() as db:
+        ranked = await trending_crud.get_top_wish_scores(db, size)
+    index.replace(ranked)
+
+
+async def prune_trending(session_factory):
+    # Очистка затухших рейтингов в БД — достаточно одного процесса
+    async with session_factory() as db:
+        removed = await trending_crud.prune_scores(db)
+    if removed:
+        logger.info("Pruned %s decayed trending scores", removed)
+
+
+def get_trending_index(request: Request) -> TrendingIndex:
+    return request.app.state.trending
@@ -0,0 +1,35 @@
+import logging
+from typing import Optional
+
+from sqlalchemy import text
+
+import services.crud.user_stats_crud as user_stats_crud
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-lock: сверка из manage.py и по расписанию не идут одновременно
+RECONCILE_LOCK_KEY = 3601
+
+
+async def reconcile_all(engine, session_factory, batch_size: int = 5000) -> Optional[int]:
+    """
+    Пересчитывает user_stats диапазонами id. Возвращает число исправленных строк
+    или None, если сверку уже выполняет другой процесс.
+    """
+    async with engine.connect() as conn:
+        locked = (await conn.execute(text("SELECT pg_try_advisory_lock(:key)"),
+                                     {"key": RECONCILE_LOCK_KEY})).scalar()
+        await conn.commit()
+        if not locked:
+            return None
+        try:
+            # Сессия привязана к этому соединению, чтобы блокировка жила до конца сверки
+            async with session_factory(bind=conn) as db:
+                max_id = await user_stats_crud.get_max_user_id(db)
+                fixed = 0
+                for first_id in range(1, max_id + 1, batch_size):
+                    fixed += await user_stats_crud.reconcile_range(db, first_id, first_id + batch_size - 1)
+            return fixed
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": RECONCILE_LOCK_KEY})
+            await conn.commit()
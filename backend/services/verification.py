@@ -0,0 +1,21 @@
+import logging
+
+import services.crud.auth_crud as auth_crud
+
+logger = logging.getLogger(__name__)
+
+
+async def purge_expired_verifications(session_factory, batch_size: int = 1000) -> int:
+    """
+    Удаляет просроченные коды подтверждения пачками, каждая — отдельной
+    транзакцией. Таблица остаётся размером с число незавершённых регистраций.
+    Возвращает число удалённых кодов.
+    """
+    deleted = 0
+    async with session_factory() as db:
+        while True:
+            count = await auth_crud.delete_expired_verifications(db, batch_size)
+            await db.commit()
+            deleted += count
+            if count < batch_size:
+                return deleted
@@ -45,6 +45,16 @@ export const verifyEmail = async (email: string, code: string) => {
   }
 };
 
+// Повторная отправка кода подтверждения (прежний код перестаёт действовать)
+export const resendVerificationCode = async (email: string) => {
+  try {
+    const response = await api.post('/auth/resend-verification', { email });
+    return response.data;
+  } catch (error: any) {
+    throw new Error(error.response?.data?.detail || 'Не удалось отправить код');
+  }
+};
+
 // Гостевой вход
 export const guestLogin = async () => {
   try {